@@ -1,16 +1,13 @@
-from fastapi import Depends
+from fastapi import Request
 from app.services.weather_service import WeatherService
 from app.db.repositories.weather_repository import WeatherRepository
 
 
-async def get_weather_repository() -> WeatherRepository:
-    """Dependency for getting the weather repository"""
-    repository = WeatherRepository()
-    return repository
+async def get_weather_repository(request: Request) -> WeatherRepository:
+    """Dependency for the application-wide weather repository built at startup"""
+    return request.app.state.weather_repository
 
 
-async def get_weather_service(
-    repository: WeatherRepository = Depends(get_weather_repository)
-) -> WeatherService:
-    """Dependency for getting the weather service"""
-    return WeatherService(repository=repository)
+async def get_weather_service(request: Request) -> WeatherService:
+    """Dependency for the application-wide weather service built at startup"""
+    return request.app.state.weather_service
@@ -1,6 +1,10 @@
-from fastapi import APIRouter, Depends
-from app.db.mongodb import get_database
+from fastapi import APIRouter, Depends, Request, Response, status
+from app.db.mongodb import get_database, pool_metrics
 from app.core.config import get_settings
+from app.services.cache_service import latest_weather_cache
+from app.services.weather_service import ingest_stats
+from app.services.broadcast_service import weather_broadcaster
+from app.services.recent_history_service import recent_history
 import asyncio
 
 router = APIRouter(prefix="/health", tags=["Health"])
@@ -22,7 +26,7 @@ async def health_check():
 @router.get("/db")
 async def db_health_check():
     """
-    Database health check endpoint
+    Database health check endpoint, with connection pool usage
     """
     try:
         async with get_database() as db:
@@ -31,10 +35,75 @@ async def db_health_check():
             return {
                 "status": "healthy",
                 "database": settings.MONGODB_DB_NAME,
-                "is_primary": is_primary.get("ismaster", False)
+                "is_primary": is_primary.get("ismaster", False),
+                "pool": pool_metrics.stats()
             }
     except Exception as e:
         return {
             "status": "unhealthy",
             "detail": str(e)
         }
+
+
+@router.get("/ready")
+async def readiness_check(request: Request, response: Response):
+    """
+    Readiness for load balancers: 503 until startup warm-up has finished,
+    once shutdown has begun, or while MongoDB does not answer
+    """
+    if not getattr(request.app.state, "ready", False):
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+        return {"status": "not_ready", "detail": "Warming up or shutting down"}
+    try:
+        async with get_database() as db:
+            await asyncio.wait_for(db.command("ping"), settings.READINESS_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+        return {"status": "not_ready", "detail": f"MongoDB did not answer within {settings.READINESS_TIMEOUT_SECONDS}s"}
+    except Exception as e:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+        return {"status": "not_ready", "detail": str(e)}
+    return {"status": "ready"}
+
+
+@router.get("/cache")
+async def cache_stats():
+    """
+    Latest-observation cache hit/miss counters
+    """
+    return latest_weather_cache.stats()
+
+
+@router.get("/ingest")
+async def ingest_statistics():
+    """
+    Stored vs. deduplicated observation counters
+    """
+    return ingest_stats.stats()
+
+
+@router.get("/stream")
+async def stream_statistics():
+    """
+    Streaming subscriber and fan-out counters
+    """
+    return weather_broadcaster.stats()
+
+
+@router.get("/recent-history")
+async def recent_history_statistics():
+    """
+    Rows and memory held by the in-memory recent history, per location
+    """
+    return recent_history.stats()
+
+
+@router.get("/scheduler")
+async def scheduler_status(request: Request):
+    """
+    Effective update interval, circuit breaker state and upstream call budget
+    """
+    scheduler = getattr(request.app.state, "scheduler", None)
+    if scheduler is None:
+        return {"running": False}
+    return scheduler.status()
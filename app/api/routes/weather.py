@@ -1,24 +1,91 @@
-from fastapi import APIRouter, Depends, Query, HTTPException, status
-from typing import Optional
+import asyncio
+from fastapi import APIRouter, Depends, Query, HTTPException, Request, Response, status
+from fastapi.responses import StreamingResponse
+from typing import List, Optional, Tuple, Union
 from datetime import datetime, timedelta
 from app.services.weather_service import WeatherService
-from app.models.weather import WeatherResponse, WeatherHistoryResponse
+from app.services.broadcast_service import weather_broadcaster, DROPPED
+from app.models.weather import (
+    WeatherResponse, WeatherHistoryResponse, WeatherHistoryFieldsResponse, WeatherAggregateResponse,
+    WeatherStatsResponse, ExportFormat, AggregationBucket, NUMERIC_WEATHER_FIELDS, WEATHER_FIELD_PATHS
+)
 from app.api.deps import get_weather_service
+from app.api.responses import FastJSONResponse
+from app.core.config import get_settings
+from app.core.exceptions import BadRequestException
+from app.utils.export_utils import documents_to_ndjson, documents_to_csv, csv_header
+from app.utils.time_utils import to_naive_utc
+from app.utils.cursor_utils import decode_cursor
+from app.utils.http_cache import cache_headers, is_not_modified, make_etag
 
 router = APIRouter(prefix="/weather", tags=["Weather"])
+settings = get_settings()
+
+
+def _parse_choices(value: str, choices: List[str], kind: str) -> List[str]:
+    """Split a comma-separated list, dropping repeats, and check every item is one of ``choices``"""
+    items = list(dict.fromkeys(item.strip() for item in value.split(",") if item.strip()))
+    unknown = [item for item in items if item not in choices]
+    if not items or unknown:
+        raise BadRequestException(
+            f"Unknown {kind}: {', '.join(unknown) or '(none given)'}; "
+            f"choose from {', '.join(choices)}"
+        )
+    return items
+
+
+def _parse_metrics(metrics: str) -> List[str]:
+    """Split and validate a comma-separated metric list"""
+    return _parse_choices(metrics, NUMERIC_WEATHER_FIELDS, "metrics")
+
+
+def _resolve_range(start_date: Optional[datetime], end_date: Optional[datetime]) -> Tuple[datetime, datetime]:
+    """Default to the last 24 hours, filling in whichever end is missing"""
+    end_date = to_naive_utc(end_date) if end_date else datetime.utcnow()
+    start_date = to_naive_utc(start_date) if start_date else end_date - timedelta(days=1)
+    return start_date, end_date
+
+
+def _history_cache_headers(end_date: Optional[datetime]) -> dict:
+    """
+    Long-lived caching for ranges that ended before the latest ingest could still
+    land in them; ranges reaching up to now may change on the next update.
+    """
+    settled_before = datetime.utcnow() - timedelta(seconds=2 * settings.WEATHER_UPDATE_INTERVAL_SECONDS)
+    if end_date is not None and end_date <= settled_before:
+        return cache_headers(max_age=settings.HISTORY_CLOSED_RANGE_MAX_AGE_SECONDS, immutable=True)
+    return cache_headers(max_age=settings.WEATHER_UPDATE_INTERVAL_SECONDS)
 
 
 @router.get("/current", response_model=WeatherResponse)
 async def get_current_weather(
+    request: Request,
+    response: Response,
+    location: Optional[str] = Query(None, description="Monitored location name, defaults to WEATHER_LOCATION"),
     weather_service: WeatherService = Depends(get_weather_service)
 ):
     """
-    Get the most recent weather data for Austin, TX
+    Get the most recent weather data for a monitored location.
+
+    Responses carry an ETag and Last-Modified for the observation and may be
+    cached until the next scheduled update; a matching If-None-Match or
+    If-Modified-Since gets an empty 304.
     """
-    weather_data = await weather_service.get_latest_weather()
+    location = weather_service.resolve_location(location).name
+    weather_data = await weather_service.get_latest_weather(location)
     if not weather_data:
         # If no data exists, fetch new data
-        weather_data = await weather_service.fetch_and_store_weather()
+        weather_data = await weather_service.fetch_and_store_weather(location)
+
+    etag = make_etag(weather_data.id, weather_data.timestamp.isoformat(), weather_data.last_seen)
+    headers = cache_headers(
+        max_age=weather_service.seconds_until_refresh(weather_data),
+        etag=etag,
+        last_modified=weather_data.last_seen or weather_data.timestamp
+    )
+    if is_not_modified(request.headers, etag, weather_data.last_seen or weather_data.timestamp):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    response.headers.update(headers)
 
     return {
         "data": weather_data,
@@ -26,47 +93,248 @@ async def get_current_weather(
     }
 
 
-@router.get("/history", response_model=WeatherHistoryResponse)
+@router.get("/history", response_model=Union[WeatherHistoryResponse, WeatherHistoryFieldsResponse])
 async def get_weather_history(
     start_date: Optional[datetime] = Query(None, description="Start date/time in ISO format"),
     end_date: Optional[datetime] = Query(None, description="End date/time in ISO format"),
     limit: int = Query(100, ge=1, le=1000, description="Maximum number of records to return"),
     offset: int = Query(0, ge=0, description="Number of records to skip"),
+    after: Optional[str] = Query(None, description="Cursor from 'next_cursor' of a previous page"),
+    before: Optional[str] = Query(None, description="Cursor from 'prev_cursor' of a previous page"),
+    location: Optional[str] = Query(None, description="Monitored location name, defaults to WEATHER_LOCATION"),
+    exact_count: bool = Query(False, description="Count matching records exactly instead of estimating"),
+    fields: Optional[str] = Query(
+        None,
+        description=f"Comma-separated fields to return as flat rows, any of: {', '.join(WEATHER_FIELD_PATHS)}"
+    ),
     weather_service: WeatherService = Depends(get_weather_service)
 ):
     """
-    Get historical weather data for Austin, TX with optional date range filtering
+    Get historical weather data for a monitored location with optional date range filtering.
+
+    With ``fields`` only the selected fields are read from Mongo and each row
+    is a flat object of just those fields. Ranges within the recent history
+    held in memory, such as the default last 24 hours, are served without
+    querying Mongo.
     """
+    location = weather_service.resolve_location(location).name
+
+    field_list = _parse_choices(fields, list(WEATHER_FIELD_PATHS), "fields") if fields is not None else None
+
+    if after and before:
+        raise BadRequestException("Only one of 'after' and 'before' may be given")
+    if offset and (after or before):
+        raise BadRequestException("'offset' cannot be combined with a cursor")
+
     # Default to last 24 hours if no dates specified
     if not start_date and not end_date:
         end_date = datetime.utcnow()
         start_date = end_date - timedelta(days=1)
+    start_date = to_naive_utc(start_date) if start_date else None
+    end_date = to_naive_utc(end_date) if end_date else None
 
-    history_data = await weather_service.repository.get_history(
-        location=weather_service.location,
-        start_time=start_date,
-        end_time=end_date,
-        limit=limit,
-        skip=offset
-    )
+    try:
+        if after or before:
+            decode_cursor(after or before)
+    except ValueError as e:
+        raise BadRequestException(str(e))
 
-    total_count = await weather_service.repository.count_records(weather_service.location)
+    recent_page = weather_service.recent.history_page(
+        location, start_date, end_date, limit=limit, skip=offset, after=after, before=before, fields=field_list
+    )
+    if recent_page is not None:
+        history_data, next_cursor, prev_cursor = recent_page
+        total_count = await weather_service.count_weather(location, start_date, end_date, exact=exact_count)
+    else:
+        # The count is independent of the page, so fetch both concurrently
+        (history_data, next_cursor, prev_cursor), total_count = await asyncio.gather(
+            weather_service.repository.get_history_page(
+                location=location,
+                start_time=start_date,
+                end_time=end_date,
+                limit=limit,
+                skip=offset,
+                after=after,
+                before=before,
+                raw=True,
+                fields=field_list
+            ),
+            weather_service.count_weather(location, start_date, end_date, exact=exact_count)
+        )
 
-    return {
+    # Rows are our own stored documents, so encode them directly rather than
+    # re-validating every row through response_model
+    content = {"fields": field_list} if field_list else {}
+    return FastJSONResponse({
+        **content,
         "data": history_data,
         "count": total_count,
+        "count_exact": exact_count,
+        "next_cursor": next_cursor,
+        "prev_cursor": prev_cursor,
         "message": f"Retrieved {len(history_data)} weather records"
+    }, headers=_history_cache_headers(end_date))
+
+
+@router.get("/history/export")
+async def export_weather_history(
+    format: ExportFormat = Query(ExportFormat.NDJSON, description="Export format"),
+    start_date: Optional[datetime] = Query(None, description="Start date/time in ISO format"),
+    end_date: Optional[datetime] = Query(None, description="End date/time in ISO format"),
+    location: Optional[str] = Query(None, description="Monitored location name, defaults to WEATHER_LOCATION"),
+    weather_service: WeatherService = Depends(get_weather_service)
+):
+    """
+    Stream historical weather data, oldest first, as NDJSON or CSV.
+
+    Rows are written as each Mongo batch arrives, so the response starts
+    immediately and memory use does not grow with the size of the range.
+    """
+    location = weather_service.resolve_location(location).name
+    start_date = to_naive_utc(start_date) if start_date else None
+    end_date = to_naive_utc(end_date) if end_date else None
+    encode = documents_to_csv if format == ExportFormat.CSV else documents_to_ndjson
+
+    async def generate():
+        if format == ExportFormat.CSV:
+            yield csv_header()
+        async for batch in weather_service.repository.stream_history(
+            location=location,
+            start_time=start_date,
+            end_time=end_date,
+            batch_size=settings.EXPORT_BATCH_SIZE
+        ):
+            yield encode(batch)
+
+    media_type = "text/csv" if format == ExportFormat.CSV else "application/x-ndjson"
+    filename = f"weather_history.{format.value}"
+    return StreamingResponse(
+        generate(),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
+@router.get("/stream")
+async def stream_weather(
+    location: Optional[List[str]] = Query(None, description="Monitored location names to follow (repeatable), default all"),
+    weather_service: WeatherService = Depends(get_weather_service)
+):
+    """
+    Stream new observations as Server-Sent Events.
+
+    Each stored observation is pushed once as an ``observation`` event; idle
+    streams get a comment heartbeat every STREAM_HEARTBEAT_SECONDS. A client
+    that falls STREAM_QUEUE_SIZE events behind is disconnected and should
+    reconnect.
+    """
+    locations = [weather_service.resolve_location(name).name for name in location] if location else None
+    subscription = weather_broadcaster.subscribe(locations)
+
+    async def generate():
+        try:
+            # Ask EventSource clients to reconnect after 3 seconds if dropped
+            yield b"retry: 3000\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.queue.get(), settings.STREAM_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield b": heartbeat\n\n"
+                    continue
+                if event is DROPPED:
+                    yield b"event: dropped\ndata: {}\n\n"
+                    return
+                yield event
+        finally:
+            weather_broadcaster.unsubscribe(subscription)
+
+    return StreamingResponse(
+        generate(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.get("/aggregate", response_model=WeatherAggregateResponse)
+async def get_weather_aggregate(
+    bucket: AggregationBucket = Query(AggregationBucket.HOUR, description="Bucket size"),
+    metrics: str = Query(
+        "temp_c,humidity,wind_kph,pressure_mb",
+        description=f"Comma-separated metrics, any of: {', '.join(NUMERIC_WEATHER_FIELDS)}"
+    ),
+    start_date: Optional[datetime] = Query(None, description="Start date/time in ISO format"),
+    end_date: Optional[datetime] = Query(None, description="End date/time in ISO format"),
+    location: Optional[str] = Query(None, description="Monitored location name, defaults to WEATHER_LOCATION"),
+    weather_service: WeatherService = Depends(get_weather_service)
+):
+    """
+    Get min/max/avg of selected metrics per minute, hour or day bucket
+    """
+    location = weather_service.resolve_location(location).name
+    metric_list = _parse_metrics(metrics)
+    start_date, end_date = _resolve_range(start_date, end_date)
+    if (end_date - start_date) / bucket.duration > settings.AGGREGATE_MAX_BUCKETS:
+        raise BadRequestException(
+            f"Range spans more than {settings.AGGREGATE_MAX_BUCKETS} {bucket.value} buckets; "
+            "use a larger bucket or a shorter range"
+        )
+
+    buckets = await weather_service.aggregate_weather(
+        location=location,
+        bucket=bucket.value,
+        metrics=metric_list,
+        start_time=start_date,
+        end_time=end_date
+    )
+
+    return {
+        "location": location,
+        "bucket": bucket,
+        "metrics": metric_list,
+        "data": buckets,
+        "message": f"Retrieved {len(buckets)} {bucket.value} buckets"
+    }
+
+
+@router.get("/stats", response_model=WeatherStatsResponse)
+async def get_weather_stats(
+    metrics: str = Query(
+        "temp_c,humidity,wind_kph,pressure_mb",
+        description=f"Comma-separated metrics, any of: {', '.join(NUMERIC_WEATHER_FIELDS)}"
+    ),
+    start_date: Optional[datetime] = Query(None, description="Start date/time in ISO format"),
+    end_date: Optional[datetime] = Query(None, description="End date/time in ISO format"),
+    location: Optional[str] = Query(None, description="Monitored location name, defaults to WEATHER_LOCATION"),
+    weather_service: WeatherService = Depends(get_weather_service)
+):
+    """
+    Get min/max/avg of selected metrics over a whole range
+    """
+    location = weather_service.resolve_location(location).name
+    metric_list = _parse_metrics(metrics)
+    start_date, end_date = _resolve_range(start_date, end_date)
+
+    stats = await weather_service.get_range_stats(location, metric_list, start_date, end_date)
+
+    return {
+        "location": location,
+        "start": start_date,
+        "end": end_date,
+        "count": stats["count"],
+        "metrics": stats["metrics"],
+        "message": f"Summarized {stats['count']} weather records"
     }
 
 
 @router.post("/refresh", response_model=WeatherResponse, status_code=status.HTTP_201_CREATED)
 async def refresh_weather_data(
+    location: Optional[str] = Query(None, description="Monitored location name, defaults to WEATHER_LOCATION"),
     weather_service: WeatherService = Depends(get_weather_service)
 ):
     """
     Force a refresh of weather data by fetching the current weather
     """
-    weather_data = await weather_service.fetch_and_store_weather()
+    weather_data = await weather_service.fetch_and_store_weather(location)
 
     return {
         "data": weather_data,
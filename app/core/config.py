@@ -1,9 +1,20 @@
 from pydantic_settings import BaseSettings
-from pydantic import Field, field_validator
-from typing import List, Union
+from pydantic import BaseModel, Field, field_validator, model_validator
+from typing import List, Literal, Optional, Union
 import os
 from functools import lru_cache
 
+ReadPreferenceMode = Literal["primary", "primaryPreferred", "secondary", "secondaryPreferred", "nearest"]
+
+
+class LocationSettings(BaseModel):
+    """A monitored location"""
+    name: str
+    lat: float
+    lon: float
+    city_id: Optional[int] = Field(None, description="OpenWeatherMap city ID, used by the group endpoint")
+    retention_days: Optional[int] = Field(None, description="Days of raw records to keep; defaults to RETENTION_DAYS")
+
 
 class Settings(BaseSettings):
     # Application settings
@@ -22,14 +33,127 @@ class Settings(BaseSettings):
     MONGODB_URI: str = Field("mongodb://localhost:27017/", description="MongoDB connection URI")
     MONGODB_DB_NAME: str = Field("weather_db", description="MongoDB database name")
     MONGODB_WEATHER_COLLECTION: str = Field("weather_data", description="MongoDB weather collection")
+    MONGODB_COUNTER_COLLECTION: str = Field("weather_counters", description="MongoDB per-location record counter collection")
+    MONGODB_ROLLUP_COLLECTION: str = Field("weather_rollups", description="MongoDB weather rollup collection")
+    MONGODB_LEASE_COLLECTION: str = Field("weather_leases", description="MongoDB leader election lease collection")
+    MONGODB_MAX_POOL_SIZE: int = Field(100, description="Maximum pooled connections per MongoDB server (maxPoolSize)")
+    MONGODB_MIN_POOL_SIZE: int = Field(10, description="Pooled connections kept open per MongoDB server even when idle (minPoolSize)")
+    MONGODB_MAX_IDLE_TIME_MS: int = Field(300000, description="Close pooled connections idle for longer than this (maxIdleTimeMS)")
+    MONGODB_WAIT_QUEUE_TIMEOUT_MS: int = Field(
+        5000, description="Fail an operation that waits longer than this for a free pooled connection (waitQueueTimeoutMS)"
+    )
+    MONGODB_COMPRESSORS: str = Field(
+        "", description="Comma-separated wire compressors in preference order: zstd (needs zstandard), snappy (needs python-snappy), zlib"
+    )
+    MONGODB_HISTORY_READ_PREFERENCE: ReadPreferenceMode = Field(
+        "secondaryPreferred", description="Read preference for history, aggregate, count and export queries"
+    )
+    MONGODB_LATEST_READ_PREFERENCE: ReadPreferenceMode = Field(
+        "primary", description="Read preference for the latest observation per location"
+    )
+    MONGODB_MAX_STALENESS_SECONDS: int = Field(
+        90, description="Skip secondaries lagging further behind than this (at least 90, or -1 for no bound)"
+    )
+    MONGODB_WARMUP_CONNECTIONS: int = Field(10, description="Pooled connections opened at startup before reporting ready")
+    READINESS_TIMEOUT_SECONDS: float = Field(2.0, description="How long the readiness check waits for MongoDB to answer")
 
     # Weather API settings
     WEATHER_API_KEY: str = Field("your_api_key_here", description="Weather API key")
     WEATHER_API_URL: str = Field("https://api.openweathermap.org/data/2.5/weather", description="Weather API URL")
-    WEATHER_LOCATION: str = Field("Austin,TX", description="Location to fetch weather for")
+    WEATHER_API_GROUP_URL: str = Field("https://api.openweathermap.org/data/2.5/group", description="Weather API multi-city URL")
+    WEATHER_FETCH_MODE: Literal["single", "group"] = Field(
+        "single", description="Fetch one location per call, or batch locations with a city_id via the group endpoint"
+    )
+    WEATHER_GROUP_BATCH_SIZE: int = Field(20, description="Maximum city IDs per group endpoint call")
+    WEATHER_LOCATION: str = Field("Austin,TX", description="Default location served by the API")
+    WEATHER_LATITUDE: float = Field(30.2672, description="Latitude of WEATHER_LOCATION")
+    WEATHER_LONGITUDE: float = Field(-97.7431, description="Longitude of WEATHER_LOCATION")
+    WEATHER_LOCATIONS: List[LocationSettings] = Field(
+        default_factory=list,
+        description="Monitored locations as a JSON list of {name, lat, lon}; defaults to WEATHER_LOCATION"
+    )
+
+    # Upstream rate limiting and failure handling
+    WEATHER_API_CALLS_PER_MINUTE: float = Field(60.0, description="Upstream call budget per minute, matching the API plan")
+    WEATHER_API_BURST: int = Field(10, description="Minimum upstream calls that may be made back to back; raised to cover one full refresh, up to a minute's budget")
+    WEATHER_BACKOFF_MAX_SECONDS: float = Field(600.0, description="Longest scheduler delay after repeated upstream failures")
+    WEATHER_BREAKER_FAILURE_THRESHOLD: int = Field(5, description="Consecutive upstream failures that open the circuit breaker")
+    WEATHER_BREAKER_RESET_SECONDS: float = Field(60.0, description="Seconds an open circuit waits before letting a probe request through")
+
+    # Upstream HTTP client settings
+    WEATHER_HTTP_TIMEOUT_SECONDS: float = Field(10.0, description="Upstream request timeout in seconds")
+    WEATHER_HTTP_MAX_CONNECTIONS: int = Field(20, description="Maximum concurrent upstream connections")
+    WEATHER_HTTP_MAX_KEEPALIVE_CONNECTIONS: int = Field(10, description="Maximum idle keep-alive upstream connections")
+    WEATHER_HTTP_KEEPALIVE_EXPIRY_SECONDS: float = Field(60.0, description="Idle keep-alive connection expiry in seconds")
+    WEATHER_HTTP2: bool = Field(False, description="Use HTTP/2 for upstream requests (requires h2)")
 
     # Scheduler settings
+    SCHEDULER_ENABLED: bool = Field(
+        True, description="Run ingestion and maintenance in the API process; disable when running app.worker"
+    )
+    WORKER_METRICS_PORT: Optional[int] = Field(None, description="Port for the worker's Prometheus /metrics endpoint")
     WEATHER_UPDATE_INTERVAL_SECONDS: int = Field(10, description="Weather update interval in seconds")
+    LEADER_ELECTION_ENABLED: bool = Field(
+        True, description="Run scheduled jobs only in the process holding the scheduler lease"
+    )
+    LEADER_LEASE_TTL_SECONDS: float = Field(30.0, description="Seconds a scheduler lease stays valid without renewal")
+    LEADER_HEARTBEAT_SECONDS: float = Field(10.0, description="Seconds between scheduler lease renewal attempts")
+    WEATHER_FETCH_CONCURRENCY: int = Field(10, description="Maximum concurrent upstream fetches per tick")
+    WEATHER_FETCH_DEADLINE_SECONDS: float = Field(8.0, description="Deadline for all fetches in one tick")
+    WEATHER_MIN_REFRESH_INTERVAL_SECONDS: float = Field(
+        5.0, description="A location fetched more recently than this is served from storage instead of refetched"
+    )
+    WEATHER_DEDUP_MODE: Literal["skip", "touch"] = Field(
+        "skip", description="For unchanged upstream observations: skip the write, or only bump last_seen"
+    )
+
+    # Cache settings
+    LATEST_CACHE_MAX_AGE_SECONDS: int = Field(30, description="Max age of cached latest observations in seconds")
+    HISTORY_CLOSED_RANGE_MAX_AGE_SECONDS: int = Field(
+        86400, description="HTTP Cache-Control max-age for history ranges that ended in the past"
+    )
+
+    # Retention settings
+    RETENTION_DAYS: int = Field(30, description="Default days of raw records to keep per location")
+    RETENTION_MODE: Literal["batched", "ttl"] = Field(
+        "batched", description="Delete expired records in rate-limited batches, or let a Mongo TTL index expire them"
+    )
+    RETENTION_BATCH_SIZE: int = Field(1000, description="Records removed per delete in batched retention")
+    RETENTION_MAX_DELETES_PER_SECOND: float = Field(5000.0, description="Rate limit for batched retention deletes")
+    RETENTION_INTERVAL_MINUTES: int = Field(60, description="Minutes between retention runs")
+    RETENTION_ROLLUP_BEFORE_DELETE: bool = Field(
+        True, description="Rebuild hour and day rollups from raw records before they are deleted"
+    )
+    ROLLUP_HOUR_RETENTION_DAYS: int = Field(
+        365, description="Days of hour rollups to keep; minute rollups go with the raw records and day rollups are kept"
+    )
+
+    # Streaming settings
+    STREAM_SOURCE: Literal["local", "change_stream"] = Field(
+        "local",
+        description="Feed stream subscribers from this process's ingest, or from a Mongo change stream (needs a replica set) when ingestion runs elsewhere"
+    )
+    STREAM_QUEUE_SIZE: int = Field(100, description="Events buffered per stream subscriber before it is dropped as too slow")
+    STREAM_HEARTBEAT_SECONDS: float = Field(15.0, description="Seconds between heartbeat comments on idle streams")
+
+    # Recent history settings
+    RECENT_HISTORY_ENABLED: bool = Field(
+        True, description="Keep recent observations in memory in API processes to serve history and aggregates without Mongo"
+    )
+    RECENT_HISTORY_HOURS: int = Field(
+        24, description="Hours of observations loaded per location at startup; keep within the shortest retention period"
+    )
+    RECENT_HISTORY_MAX_ROWS: int = Field(8640, description="Observations held in memory per location, which bounds its memory use")
+    RECENT_HISTORY_MAX_GAP_SECONDS: float = Field(
+        120.0, description="A location not confirmed by a scheduled ingest for this long is reloaded from Mongo before it is served again"
+    )
+
+    # Export settings
+    EXPORT_BATCH_SIZE: int = Field(1000, description="Documents per Mongo batch when streaming history exports")
+
+    # Aggregation settings
+    ROLLUPS_ENABLED: bool = Field(True, description="Maintain minute/hour/day rollups at ingest and serve aggregates from them")
+    AGGREGATE_MAX_BUCKETS: int = Field(5000, description="Maximum buckets a single aggregation request may span")
 
     # Logging
     LOG_LEVEL: str = Field("INFO", description="Logging level")
@@ -41,6 +165,33 @@ class Settings(BaseSettings):
             return [origin.strip() for origin in v.split(",")]
         return v
 
+    @field_validator("MONGODB_MAX_STALENESS_SECONDS")
+    @classmethod
+    def check_max_staleness(cls, v: int) -> int:
+        # MongoDB rejects smaller bounds, which could not be told apart from replication lag noise
+        if v != -1 and v < 90:
+            raise ValueError("MONGODB_MAX_STALENESS_SECONDS must be at least 90, or -1 for no bound")
+        return v
+
+    @model_validator(mode="after")
+    def default_locations(self) -> "Settings":
+        if not self.WEATHER_LOCATIONS:
+            self.WEATHER_LOCATIONS = [
+                LocationSettings(
+                    name=self.WEATHER_LOCATION,
+                    lat=self.WEATHER_LATITUDE,
+                    lon=self.WEATHER_LONGITUDE
+                )
+            ]
+        return self
+
+    def retention_days_for(self, location: str) -> int:
+        """Retention of a monitored location, falling back to RETENTION_DAYS"""
+        for monitored in self.WEATHER_LOCATIONS:
+            if monitored.name == location and monitored.retention_days is not None:
+                return monitored.retention_days
+        return self.RETENTION_DAYS
+
     model_config = {
         "env_file": ".env",
         "env_file_encoding": "utf-8",
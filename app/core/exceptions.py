@@ -1,12 +1,14 @@
+from typing import Optional
 from fastapi import HTTPException, status
 
 
 class WeatherAPIException(Exception):
     """Exception raised for errors in the weather API requests"""
 
-    def __init__(self, message: str, status_code: int = 500):
+    def __init__(self, message: str, status_code: int = 500, retry_after: Optional[float] = None):
         self.message = message
         self.status_code = status_code
+        self.retry_after = retry_after
         super().__init__(self.message)
 
 
@@ -0,0 +1,61 @@
+import httpx
+import logging
+from typing import Optional
+from app.core.config import get_settings
+
+logger = logging.getLogger("weather_service")
+settings = get_settings()
+
+
+class HTTPClient:
+    client: Optional[httpx.AsyncClient] = None
+
+
+http = HTTPClient()
+
+
+def _http2_available() -> bool:
+    """HTTP/2 support in httpx needs the optional h2 package"""
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+async def open_http_client():
+    """Create the shared, pooled upstream HTTP client"""
+    if http.client is not None:
+        return
+
+    use_http2 = settings.WEATHER_HTTP2
+    if use_http2 and not _http2_available():
+        logger.warning("WEATHER_HTTP2 is enabled but the h2 package is not installed; using HTTP/1.1")
+        use_http2 = False
+
+    http.client = httpx.AsyncClient(
+        timeout=httpx.Timeout(settings.WEATHER_HTTP_TIMEOUT_SECONDS),
+        limits=httpx.Limits(
+            max_connections=settings.WEATHER_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.WEATHER_HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.WEATHER_HTTP_KEEPALIVE_EXPIRY_SECONDS,
+        ),
+        http2=use_http2,
+        verify=False,
+    )
+    logger.info(f"Upstream HTTP client opened (http2={use_http2})")
+
+
+async def close_http_client():
+    """Close the shared upstream HTTP client"""
+    if http.client is not None:
+        await http.client.aclose()
+        http.client = None
+        logger.info("Upstream HTTP client closed")
+
+
+async def get_http_client() -> httpx.AsyncClient:
+    """Get the shared upstream HTTP client, opening it on first use"""
+    if http.client is None:
+        await open_http_client()
+    return http.client
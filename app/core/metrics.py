@@ -0,0 +1,274 @@
+"""
+Prometheus metrics for the API, upstream weather calls, MongoDB and the scheduler.
+
+Every recording is an in-process counter or histogram update, cheap enough
+to leave on in production. Metrics are exposed in text format at /metrics.
+"""
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable
+
+from prometheus_client import Counter, Histogram, CONTENT_TYPE_LATEST, generate_latest, REGISTRY
+from prometheus_client.core import GaugeMetricFamily, CounterMetricFamily
+from pymongo import monitoring
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route",
+    ["method", "route", "status"],
+)
+
+UPSTREAM_LATENCY = Histogram(
+    "weather_upstream_request_duration_seconds",
+    "Latency of upstream weather API requests",
+    ["endpoint"],
+)
+UPSTREAM_RESPONSES = Counter(
+    "weather_upstream_responses_total",
+    "Upstream weather API responses by status code, or timeout/error",
+    ["endpoint", "status"],
+)
+
+MONGO_LATENCY = Histogram(
+    "mongodb_command_duration_seconds",
+    "MongoDB command latency",
+    ["command", "collection"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+MONGO_FAILURES = Counter(
+    "mongodb_command_failures_total",
+    "Failed MongoDB commands",
+    ["command", "collection"],
+)
+
+MONGO_POOL_WAIT = Histogram(
+    "mongodb_pool_checkout_wait_seconds",
+    "Time spent waiting to check a connection out of the MongoDB pool",
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0),
+)
+MONGO_POOL_CHECKOUT_FAILURES = Counter(
+    "mongodb_pool_checkout_failures_total",
+    "Connection checkouts that failed, e.g. on waitQueueTimeoutMS",
+    ["reason"],
+)
+
+SCHEDULER_JOB_DURATION = Histogram(
+    "scheduler_job_duration_seconds",
+    "Duration of scheduled jobs",
+    ["job"],
+)
+SCHEDULER_JOB_LAG = Histogram(
+    "scheduler_job_lag_seconds",
+    "Delay between a job's scheduled run time and its submission",
+    ["job"],
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0),
+)
+SCHEDULER_MISSED_RUNS = Counter(
+    "scheduler_missed_runs_total",
+    "Scheduled runs skipped because they were late or the previous run was still going",
+    ["job", "reason"],
+)
+SCHEDULER_JOB_ERRORS = Counter(
+    "scheduler_job_errors_total",
+    "Scheduled jobs that raised",
+    ["job"],
+)
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """PyMongo command listener recording per-command latency and failures"""
+
+    def __init__(self):
+        self._collections: Dict[Any, str] = {}
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        collection = event.command.get(event.command_name)
+        self._collections[(event.connection_id, event.request_id)] = (
+            collection if isinstance(collection, str) else ""
+        )
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        collection = self._collections.pop((event.connection_id, event.request_id), "")
+        MONGO_LATENCY.labels(event.command_name, collection).observe(event.duration_micros / 1e6)
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        collection = self._collections.pop((event.connection_id, event.request_id), "")
+        MONGO_LATENCY.labels(event.command_name, collection).observe(event.duration_micros / 1e6)
+        MONGO_FAILURES.labels(event.command_name, collection).inc()
+
+
+class MongoPoolMetrics(monitoring.ConnectionPoolListener):
+    """
+    PyMongo pool listener tracking connection use, to size the pool.
+
+    The driver keeps one pool of up to ``max_pool_size`` connections per
+    server, so saturation is that of the busiest server's pool: with reads
+    spread over secondaries the total checked out can exceed one pool's size.
+    ``waiting`` is operations queued for a connection. Events arrive from
+    driver threads, hence the lock.
+    """
+
+    def __init__(self, max_pool_size: int):
+        self.max_pool_size = max_pool_size
+        self._lock = threading.Lock()
+        self.open = 0
+        self.checked_out = 0
+        self._checked_out_by_server: Dict[Any, int] = {}
+        self.peak_checked_out = 0
+        self.waiting = 0
+        self.checkouts = 0
+        self.failed_checkouts = 0
+
+    def connection_check_out_started(self, event) -> None:
+        with self._lock:
+            self.waiting += 1
+
+    def connection_checked_out(self, event) -> None:
+        with self._lock:
+            self.waiting -= 1
+            self.checked_out += 1
+            self._checked_out_by_server[event.address] = self._checked_out_by_server.get(event.address, 0) + 1
+            self.checkouts += 1
+            self.peak_checked_out = max(self.peak_checked_out, self.checked_out)
+        if getattr(event, "duration", None) is not None:
+            MONGO_POOL_WAIT.observe(event.duration)
+
+    def connection_check_out_failed(self, event) -> None:
+        with self._lock:
+            self.waiting -= 1
+            self.failed_checkouts += 1
+        MONGO_POOL_CHECKOUT_FAILURES.labels(event.reason).inc()
+
+    def connection_checked_in(self, event) -> None:
+        with self._lock:
+            self.checked_out -= 1
+            self._checked_out_by_server[event.address] = self._checked_out_by_server.get(event.address, 1) - 1
+
+    def connection_created(self, event) -> None:
+        with self._lock:
+            self.open += 1
+
+    def connection_closed(self, event) -> None:
+        with self._lock:
+            self.open -= 1
+
+    def connection_ready(self, event) -> None:
+        pass
+
+    def pool_created(self, event) -> None:
+        pass
+
+    def pool_ready(self, event) -> None:
+        pass
+
+    def pool_cleared(self, event) -> None:
+        pass
+
+    def pool_closed(self, event) -> None:
+        with self._lock:
+            self._checked_out_by_server.pop(event.address, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            busiest = max(self._checked_out_by_server.values(), default=0)
+        return {
+            "max_pool_size": self.max_pool_size,
+            "open": self.open,
+            "checked_out": self.checked_out,
+            "busiest_server_checked_out": busiest,
+            "peak_checked_out": self.peak_checked_out,
+            "waiting": self.waiting,
+            "saturation": round(busiest / self.max_pool_size, 4) if self.max_pool_size else 0.0,
+            "checkouts": self.checkouts,
+            "failed_checkouts": self.failed_checkouts,
+        }
+
+
+class StatsCollector:
+    """
+    Expose a component's stats() dict as Prometheus metrics at scrape time.
+
+    Nothing is recorded on the hot path; the source is only read when
+    /metrics is scraped. Keys listed in ``counters`` are exported as
+    counters, other numeric values as gauges.
+    """
+
+    def __init__(self, prefix: str, description: str, source: Callable[[], Dict[str, Any]], counters: Iterable[str] = ()):
+        self.prefix = prefix
+        self.description = description
+        self.source = source
+        self.counters = set(counters)
+
+    def collect(self):
+        for key, value in self.source().items():
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            name = f"{self.prefix}_{key}"
+            if key in self.counters:
+                yield CounterMetricFamily(name, f"{self.description}: {key}", value=value)
+            else:
+                yield GaugeMetricFamily(name, f"{self.description}: {key}", value=value)
+
+
+def register_stats(prefix: str, description: str, source: Callable[[], Dict[str, Any]], counters: Iterable[str] = ()) -> None:
+    """Register a stats() source with the default registry"""
+    REGISTRY.register(StatsCollector(prefix, description, source, counters))
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording request latency per route template.
+
+    Labels use the matched route's path (e.g. /api/weather/history), never
+    the raw URL, so label cardinality stays bounded. Streamed responses
+    (SSE, exports) are timed to their first body chunk, not to the end of a
+    stream that may stay open for minutes.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    @staticmethod
+    def _route_label(scope) -> str:
+        template = getattr(scope.get("route"), "path", None)
+        if template is None:
+            return "unmatched"
+        # Included routes are mounted with their full path; newer FastAPI releases
+        # instead keep the router's own path and record the include prefix here
+        included = (scope.get("fastapi") or {}).get("included_router")
+        return getattr(getattr(included, "include_context", None), "prefix", "") + template
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = {"code": 500}
+        started = time.perf_counter()
+        recorded = False
+
+        def observe():
+            nonlocal recorded
+            recorded = True
+            REQUEST_LATENCY.labels(
+                scope["method"], self._route_label(scope), str(status["code"])
+            ).observe(time.perf_counter() - started)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            elif message["type"] == "http.response.body" and message.get("more_body") and not recorded:
+                observe()
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            if not recorded:
+                observe()
+
+
+def render_metrics() -> bytes:
+    """Render all registered metrics in Prometheus text format"""
+    return generate_latest()
+
@@ -1,7 +1,11 @@
+import asyncio
+import importlib
 from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
-from typing import Optional, AsyncGenerator
+from pymongo.read_preferences import Primary, PrimaryPreferred, Secondary, SecondaryPreferred, Nearest
+from typing import Any, AsyncGenerator, Dict, List, Optional
 import logging
 from app.core.config import get_settings
+from app.core.metrics import MongoCommandMetrics, MongoPoolMetrics
 from contextlib import asynccontextmanager
 
 logger = logging.getLogger("weather_service")
@@ -14,14 +18,77 @@ class Database:
 
 
 db = Database()
+pool_metrics = MongoPoolMetrics(settings.MONGODB_MAX_POOL_SIZE)
+
+# Wire compressors and the optional packages they need
+COMPRESSOR_PACKAGES = {"zstd": "zstandard", "snappy": "snappy", "zlib": "zlib"}
+
+
+def _available_compressors() -> List[str]:
+    """The configured compressors whose packages are installed, in preference order"""
+    available = []
+    for name in (name.strip() for name in settings.MONGODB_COMPRESSORS.split(",")):
+        if not name:
+            continue
+        try:
+            importlib.import_module(COMPRESSOR_PACKAGES[name])
+            available.append(name)
+        except (KeyError, ImportError):
+            logger.warning(f"MongoDB compressor {name} is unknown or its package is not installed; skipping it")
+    return available
+
+
+READ_PREFERENCES = {
+    "primaryPreferred": PrimaryPreferred,
+    "secondary": Secondary,
+    "secondaryPreferred": SecondaryPreferred,
+    "nearest": Nearest,
+}
+
+
+def read_preference(mode: str):
+    """
+    Build a read preference for a mode name. Every mode but primary is
+    bounded by MONGODB_MAX_STALENESS_SECONDS, so a lagging secondary is
+    never chosen.
+    """
+    if mode == "primary":
+        return Primary()
+    return READ_PREFERENCES[mode](max_staleness=settings.MONGODB_MAX_STALENESS_SECONDS)
 
 
 async def connect_to_mongo():
     """Connect to MongoDB"""
     logger.info("Connecting to MongoDB...")
-    db.client = AsyncIOMotorClient(settings.MONGODB_URI)
+    options: Dict[str, Any] = {
+        "maxPoolSize": settings.MONGODB_MAX_POOL_SIZE,
+        "minPoolSize": settings.MONGODB_MIN_POOL_SIZE,
+        "maxIdleTimeMS": settings.MONGODB_MAX_IDLE_TIME_MS,
+        "waitQueueTimeoutMS": settings.MONGODB_WAIT_QUEUE_TIMEOUT_MS,
+    }
+    compressors = _available_compressors()
+    if compressors:
+        options["compressors"] = compressors
+    db.client = AsyncIOMotorClient(
+        settings.MONGODB_URI,
+        event_listeners=[MongoCommandMetrics(), pool_metrics],
+        **options
+    )
     db.db = db.client[settings.MONGODB_DB_NAME]
-    logger.info("Connected to MongoDB")
+    logger.info(
+        f"Connected to MongoDB (pool {settings.MONGODB_MIN_POOL_SIZE}-{settings.MONGODB_MAX_POOL_SIZE}, "
+        f"compressors: {', '.join(compressors) or 'none'})"
+    )
+
+
+async def prime_connections(count: int) -> None:
+    """
+    Open pooled connections ahead of traffic.
+
+    Runs ``count`` pings at once, so each needs its own connection and the
+    pool grows to that size before the first request has to wait for one.
+    """
+    await asyncio.gather(*(db.client.admin.command("ping") for _ in range(count)))
 
 
 async def close_mongo_connection():
@@ -0,0 +1,70 @@
+from datetime import datetime, timedelta
+from typing import Callable, Optional, Dict, Any
+from app.db.mongodb import db
+from app.core.config import get_settings
+from app.core.exceptions import DatabaseException
+import logging
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger("weather_service")
+settings = get_settings()
+
+
+class LeaseRepository:
+    """
+    Repository for named, time-limited leases used to elect a single owner.
+
+    One document per lease: ``{_id: name, owner, expires_at, renewed_at}``.
+    A lease is held by ``owner`` until ``expires_at``; after that anyone may
+    take it over. Expiry uses each process's clock, so hosts are expected to
+    be NTP-synced to well within the lease TTL.
+    """
+
+    def __init__(self, clock: Callable[[], datetime] = datetime.utcnow):
+        self.collection = db.db[settings.MONGODB_LEASE_COLLECTION]
+        self.clock = clock
+
+    async def try_acquire(self, name: str, owner: str, ttl_seconds: float) -> bool:
+        """
+        Acquire or renew a lease, returning whether ``owner`` now holds it.
+
+        Matches the lease only if this owner already holds it or it has
+        expired; otherwise the upsert collides with the existing _id and the
+        attempt fails.
+        """
+        now = self.clock()
+        try:
+            doc = await self.collection.find_one_and_update(
+                {"_id": name, "$or": [{"owner": owner}, {"expires_at": {"$lt": now}}]},
+                {"$set": {
+                    "owner": owner,
+                    "expires_at": now + timedelta(seconds=ttl_seconds),
+                    "renewed_at": now,
+                }},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+            return doc is not None and doc.get("owner") == owner
+        except DuplicateKeyError:
+            return False
+        except Exception as e:
+            logger.error(f"Failed to acquire lease {name}: {str(e)}")
+            raise DatabaseException(f"Error acquiring lease: {str(e)}")
+
+    async def release(self, name: str, owner: str) -> bool:
+        """Give up a lease if ``owner`` still holds it, so another process can take over immediately"""
+        try:
+            result = await self.collection.delete_one({"_id": name, "owner": owner})
+            return result.deleted_count > 0
+        except Exception as e:
+            logger.error(f"Failed to release lease {name}: {str(e)}")
+            raise DatabaseException(f"Error releasing lease: {str(e)}")
+
+    async def get(self, name: str) -> Optional[Dict[str, Any]]:
+        """Get the current lease document, if any"""
+        try:
+            return await self.collection.find_one({"_id": name})
+        except Exception as e:
+            logger.error(f"Failed to read lease {name}: {str(e)}")
+            raise DatabaseException(f"Error reading lease: {str(e)}")
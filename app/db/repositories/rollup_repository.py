@@ -0,0 +1,340 @@
+from datetime import datetime, timedelta
+from typing import List, Optional, Dict, Any, Set, Tuple
+from app.db.mongodb import db, read_preference
+from app.models.weather import WeatherData, NUMERIC_WEATHER_FIELDS
+from app.core.config import get_settings
+from app.core.exceptions import DatabaseException
+from app.utils.time_utils import floor_datetime, ceil_datetime
+import logging
+from pymongo import ASCENDING, IndexModel, UpdateOne
+
+logger = logging.getLogger("weather_service")
+settings = get_settings()
+
+GRANULARITIES: Dict[str, timedelta] = {
+    "minute": timedelta(minutes=1),
+    "hour": timedelta(hours=1),
+    "day": timedelta(days=1),
+}
+
+
+def plan_rollup_cover(start: datetime, end: datetime) -> List[Tuple[str, datetime, datetime]]:
+    """
+    Cover the minute-aligned range [start, end) with as few rollup buckets as possible.
+
+    Whole days are read from day rollups, whole hours at either edge from hour
+    rollups and the remaining minutes from minute rollups, so a 30-day range
+    costs roughly 30 + 2 * 23 + 2 * 59 documents at worst.
+    """
+    segments: List[Tuple[str, datetime, datetime]] = []
+
+    def add(granularity: str, segment_start: datetime, segment_end: datetime):
+        if segment_start < segment_end:
+            segments.append((granularity, segment_start, segment_end))
+
+    hour_start = ceil_datetime(start, GRANULARITIES["hour"])
+    hour_end = floor_datetime(end, GRANULARITIES["hour"])
+    if hour_start >= hour_end:
+        add("minute", start, end)
+        return segments
+
+    day_start = ceil_datetime(hour_start, GRANULARITIES["day"])
+    day_end = floor_datetime(hour_end, GRANULARITIES["day"])
+
+    add("minute", start, hour_start)
+    if day_start < day_end:
+        add("hour", hour_start, day_start)
+        add("day", day_start, day_end)
+        add("hour", day_end, hour_end)
+    else:
+        add("hour", hour_start, hour_end)
+    add("minute", hour_end, end)
+    return segments
+
+
+class RollupRepository:
+    """
+    Repository for pre-aggregated weather rollups.
+
+    Each document holds count, sum, min and max of every numeric WeatherCurrent
+    field for one location over one minute, hour or day bucket. Series and
+    range reads use ``reads``, with the history read preference.
+    ``backfilled`` holds the locations whose rollups are known to include
+    every raw record, as checked by ensure_backfilled.
+    """
+
+    def __init__(self):
+        self.collection = db.db[settings.MONGODB_ROLLUP_COLLECTION]
+        self.reads = self.collection.with_options(
+            read_preference=read_preference(settings.MONGODB_HISTORY_READ_PREFERENCE)
+        )
+        self.raw_collection = db.db[settings.MONGODB_WEATHER_COLLECTION]
+        self.counters = db.db[settings.MONGODB_COUNTER_COLLECTION]
+        self.backfilled: Set[str] = set()
+
+    async def initialize(self):
+        """Initialize rollup indexes"""
+        try:
+            await self.collection.create_indexes([
+                IndexModel(
+                    [("location", ASCENDING), ("granularity", ASCENDING), ("bucket_start", ASCENDING)],
+                    name="location_granularity_bucket",
+                    unique=True
+                )
+            ])
+            logger.info("Rollup repository initialized with indexes")
+        except Exception as e:
+            logger.error(f"Failed to initialize rollup repository: {str(e)}")
+            raise DatabaseException(f"Rollup initialization error: {str(e)}")
+
+    async def ensure_backfilled(self, locations: List[str]) -> None:
+        """
+        Rebuild every granularity from raw records for each location not backfilled yet.
+
+        Run at startup, after WeatherRepository.ensure_counters, so records
+        stored before rollups were enabled are included. A location is marked
+        on its counter document once done, so the rebuild happens only once.
+        Observations stored while it runs may be missed, which only skews
+        estimates by a few records.
+        """
+        try:
+            done = {
+                doc["_id"] async for doc in self.counters.find(
+                    {"_id": {"$in": locations}, "rollups_backfilled": True}, {"_id": 1}
+                )
+            }
+            for location in locations:
+                if location not in done:
+                    for granularity in GRANULARITIES:
+                        await self.rebuild(location, granularity)
+                    await self.counters.update_one({"_id": location}, {"$set": {"rollups_backfilled": True}})
+                    logger.info(f"Backfilled rollups for {location} from raw records")
+                self.backfilled.add(location)
+        except Exception as e:
+            logger.error(f"Failed to backfill weather rollups: {str(e)}")
+            raise DatabaseException(f"Error backfilling weather rollups: {str(e)}")
+
+    async def record(self, weather_data: List[WeatherData]) -> None:
+        """
+        Fold newly stored observations into their minute, hour and day rollups.
+
+        Observations sharing a bucket are merged in memory first so the batch
+        issues exactly one $inc/$min/$max upsert per rollup document.
+        """
+        merged: Dict[Tuple[str, str, datetime], Dict[str, Any]] = {}
+        for item in weather_data:
+            values = {field: getattr(item.current, field) for field in NUMERIC_WEATHER_FIELDS}
+            for granularity, step in GRANULARITIES.items():
+                key = (item.location, granularity, floor_datetime(item.timestamp, step))
+                bucket = merged.get(key)
+                if bucket is None:
+                    merged[key] = {"count": 1, "sum": dict(values), "min": dict(values), "max": dict(values)}
+                    continue
+                bucket["count"] += 1
+                for field, value in values.items():
+                    bucket["sum"][field] += value
+                    bucket["min"][field] = min(bucket["min"][field], value)
+                    bucket["max"][field] = max(bucket["max"][field], value)
+
+        if not merged:
+            return
+
+        operations = []
+        for (location, granularity, bucket_start), bucket in merged.items():
+            increments = {"count": bucket["count"]}
+            increments.update({f"sum.{field}": value for field, value in bucket["sum"].items()})
+            operations.append(UpdateOne(
+                {"location": location, "granularity": granularity, "bucket_start": bucket_start},
+                {
+                    "$inc": increments,
+                    "$min": {f"min.{field}": value for field, value in bucket["min"].items()},
+                    "$max": {f"max.{field}": value for field, value in bucket["max"].items()},
+                },
+                upsert=True
+            ))
+
+        try:
+            await self.collection.bulk_write(operations, ordered=False)
+        except Exception as e:
+            logger.error(f"Failed to update weather rollups: {str(e)}")
+            raise DatabaseException(f"Error updating weather rollups: {str(e)}")
+
+    async def get_series(
+        self,
+        location: str,
+        granularity: str,
+        metrics: List[str],
+        start_time: datetime,
+        end_time: datetime
+    ) -> List[Dict[str, Any]]:
+        """
+        Read a bucketed series straight from rollups of one granularity.
+
+        Returns the same shape as WeatherRepository.aggregate_history, one dict
+        per bucket overlapping [start_time, end_time], oldest first.
+        """
+        projection = {"bucket_start": 1, "count": 1}
+        for metric in metrics:
+            projection.update({f"sum.{metric}": 1, f"min.{metric}": 1, f"max.{metric}": 1})
+
+        try:
+            cursor = self.reads.find(
+                {
+                    "location": location,
+                    "granularity": granularity,
+                    "bucket_start": {
+                        "$gte": floor_datetime(start_time, GRANULARITIES[granularity]),
+                        "$lte": end_time
+                    }
+                },
+                projection
+            ).sort("bucket_start", ASCENDING)
+            docs = await cursor.to_list(length=None)
+        except Exception as e:
+            logger.error(f"Failed to get weather rollups: {str(e)}")
+            raise DatabaseException(f"Error retrieving weather rollups: {str(e)}")
+
+        return [
+            {
+                "start": doc["bucket_start"],
+                "count": doc["count"],
+                "metrics": {
+                    metric: {
+                        "min": doc["min"][metric],
+                        "max": doc["max"][metric],
+                        "avg": doc["sum"][metric] / doc["count"],
+                    }
+                    for metric in metrics
+                },
+            }
+            for doc in docs
+        ]
+
+    async def range_stats(
+        self,
+        location: str,
+        start_time: datetime,
+        end_time: datetime,
+        metrics: List[str]
+    ) -> Dict[str, Any]:
+        """
+        Summarize metrics over a range from rollups alone.
+
+        The range is widened to whole minutes and covered by the coarsest
+        buckets that fit, then combined into a single count and min/max/avg.
+        """
+        start = floor_datetime(start_time, GRANULARITIES["minute"])
+        end = ceil_datetime(end_time, GRANULARITIES["minute"])
+        segments = plan_rollup_cover(start, end)
+        if not segments:
+            return {"count": 0, "buckets_read": 0, "metrics": {metric: {"min": None, "max": None, "avg": None} for metric in metrics}}
+
+        projection = {"count": 1}
+        for metric in metrics:
+            projection.update({f"sum.{metric}": 1, f"min.{metric}": 1, f"max.{metric}": 1})
+
+        try:
+            cursor = self.reads.find(
+                {
+                    "location": location,
+                    "$or": [
+                        {"granularity": granularity, "bucket_start": {"$gte": segment_start, "$lt": segment_end}}
+                        for granularity, segment_start, segment_end in segments
+                    ],
+                },
+                projection
+            )
+            docs = await cursor.to_list(length=None)
+        except Exception as e:
+            logger.error(f"Failed to read weather rollups: {str(e)}")
+            raise DatabaseException(f"Error reading weather rollups: {str(e)}")
+
+        count = sum(doc["count"] for doc in docs)
+        summary = {}
+        for metric in metrics:
+            summary[metric] = {
+                "min": min((doc["min"][metric] for doc in docs), default=None),
+                "max": max((doc["max"][metric] for doc in docs), default=None),
+                "avg": sum(doc["sum"][metric] for doc in docs) / count if count else None,
+            }
+        return {"count": count, "buckets_read": len(docs), "metrics": summary}
+
+    async def range_count(self, location: str, start_time: datetime, end_time: datetime) -> int:
+        """Count records in a range from rollup counts, at minute resolution"""
+        stats = await self.range_stats(location, start_time, end_time, [])
+        return stats["count"]
+
+    async def delete_batch(self, location: str, granularity: str, older_than: datetime, batch_size: int) -> int:
+        """Delete up to ``batch_size`` of a location's oldest rollups of one granularity starting before ``older_than``"""
+        query = {"location": location, "granularity": granularity, "bucket_start": {"$lt": older_than}}
+        try:
+            cursor = self.collection.find(query, {"_id": 1}).sort("bucket_start", ASCENDING).limit(batch_size)
+            ids = [doc["_id"] async for doc in cursor]
+            if not ids:
+                return 0
+            result = await self.collection.delete_many({"_id": {"$in": ids}})
+            return result.deleted_count
+        except Exception as e:
+            logger.error(f"Failed to delete weather rollup batch: {str(e)}")
+            raise DatabaseException(f"Error cleaning up old weather rollups: {str(e)}")
+
+    async def rebuild(
+        self,
+        location: str,
+        granularity: str,
+        start_time: Optional[datetime] = None,
+        end_time: Optional[datetime] = None
+    ) -> None:
+        """
+        Recompute rollups of one granularity from raw records.
+
+        The range is widened to whole buckets and the result replaces any
+        existing rollup documents via $merge, so the rebuild is idempotent and
+        runs entirely on the server.
+        """
+        step = GRANULARITIES[granularity]
+        match: Dict[str, Any] = {"location": location}
+        time_query = {}
+        if start_time:
+            time_query["$gte"] = floor_datetime(start_time, step)
+        if end_time:
+            time_query["$lt"] = ceil_datetime(end_time, step)
+        if time_query:
+            match["timestamp"] = time_query
+
+        group: Dict[str, Any] = {
+            "_id": {"$dateTrunc": {"date": "$timestamp", "unit": granularity}},
+            "count": {"$sum": 1},
+        }
+        project: Dict[str, Any] = {
+            "_id": 0,
+            "location": {"$literal": location},
+            "granularity": {"$literal": granularity},
+            "bucket_start": "$_id",
+            "count": 1,
+        }
+        for field in NUMERIC_WEATHER_FIELDS:
+            group[f"sum_{field}"] = {"$sum": f"$current.{field}"}
+            group[f"min_{field}"] = {"$min": f"$current.{field}"}
+            group[f"max_{field}"] = {"$max": f"$current.{field}"}
+            project[f"sum.{field}"] = f"$sum_{field}"
+            project[f"min.{field}"] = f"$min_{field}"
+            project[f"max.{field}"] = f"$max_{field}"
+
+        pipeline = [
+            {"$match": match},
+            {"$group": group},
+            {"$project": project},
+            {"$merge": {
+                "into": settings.MONGODB_ROLLUP_COLLECTION,
+                "on": ["location", "granularity", "bucket_start"],
+                "whenMatched": "replace",
+                "whenNotMatched": "insert",
+            }},
+        ]
+
+        try:
+            await self.raw_collection.aggregate(pipeline).to_list(length=None)
+        except Exception as e:
+            logger.error(f"Failed to rebuild weather rollups: {str(e)}")
+            raise DatabaseException(f"Error rebuilding weather rollups: {str(e)}")
@@ -1,56 +1,225 @@
-from datetime import datetime
-from typing import List, Optional, Dict, Any
+from datetime import datetime, timedelta
+from collections import Counter
+from typing import List, Optional, Dict, Any, Tuple, AsyncGenerator
 from bson import ObjectId
-from app.db.mongodb import db
-from app.models.weather import WeatherData
+from app.db.mongodb import db, read_preference
+from app.models.weather import WeatherData, WEATHER_FIELD_PATHS
 from app.core.config import get_settings
 from app.core.exceptions import DatabaseException
+from app.utils.cursor_utils import encode_cursor, decode_cursor
+from app.utils.export_utils import get_path
 import logging
-from pymongo import DESCENDING, IndexModel
+from pymongo import ASCENDING, DESCENDING, IndexModel, InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError
 
 logger = logging.getLogger("weather_service")
 settings = get_settings()
 
 
 class WeatherRepository:
-    """Repository for weather data operations"""
+    """
+    Repository for weather data operations.
+
+    Writes and maintenance go through ``collection`` on the primary. History,
+    aggregate, count and export reads use ``history_reads`` and the latest
+    observation uses ``latest_reads``, each with its configured read
+    preference, so read traffic can be spread over replica set secondaries.
+    """
 
     def __init__(self):
         self.collection = db.db[settings.MONGODB_WEATHER_COLLECTION]
+        self.history_reads = self.collection.with_options(
+            read_preference=read_preference(settings.MONGODB_HISTORY_READ_PREFERENCE)
+        )
+        self.latest_reads = self.collection.with_options(
+            read_preference=read_preference(settings.MONGODB_LATEST_READ_PREFERENCE)
+        )
+        self.counters = db.db[settings.MONGODB_COUNTER_COLLECTION]
+
+    @staticmethod
+    def _range_query(
+        location: str,
+        start_time: Optional[datetime] = None,
+        end_time: Optional[datetime] = None
+    ) -> Dict[str, Any]:
+        """Build the filter for a location and optional inclusive time range"""
+        query: Dict[str, Any] = {"location": location}
+        if start_time or end_time:
+            time_query = {}
+            if start_time:
+                time_query["$gte"] = start_time
+            if end_time:
+                time_query["$lte"] = end_time
+            query["timestamp"] = time_query
+        return query
 
     async def initialize(self):
         """Initialize database indexes"""
         try:
-            # Create indexes
+            # Create indexes. The compound index serves every per-location
+            # range scan and keyset page; _id breaks timestamp ties so the
+            # sort order is total and fully covered by the index.
             await self.collection.create_indexes([
+                IndexModel(
+                    [("location", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)],
+                    name="location_timestamp_id"
+                ),
                 IndexModel([("timestamp", DESCENDING)]),
-                IndexModel([("location", 1)])
+                IndexModel(
+                    [("location", ASCENDING), ("observed_at", DESCENDING)],
+                    name="location_observed_at_unique",
+                    unique=True,
+                    partialFilterExpression={"observed_at": {"$type": "date"}}
+                )
             ])
+            if settings.RETENTION_MODE == "ttl":
+                # Each record carries its own expiry, so per-location retention needs one index
+                await self.collection.create_index(
+                    [("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0
+                )
             logger.info("Weather repository initialized with indexes")
         except Exception as e:
             logger.error(f"Failed to initialize weather repository: {str(e)}")
             raise DatabaseException(f"Database initialization error: {str(e)}")
 
-    async def create(self, weather_data: WeatherData) -> str:
-        """Insert new weather record"""
+    async def verify_indexes(self) -> None:
+        """Raise DatabaseException unless every index initialize() creates is present"""
+        expected = {"location_timestamp_id", "timestamp_-1", "location_observed_at_unique"}
+        if settings.RETENTION_MODE == "ttl":
+            expected.add("expires_at_ttl")
+        try:
+            existing = set(await self.collection.index_information())
+        except Exception as e:
+            logger.error(f"Failed to list weather indexes: {str(e)}")
+            raise DatabaseException(f"Error listing indexes: {str(e)}")
+        missing = expected - existing
+        if missing:
+            raise DatabaseException(f"Missing weather indexes: {', '.join(sorted(missing))}")
+
+    @staticmethod
+    def _to_document(weather_data: WeatherData, exclude: set) -> Dict[str, Any]:
+        """Shape a record for storage, stamping expires_at when retention is enforced by a TTL index"""
+        document = weather_data.model_dump(exclude=exclude)
+        if settings.RETENTION_MODE == "ttl":
+            document["expires_at"] = document["timestamp"] + timedelta(
+                days=settings.retention_days_for(weather_data.location)
+            )
+        return document
+
+    async def store_observations(
+        self,
+        weather_data: List[WeatherData],
+        touch: bool = False
+    ) -> Tuple[List[WeatherData], List[WeatherData]]:
+        """
+        Store observations that are not already in the collection, in one bulk write.
+
+        Observations are keyed on (location, observed_at) through a unique
+        index, so an upstream reading that has not changed since the last
+        fetch is never written twice. With ``touch`` an unchanged reading
+        bumps ``last_seen`` on the stored record instead. An upsert that loses
+        a race with a concurrent writer to the unique index counts as a
+        duplicate too. Returns the newly inserted observations and, for
+        duplicates, the records already stored.
+        """
+        if not weather_data:
+            return [], []
+
+        now = datetime.utcnow()
+        operations = []
+        new_ids = []
+        for item in weather_data:
+            document = self._to_document(item, exclude={"id", "last_seen"})
+            document["_id"] = ObjectId()
+            new_ids.append(document["_id"])
+            if item.observed_at is None:
+                operations.append(InsertOne(document))
+                continue
+            update: Dict[str, Any] = {"$setOnInsert": document}
+            if touch:
+                update["$set"] = {"last_seen": now}
+            operations.append(UpdateOne(
+                {"location": item.location, "observed_at": item.observed_at},
+                update,
+                upsert=True
+            ))
+
         try:
-            weather_dict = weather_data.dict(exclude={"id"})
-            result = await self.collection.insert_one(weather_dict)
-            return str(result.inserted_id)
+            result = await self.collection.bulk_write(operations, ordered=False)
+            upserted, write_errors = set(result.upserted_ids), []
+        except BulkWriteError as e:
+            # A concurrent writer (say /refresh racing the worker) can insert the
+            # same observation between our upsert's match and its insert. The
+            # unique index rejects ours as a duplicate; the rest of the batch
+            # is still applied and must be accounted for.
+            upserted = {op["index"] for op in e.details.get("upserted", [])}
+            write_errors = e.details.get("writeErrors", [])
         except Exception as e:
-            logger.error(f"Failed to insert weather data: {str(e)}")
+            logger.error(f"Failed to store weather observations: {str(e)}")
             raise DatabaseException(f"Error saving weather data: {str(e)}")
 
+        raced = {error["index"] for error in write_errors if error.get("code") == 11000}
+        failed = {error["index"] for error in write_errors} - raced
+        inserted, duplicates = [], []
+        for index, item in enumerate(weather_data):
+            if index in failed:
+                continue
+            if index in upserted or (item.observed_at is None and index not in raced):
+                item.id = str(new_ids[index])
+                inserted.append(item)
+            else:
+                duplicates.append(item)
+        await self._adjust_counts(Counter(item.location for item in inserted))
+
+        if failed:
+            message = next(error.get("errmsg") for error in write_errors if error["index"] in failed)
+            logger.error(f"Failed to store {len(failed)} weather observation(s): {message}")
+            raise DatabaseException(f"Error saving weather data: {message}")
+
+        try:
+            if touch and raced:
+                await self.collection.update_many(
+                    {"$or": [
+                        {"location": weather_data[index].location, "observed_at": weather_data[index].observed_at}
+                        for index in raced
+                    ]},
+                    {"$set": {"last_seen": now}}
+                )
+
+            existing = []
+            if duplicates:
+                cursor = self.collection.find({"$or": [
+                    {"location": item.location, "observed_at": item.observed_at} for item in duplicates
+                ]})
+                async for doc in cursor:
+                    existing.append(WeatherData.from_document(doc))
+            return inserted, existing
+        except Exception as e:
+            logger.error(f"Failed to read back duplicate weather observations: {str(e)}")
+            raise DatabaseException(f"Error saving weather data: {str(e)}")
+
+    async def touch(self, weather_ids: List[str]) -> None:
+        """Bump last_seen on already stored observations"""
+        if not weather_ids:
+            return
+        try:
+            await self.collection.update_many(
+                {"_id": {"$in": [ObjectId(weather_id) for weather_id in weather_ids]}},
+                {"$set": {"last_seen": datetime.utcnow()}}
+            )
+        except Exception as e:
+            logger.error(f"Failed to touch weather observations: {str(e)}")
+            raise DatabaseException(f"Error updating weather data: {str(e)}")
+
     async def get_latest(self, location: str) -> Optional[WeatherData]:
         """Get the latest weather data for a location"""
         try:
-            result = await self.collection.find_one(
+            result = await self.latest_reads.find_one(
                 {"location": location},
                 sort=[("timestamp", DESCENDING)]
             )
             if result:
-                result["id"] = str(result["_id"])
-                return WeatherData(**result)
+                return WeatherData.from_document(result)
             return None
         except Exception as e:
             logger.error(f"Failed to get latest weather data: {str(e)}")
@@ -65,39 +234,284 @@ class WeatherRepository:
         skip: int = 0
     ) -> List[WeatherData]:
         """Get historical weather data with optional time range"""
+        result, _, _ = await self.get_history_page(
+            location, start_time=start_time, end_time=end_time, limit=limit, skip=skip
+        )
+        return result
+
+    async def get_history_page(
+        self,
+        location: str,
+        start_time: Optional[datetime] = None,
+        end_time: Optional[datetime] = None,
+        limit: int = 100,
+        skip: int = 0,
+        after: Optional[str] = None,
+        before: Optional[str] = None,
+        raw: bool = False,
+        fields: Optional[List[str]] = None
+    ) -> Tuple[List[Any], Optional[str], Optional[str]]:
+        """
+        Get one page of historical weather data, newest first.
+
+        Pages are addressed either by ``skip`` or by an opaque ``after``/``before``
+        cursor taken from a previous page. Cursor pages seek straight to their
+        position in the (location, timestamp, _id) index, so page N costs the
+        same as page 1. Returns the records plus the cursors for the next
+        (older) and previous (newer) pages, or None where there is no such page.
+        With ``raw`` the records are plain dicts shaped like serialized
+        WeatherData, ready for direct JSON encoding, instead of models.
+        With ``fields`` (names from WEATHER_FIELD_PATHS) only those paths are
+        projected from Mongo and each record is a flat dict of just them.
+        Raises ValueError for a malformed cursor.
+        """
+        cursor_token = after or before
+        cursor_key = decode_cursor(cursor_token) if cursor_token else None
+
         try:
-            query = {"location": location}
+            query = self._range_query(location, start_time, end_time)
+            if cursor_key:
+                timestamp, object_id = cursor_key
+                op = "$lt" if after else "$gt"
+                query = {"$and": [query, {"$or": [
+                    {"timestamp": {op: timestamp}},
+                    {"timestamp": timestamp, "_id": {op: object_id}}
+                ]}]}
 
-            if start_time or end_time:
-                time_query = {}
-                if start_time:
-                    time_query["$gte"] = start_time
-                if end_time:
-                    time_query["$lte"] = end_time
-                query["timestamp"] = time_query
+            projection = None
+            if fields:
+                # timestamp and _id are always read, the cursors are built from them
+                projection = {WEATHER_FIELD_PATHS[field]: 1 for field in fields}
+                projection.update({"timestamp": 1, "_id": 1})
 
-            cursor = self.collection.find(query)
-            cursor = cursor.sort("timestamp", DESCENDING)
-            cursor = cursor.skip(skip).limit(limit)
+            direction = ASCENDING if before else DESCENDING
+            cursor = self.history_reads.find(query, projection)
+            cursor = cursor.sort([("timestamp", direction), ("_id", direction)])
+            if not cursor_token:
+                cursor = cursor.skip(skip)
+            cursor = cursor.limit(limit + 1)
 
-            result = []
-            async for doc in cursor:
-                doc["id"] = str(doc["_id"])
-                result.append(WeatherData(**doc))
+            docs = await cursor.to_list(length=limit + 1)
+            has_more = len(docs) > limit
+            docs = docs[:limit]
+            if before:
+                docs.reverse()
 
-            return result
+            if fields:
+                paths = [(field, WEATHER_FIELD_PATHS[field]) for field in fields]
+                result = [
+                    {field: str(doc["_id"]) if path == "_id" else get_path(doc, path) for field, path in paths}
+                    for doc in docs
+                ]
+            else:
+                to_record = WeatherData.document_to_dict if raw else WeatherData.from_document
+                result = [to_record(doc) for doc in docs]
+
+            first = encode_cursor(docs[0]["timestamp"], str(docs[0]["_id"])) if docs else None
+            last = encode_cursor(docs[-1]["timestamp"], str(docs[-1]["_id"])) if docs else None
+            if before:
+                next_cursor, prev_cursor = last, first if has_more else None
+            else:
+                next_cursor = last if has_more else None
+                prev_cursor = first if (after or skip) else None
+
+            return result, next_cursor, prev_cursor
         except Exception as e:
             logger.error(f"Failed to get weather history: {str(e)}")
             raise DatabaseException(f"Error retrieving weather history: {str(e)}")
 
-    async def count_records(self, location: str) -> int:
-        """Count weather records for a location"""
+    async def stream_history(
+        self,
+        location: str,
+        start_time: Optional[datetime] = None,
+        end_time: Optional[datetime] = None,
+        batch_size: int = 1000,
+        primary: bool = False
+    ) -> AsyncGenerator[List[Dict[str, Any]], None]:
+        """
+        Stream raw weather documents oldest first, one Motor batch at a time.
+
+        Documents are yielded as-is, without model validation, so memory stays
+        bounded by ``batch_size`` however large the range is. ``primary``
+        reads from the primary, for callers that must see every stored record.
+        """
+        query = self._range_query(location, start_time, end_time)
+        cursor = (self.collection if primary else self.history_reads).find(query)
+        cursor = cursor.sort([("timestamp", ASCENDING), ("_id", ASCENDING)])
+        cursor = cursor.batch_size(batch_size)
+
         try:
-            return await self.collection.count_documents({"location": location})
+            batch = []
+            async for doc in cursor:
+                batch.append(doc)
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+            if batch:
+                yield batch
+        except Exception as e:
+            logger.error(f"Failed to stream weather history: {str(e)}")
+            raise DatabaseException(f"Error streaming weather history: {str(e)}")
+        finally:
+            await cursor.close()
+
+    async def aggregate_history(
+        self,
+        location: str,
+        bucket: Optional[str],
+        metrics: List[str],
+        start_time: Optional[datetime] = None,
+        end_time: Optional[datetime] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Bucket weather records by time and summarize numeric metrics server-side.
+
+        The $match stage is served by the (location, timestamp) index and the
+        $group stage truncates timestamps to ``bucket`` (minute, hour or day),
+        or folds the whole range into one bucket when ``bucket`` is None.
+        Returns one dict per bucket, oldest first, with ``start``, ``count``
+        and ``metrics`` mapping each metric to its min/max/avg.
+        """
+        group: Dict[str, Any] = {
+            "_id": {"$dateTrunc": {"date": "$timestamp", "unit": bucket}} if bucket else None,
+            "count": {"$sum": 1},
+        }
+        for metric in metrics:
+            group[f"{metric}_min"] = {"$min": f"$current.{metric}"}
+            group[f"{metric}_max"] = {"$max": f"$current.{metric}"}
+            group[f"{metric}_avg"] = {"$avg": f"$current.{metric}"}
+
+        pipeline = [
+            {"$match": self._range_query(location, start_time, end_time)},
+            {"$group": group},
+            {"$sort": {"_id": ASCENDING}},
+        ]
+
+        try:
+            result = []
+            async for doc in self.history_reads.aggregate(pipeline):
+                result.append({
+                    "start": doc["_id"],
+                    "count": doc["count"],
+                    "metrics": {
+                        metric: {
+                            "min": doc[f"{metric}_min"],
+                            "max": doc[f"{metric}_max"],
+                            "avg": doc[f"{metric}_avg"],
+                        }
+                        for metric in metrics
+                    },
+                })
+            return result
+        except Exception as e:
+            logger.error(f"Failed to aggregate weather history: {str(e)}")
+            raise DatabaseException(f"Error aggregating weather history: {str(e)}")
+
+    async def _adjust_counts(self, deltas: Dict[str, int]) -> None:
+        """Apply per-location deltas to the maintained record counters"""
+        operations = [
+            UpdateOne({"_id": location}, {"$inc": {"count": delta}}, upsert=True)
+            for location, delta in deltas.items() if delta
+        ]
+        if not operations:
+            return
+        try:
+            await self.counters.bulk_write(operations, ordered=False)
+        except Exception as e:
+            # The records themselves are stored; a drifted counter is repaired by ensure_counters
+            logger.error(f"Failed to update weather record counters: {str(e)}")
+
+    async def ensure_counters(self, locations: List[str]) -> None:
+        """
+        Seed the maintained counter of each location that does not have one yet.
+
+        Run at startup so records stored before counters existed are included.
+        Inserts racing the seed may be missed, which only skews the estimate
+        by a few records.
+        """
+        try:
+            existing = {doc["_id"] async for doc in self.counters.find({"_id": {"$in": locations}}, {"_id": 1})}
+            for location in locations:
+                if location in existing:
+                    continue
+                count = await self.collection.count_documents({"location": location})
+                await self.counters.update_one(
+                    {"_id": location}, {"$setOnInsert": {"count": count}}, upsert=True
+                )
+                logger.info(f"Seeded record counter for {location} with {count} records")
+        except Exception as e:
+            logger.error(f"Failed to seed weather record counters: {str(e)}")
+            raise DatabaseException(f"Error seeding weather record counters: {str(e)}")
+
+    async def get_maintained_count(self, location: str) -> int:
+        """Get a location's lifetime record count from its maintained counter, in O(1)"""
+        try:
+            doc = await self.counters.find_one({"_id": location})
+            if doc is None:
+                return await self.collection.count_documents({"location": location})
+            return max(doc["count"], 0)
+        except Exception as e:
+            logger.error(f"Failed to read weather record counter: {str(e)}")
+            raise DatabaseException(f"Error counting weather records: {str(e)}")
+
+    async def count_records(
+        self,
+        location: str,
+        start_time: Optional[datetime] = None,
+        end_time: Optional[datetime] = None
+    ) -> int:
+        """Count weather records for a location exactly, optionally within a time range"""
+        try:
+            return await self.history_reads.count_documents(self._range_query(location, start_time, end_time))
         except Exception as e:
             logger.error(f"Failed to count weather records: {str(e)}")
             raise DatabaseException(f"Error counting weather records: {str(e)}")
 
+    async def reconcile_count(self, location: str) -> int:
+        """Reset a location's maintained counter to an exact count, e.g. after TTL deletes it never saw"""
+        try:
+            count = await self.collection.count_documents({"location": location})
+            await self.counters.update_one({"_id": location}, {"$set": {"count": count}}, upsert=True)
+            return count
+        except Exception as e:
+            logger.error(f"Failed to reconcile weather record counter: {str(e)}")
+            raise DatabaseException(f"Error counting weather records: {str(e)}")
+
+    async def get_oldest_timestamp(self, location: str) -> Optional[datetime]:
+        """Timestamp of a location's oldest stored record"""
+        try:
+            doc = await self.collection.find_one(
+                {"location": location}, {"timestamp": 1}, sort=[("timestamp", ASCENDING)]
+            )
+            return doc["timestamp"] if doc else None
+        except Exception as e:
+            logger.error(f"Failed to get oldest weather record: {str(e)}")
+            raise DatabaseException(f"Error retrieving weather data: {str(e)}")
+
+    async def delete_batch(self, location: str, older_than: datetime, batch_size: int, without_expiry: bool = False) -> int:
+        """
+        Delete up to ``batch_size`` of a location's oldest records before ``older_than``.
+
+        Ids are picked through the (location, timestamp) index and deleted by
+        _id, so each call is a short, bounded write instead of one delete_many
+        over the whole expired range. With ``without_expiry`` only records
+        that no TTL index would expire are considered.
+        """
+        query: Dict[str, Any] = {"location": location, "timestamp": {"$lt": older_than}}
+        if without_expiry:
+            query["expires_at"] = {"$exists": False}
+        try:
+            cursor = self.collection.find(query, {"_id": 1}).sort("timestamp", ASCENDING).limit(batch_size)
+            ids = [doc["_id"] async for doc in cursor]
+            if not ids:
+                return 0
+            result = await self.collection.delete_many({"_id": {"$in": ids}})
+            await self._adjust_counts({location: -result.deleted_count})
+            return result.deleted_count
+        except Exception as e:
+            logger.error(f"Failed to delete weather record batch: {str(e)}")
+            raise DatabaseException(f"Error cleaning up old weather records: {str(e)}")
+
     async def cleanup_old_records(self, location: str, older_than: datetime) -> int:
         """Delete weather records older than a specific date"""
         try:
@@ -105,6 +519,7 @@ class WeatherRepository:
                 "location": location,
                 "timestamp": {"$lt": older_than}
             })
+            await self._adjust_counts({location: -result.deleted_count})
             return result.deleted_count
         except Exception as e:
             logger.error(f"Failed to clean up old records: {str(e)}")
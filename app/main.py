@@ -1,14 +1,24 @@
+import asyncio
+import time
+from math import ceil
 import logging.config
 from fastapi import FastAPI, Request, status
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 
 from app.core.config import get_settings
 from app.core.exceptions import WeatherAPIException, DatabaseException
 from app.core.logging_config import setup_logging, get_logger
-from app.db.mongodb import connect_to_mongo, close_mongo_connection
-from app.services.scheduler_service import SchedulerService
+from app.core.metrics import MetricsMiddleware, CONTENT_TYPE_LATEST, register_stats, render_metrics
+from app.db.mongodb import connect_to_mongo, close_mongo_connection, prime_connections, pool_metrics
+from app.core.http_client import open_http_client, close_http_client
+from app.db.repositories.weather_repository import WeatherRepository
+from app.services.scheduler_service import start_scheduler, stop_scheduler
+from app.services.cache_service import latest_weather_cache
+from app.services.broadcast_service import weather_broadcaster, watch_weather_changes
+from app.services.recent_history_service import recent_history
+from app.services.weather_service import WeatherService, ingest_stats
 from app.api.routes import weather, health
 
 # Setup logging first before importing other modules
@@ -17,6 +27,34 @@ logger = get_logger()
 
 settings = get_settings()
 scheduler = None
+change_stream_task = None
+
+
+async def warm_up(weather_service: WeatherService):
+    """
+    Prepare for traffic before reporting ready: indexes exist, the connection
+    pool is open, and the latest observations and recent history are in
+    memory, so the first requests after a deploy cost no more than later ones.
+    """
+    started = time.perf_counter()
+    await prime_connections(settings.MONGODB_WARMUP_CONNECTIONS)
+
+    weather_repository = weather_service.repository
+    await weather_repository.initialize()
+    await weather_repository.verify_indexes()
+    await weather_repository.ensure_counters([location.name for location in settings.WEATHER_LOCATIONS])
+    await weather_service.backfill_rollups()
+
+    preloaded = await weather_service.preload_latest()
+
+    # Serve recent history from memory; loaded before ingestion starts feeding it
+    if settings.RECENT_HISTORY_ENABLED:
+        await recent_history.start(weather_repository, [location.name for location in settings.WEATHER_LOCATIONS])
+
+    logger.info(
+        f"Warm-up finished in {(time.perf_counter() - started) * 1000:.1f} ms: "
+        f"{settings.MONGODB_WARMUP_CONNECTIONS} connections, latest observations for {preloaded} location(s)"
+    )
 
 
 @asynccontextmanager
@@ -24,17 +62,36 @@ async def lifespan(app: FastAPI):
     """
     Application lifespan - handles startup and shutdown events
     """
-    global scheduler
+    global scheduler, change_stream_task
 
     # Startup
     logger.info("Starting Weather Monitoring Service")
+    app.state.ready = False
     try:
         await connect_to_mongo()
-
-        # Initialize and start the scheduler
-        scheduler = SchedulerService()
-        scheduler.start()
-
+        await open_http_client()
+
+        # Built once and shared by every request (see app.api.deps) and the scheduler
+        weather_repository = WeatherRepository()
+        weather_service = WeatherService(repository=weather_repository)
+        app.state.weather_repository = weather_repository
+        app.state.weather_service = weather_service
+        await warm_up(weather_service)
+
+        # Ingestion runs here unless it has been moved to a separate app.worker process
+        if settings.SCHEDULER_ENABLED:
+            scheduler = await start_scheduler(weather_service)
+            app.state.scheduler = scheduler
+        else:
+            logger.info("Scheduler disabled in the API process")
+
+        # Stream subscribers follow inserts made by other processes through a change stream
+        if settings.STREAM_SOURCE == "change_stream":
+            change_stream_task = asyncio.create_task(
+                watch_weather_changes(weather_broadcaster, latest_weather_cache, recent_history)
+            )
+
+        app.state.ready = True
         logger.info("Application startup complete")
     except Exception as e:
         logger.error(f"Startup error: {str(e)}")
@@ -42,11 +99,16 @@ async def lifespan(app: FastAPI):
 
     yield
 
-    # Shutdown
+    # Shutdown; report not ready first so load balancers stop routing here
+    app.state.ready = False
     logger.info("Shutting down Weather Monitoring Service")
     try:
+        if change_stream_task:
+            change_stream_task.cancel()
+        recent_history.stop()
         if scheduler:
-            scheduler.shutdown()
+            await stop_scheduler(scheduler)
+        await close_http_client()
         await close_mongo_connection()
         logger.info("Application shutdown complete")
     except Exception as e:
@@ -73,6 +135,15 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.add_middleware(MetricsMiddleware)
+
+# Expose cache, ingest, stream, recent history and connection pool counters alongside the latency histograms
+register_stats("weather_latest_cache", "Latest-observation cache", latest_weather_cache.stats, counters=("hits", "misses"))
+register_stats("weather_ingest", "Observation ingest", ingest_stats.stats, counters=("inserted", "unchanged", "duplicates", "writes_avoided"))
+register_stats("weather_stream", "Streaming subscribers", weather_broadcaster.stats, counters=("published", "delivered", "dropped"))
+register_stats("mongodb_pool", "MongoDB connection pool", pool_metrics.stats, counters=("checkouts", "failed_checkouts"))
+register_stats("weather_recent_history", "In-memory recent history", recent_history.stats, counters=("served", "fallbacks"))
+
 # Include routers
 app.include_router(health.router, prefix="/api")
 app.include_router(weather.router, prefix="/api")
@@ -82,9 +153,11 @@ app.include_router(weather.router, prefix="/api")
 @app.exception_handler(WeatherAPIException)
 async def handle_weather_api_exception(request: Request, exc: WeatherAPIException):
     logger.error(f"Weather API error: {exc.message}")
+    headers = {"Retry-After": str(ceil(exc.retry_after))} if exc.retry_after is not None else None
     return JSONResponse(
         status_code=exc.status_code,
-        content={"detail": exc.message}
+        content={"detail": exc.message},
+        headers=headers
     )
 
 
@@ -106,6 +179,11 @@ async def root():
     }
 
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return Response(content=render_metrics(), media_type=CONTENT_TYPE_LATEST)
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(
@@ -1,6 +1,8 @@
 from pydantic import BaseModel, Field
 from datetime import datetime
+from enum import Enum
 from typing import Optional, Dict, Any, List
+from datetime import timedelta
 
 
 class WeatherBase(BaseModel):
@@ -33,6 +35,28 @@ class WeatherCurrent(BaseModel):
     condition: WeatherCondition
 
 
+# Numeric WeatherCurrent fields that can be aggregated and rolled up
+NUMERIC_WEATHER_FIELDS: List[str] = [
+    "temp_c", "temp_f", "feelslike_c", "feelslike_f", "humidity", "wind_kph",
+    "wind_mph", "pressure_mb", "precip_mm", "cloud", "uv",
+]
+
+
+# Selectable flat history fields and their paths in stored documents
+WEATHER_FIELD_PATHS: Dict[str, str] = {
+    "id": "_id",
+    "location": "location",
+    "timestamp": "timestamp",
+    "observed_at": "observed_at",
+    **{field: f"current.{field}" for field in NUMERIC_WEATHER_FIELDS},
+    "wind_dir": "current.wind_dir",
+    "condition": "current.condition.text",
+    "condition_code": "current.condition.code",
+    "condition_icon": "current.condition.icon",
+    "localtime": "location_data.localtime",
+}
+
+
 class WeatherLocation(BaseModel):
     """Location information"""
     name: str
@@ -47,9 +71,44 @@ class WeatherLocation(BaseModel):
 class WeatherData(WeatherBase):
     """Complete weather data model"""
     id: Optional[str] = None
+    observed_at: Optional[datetime] = Field(None, description="Upstream observation time (OpenWeatherMap dt)")
+    last_seen: Optional[datetime] = Field(None, description="Last time upstream returned this observation")
     location_data: WeatherLocation
     current: WeatherCurrent
 
+    @classmethod
+    def from_document(cls, document: Dict[str, Any]) -> "WeatherData":
+        """
+        Build from a stored Mongo document without validation.
+
+        Only for documents this service wrote itself, which were validated on
+        the way in; skips re-validating three nested models per row.
+        """
+        current = dict(document["current"])
+        current["condition"] = WeatherCondition.model_construct(**current["condition"])
+        return cls.model_construct(
+            id=str(document["_id"]),
+            location=document["location"],
+            timestamp=document["timestamp"],
+            observed_at=document.get("observed_at"),
+            last_seen=document.get("last_seen"),
+            location_data=WeatherLocation.model_construct(**document["location_data"]),
+            current=WeatherCurrent.model_construct(**current),
+        )
+
+    @staticmethod
+    def document_to_dict(document: Dict[str, Any]) -> Dict[str, Any]:
+        """Shape a stored Mongo document like a serialized WeatherData, without building models"""
+        return {
+            "location": document["location"],
+            "timestamp": document["timestamp"],
+            "id": str(document["_id"]),
+            "observed_at": document.get("observed_at"),
+            "last_seen": document.get("last_seen"),
+            "location_data": document["location_data"],
+            "current": document["current"],
+        }
+
     model_config = {
         "json_schema_extra": {
             "example": {
@@ -94,8 +153,72 @@ class WeatherResponse(BaseModel):
     message: str = "Weather data retrieved successfully"
 
 
+class WeatherHistoryFieldsResponse(BaseModel):
+    """API response model for weather history restricted to selected fields"""
+    fields: List[str]
+    data: List[Dict[str, Any]] = Field(description="Flat rows holding only the selected fields")
+    count: int = Field(description="Records matching the range; estimated unless count_exact")
+    count_exact: bool = False
+    next_cursor: Optional[str] = Field(None, description="Pass as 'after' to fetch the next (older) page")
+    prev_cursor: Optional[str] = Field(None, description="Pass as 'before' to fetch the previous (newer) page")
+    message: str = "Weather history retrieved successfully"
+
+
 class WeatherHistoryResponse(BaseModel):
     """API response model for weather history"""
     data: List[WeatherData]
-    count: int
+    count: int = Field(description="Records matching the range; estimated unless count_exact")
+    count_exact: bool = False
+    next_cursor: Optional[str] = Field(None, description="Pass as 'after' to fetch the next (older) page")
+    prev_cursor: Optional[str] = Field(None, description="Pass as 'before' to fetch the previous (newer) page")
     message: str = "Weather history retrieved successfully"
+
+
+class ExportFormat(str, Enum):
+    """Supported history export formats"""
+    NDJSON = "ndjson"
+    CSV = "csv"
+
+
+class AggregationBucket(str, Enum):
+    """Bucket sizes for aggregated weather series"""
+    MINUTE = "minute"
+    HOUR = "hour"
+    DAY = "day"
+
+    @property
+    def duration(self) -> timedelta:
+        return {"minute": timedelta(minutes=1), "hour": timedelta(hours=1), "day": timedelta(days=1)}[self.value]
+
+
+class MetricSummary(BaseModel):
+    """Summary statistics of one metric within a bucket"""
+    min: Optional[float] = None
+    max: Optional[float] = None
+    avg: Optional[float] = None
+
+
+class WeatherAggregateBucket(BaseModel):
+    """One time bucket of an aggregated weather series"""
+    start: datetime
+    count: int
+    metrics: Dict[str, MetricSummary]
+
+
+class WeatherAggregateResponse(BaseModel):
+    """API response model for aggregated weather series"""
+    location: str
+    bucket: AggregationBucket
+    metrics: List[str]
+    data: List[WeatherAggregateBucket]
+    message: str = "Weather aggregates retrieved successfully"
+
+
+class WeatherStatsResponse(BaseModel):
+    """API response model for range statistics"""
+    location: str
+    start: datetime
+    end: datetime
+    count: int
+    metrics: Dict[str, MetricSummary]
+    message: str = "Weather statistics retrieved successfully"
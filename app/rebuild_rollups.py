@@ -0,0 +1,51 @@
+"""
+Backfill or repair weather rollups from raw records.
+
+API startup already backfills each location once, covering records stored
+before rollups were enabled; use this to repair a range after that.
+
+Usage:
+    python -m app.rebuild_rollups [--location NAME] [--start ISO] [--end ISO]
+"""
+import argparse
+import asyncio
+from datetime import datetime
+
+from app.core.config import get_settings
+from app.core.logging_config import setup_logging, get_logger
+from app.db.mongodb import connect_to_mongo, close_mongo_connection
+from app.db.repositories.rollup_repository import RollupRepository, GRANULARITIES
+
+setup_logging()
+logger = get_logger()
+settings = get_settings()
+
+
+async def rebuild(locations, start_time, end_time):
+    """Rebuild every rollup granularity for the given locations"""
+    await connect_to_mongo()
+    try:
+        rollups = RollupRepository()
+        await rollups.initialize()
+        for location in locations:
+            for granularity in GRANULARITIES:
+                logger.info(f"Rebuilding {granularity} rollups for {location}")
+                await rollups.rebuild(location, granularity, start_time=start_time, end_time=end_time)
+        logger.info("Rollup rebuild complete")
+    finally:
+        await close_mongo_connection()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild weather rollups from raw records")
+    parser.add_argument("--location", action="append", help="Location to rebuild (repeatable, default: all monitored)")
+    parser.add_argument("--start", type=datetime.fromisoformat, help="Start of the range in ISO format")
+    parser.add_argument("--end", type=datetime.fromisoformat, help="End of the range in ISO format")
+    args = parser.parse_args()
+
+    locations = args.location or [location.name for location in settings.WEATHER_LOCATIONS]
+    asyncio.run(rebuild(locations, args.start, args.end))
+
+
+if __name__ == "__main__":
+    main()
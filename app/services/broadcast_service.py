@@ -0,0 +1,155 @@
+import asyncio
+import logging
+from typing import Dict, Iterable, List, Optional, Set, Any
+import orjson
+from app.core.config import get_settings
+from app.db.mongodb import db
+from app.models.weather import WeatherData
+from app.services.cache_service import LatestWeatherCache
+from app.services.recent_history_service import RecentHistory
+
+logger = logging.getLogger("weather_service")
+settings = get_settings()
+
+# Queued in place of events when a subscriber is dropped for falling behind
+DROPPED = object()
+
+
+def encode_event(weather_data: WeatherData) -> bytes:
+    """Encode an observation as one Server-Sent Events frame"""
+    payload = orjson.dumps(weather_data.model_dump(), option=orjson.OPT_NON_STR_KEYS)
+    return b"event: observation\nid: " + str(weather_data.id).encode() + b"\ndata: " + payload + b"\n\n"
+
+
+class Subscription:
+    """One subscriber's bounded queue of encoded events"""
+
+    def __init__(self, locations: Optional[Set[str]], queue_size: int):
+        self.locations = locations
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.dropped = False
+
+    def offer(self, event: bytes) -> bool:
+        """Queue an event without waiting; False if the subscriber is too far behind"""
+        try:
+            self.queue.put_nowait(event)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    def drop(self) -> None:
+        """Discard the backlog and wake the consumer so it can disconnect"""
+        self.dropped = True
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(DROPPED)
+
+
+class Broadcaster:
+    """
+    In-process fan-out of new observations to streaming subscribers.
+
+    Each observation is encoded once and the same bytes are queued for every
+    interested subscriber, so publishing costs no queries and one encode
+    regardless of subscriber count. Subscribers whose bounded queue is full
+    are dropped rather than allowed to buffer without limit.
+    """
+
+    def __init__(self, queue_size: Optional[int] = None):
+        self.queue_size = queue_size or settings.STREAM_QUEUE_SIZE
+        self._by_location: Dict[str, Set[Subscription]] = {}
+        self._all_locations: Set[Subscription] = set()
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+
+    def subscribe(self, locations: Optional[Iterable[str]] = None) -> Subscription:
+        """Subscribe to some locations, or to every location if none are given"""
+        subscription = Subscription(set(locations) if locations else None, self.queue_size)
+        if subscription.locations is None:
+            self._all_locations.add(subscription)
+        else:
+            for location in subscription.locations:
+                self._by_location.setdefault(location, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        self._all_locations.discard(subscription)
+        for location in subscription.locations or ():
+            subscribers = self._by_location.get(location)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._by_location[location]
+
+    def publish(self, weather_data: List[WeatherData]) -> None:
+        """Queue new observations for every subscriber of their location"""
+        for item in weather_data:
+            subscribers = self._all_locations | self._by_location.get(item.location, set())
+            self.published += 1
+            if not subscribers:
+                continue
+            event = encode_event(item)
+            for subscription in subscribers:
+                if subscription.offer(event):
+                    self.delivered += 1
+                else:
+                    logger.warning("Dropping stream subscriber that fell behind")
+                    self.unsubscribe(subscription)
+                    subscription.drop()
+                    self.dropped += 1
+
+    def stats(self) -> Dict[str, Any]:
+        subscribers = set(self._all_locations)
+        for location_subscribers in self._by_location.values():
+            subscribers |= location_subscribers
+        return {
+            "subscribers": len(subscribers),
+            "published": self.published,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+        }
+
+
+weather_broadcaster = Broadcaster()
+
+
+async def watch_weather_changes(
+    broadcaster: Broadcaster,
+    cache: Optional[LatestWeatherCache] = None,
+    recent: Optional[RecentHistory] = None
+) -> None:
+    """
+    Publish observations inserted by other processes, read from a Mongo change stream.
+
+    For API processes when ingestion runs in app.worker. Requires a replica
+    set. Reconnects with the last resume token after errors, and refreshes
+    ``cache`` and ``recent`` with each observation when given.
+    """
+    collection = db.db[settings.MONGODB_WEATHER_COLLECTION]
+    pipeline = [{"$match": {"operationType": "insert"}}]
+    resume_token = None
+    delay = 1.0
+    while True:
+        try:
+            async with collection.watch(pipeline, resume_after=resume_token) as stream:
+                logger.info("Watching weather inserts for streaming subscribers")
+                delay = 1.0
+                if recent is not None:
+                    recent.attach_stream()
+                async for change in stream:
+                    resume_token = stream.resume_token
+                    weather_data = WeatherData.from_document(change["fullDocument"])
+                    if cache is not None:
+                        cache.set(weather_data)
+                    if recent is not None:
+                        recent.add([weather_data])
+                    broadcaster.publish([weather_data])
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            if recent is not None:
+                recent.detach_stream()
+            logger.error(f"Weather change stream failed, retrying in {delay:.0f}s: {str(e)}")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 60.0)
@@ -0,0 +1,81 @@
+import logging
+import time
+from typing import Dict, Iterable, Optional, Tuple, Any
+from app.core.config import get_settings
+from app.models.weather import WeatherData
+
+logger = logging.getLogger("weather_service")
+settings = get_settings()
+
+
+class LatestWeatherCache:
+    """In-process write-through cache of the latest observation per location"""
+
+    def __init__(self, max_age_seconds: Optional[float] = None):
+        self.max_age_seconds = (
+            max_age_seconds if max_age_seconds is not None
+            else settings.LATEST_CACHE_MAX_AGE_SECONDS
+        )
+        self._entries: Dict[str, Tuple[WeatherData, float]] = {}
+        self._fetched: Dict[str, float] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, location: str) -> Optional[WeatherData]:
+        """Return the cached observation if it is younger than the max age"""
+        entry = self._entries.get(location)
+        if entry is not None and time.monotonic() - entry[1] <= self.max_age_seconds:
+            self.hits += 1
+            return entry[0]
+
+        self.misses += 1
+        return None
+
+    def peek(self, location: str) -> Optional[WeatherData]:
+        """Return the cached observation regardless of age, without counting a lookup"""
+        entry = self._entries.get(location)
+        return entry[0] if entry is not None else None
+
+    def mark_fetched(self, locations: Iterable[str]) -> None:
+        """Record that these locations were just fetched from upstream"""
+        now = time.monotonic()
+        for location in locations:
+            self._fetched[location] = now
+
+    def since_fetched(self, location: str) -> Optional[float]:
+        """
+        Seconds since this process last fetched the location from upstream.
+
+        Entries loaded from Mongo do not count, so this is None until the
+        first fetch.
+        """
+        fetched = self._fetched.get(location)
+        return time.monotonic() - fetched if fetched is not None else None
+
+    def set(self, weather_data: WeatherData) -> None:
+        """Store an observation unless a newer one is already cached"""
+        entry = self._entries.get(weather_data.location)
+        if entry is not None and entry[0].timestamp > weather_data.timestamp:
+            return
+        self._entries[weather_data.location] = (weather_data, time.monotonic())
+
+    def invalidate(self, location: Optional[str] = None) -> None:
+        """Drop one location, or every location if none is given"""
+        if location is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(location, None)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters for monitoring"""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "entries": len(self._entries),
+            "max_age_seconds": self.max_age_seconds,
+        }
+
+
+latest_weather_cache = LatestWeatherCache()
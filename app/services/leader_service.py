@@ -0,0 +1,123 @@
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from typing import Any, Callable, Dict, Optional
+from app.core.config import get_settings
+from app.db.repositories.lease_repository import LeaseRepository
+
+logger = logging.getLogger("weather_service")
+settings = get_settings()
+
+
+class LeaderElection:
+    """
+    Elect one process to own a role through a heartbeated Mongo lease.
+
+    Every process runs the same loop: try to acquire or renew the lease every
+    LEADER_HEARTBEAT_SECONDS. The holder renews it before it expires; if the
+    holder dies, the lease lapses after LEADER_LEASE_TTL_SECONDS and the next
+    heartbeat of another process takes it over. ``on_elected`` and
+    ``on_demoted`` are called on each change of leadership; if ``on_elected``
+    raises, the process steps down and hands the lease back so it is not
+    left holding a role it never took up.
+    """
+
+    def __init__(
+        self,
+        name: str = "scheduler",
+        repository: Optional[LeaseRepository] = None,
+        on_elected: Optional[Callable[[], None]] = None,
+        on_demoted: Optional[Callable[[], None]] = None,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.name = name
+        self.owner_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.repository = repository or LeaseRepository()
+        self.on_elected = on_elected
+        self.on_demoted = on_demoted
+        self.clock = clock
+        self.ttl_seconds = settings.LEADER_LEASE_TTL_SECONDS
+        self.heartbeat_seconds = settings.LEADER_HEARTBEAT_SECONDS
+        self.is_leader = False
+        self._valid_until = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        """Make a first attempt right away, then keep heartbeating in the background"""
+        await self.heartbeat()
+        self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.heartbeat_seconds)
+            try:
+                await self.heartbeat()
+            except Exception as e:
+                # Never let one bad heartbeat end the loop and freeze leadership as it is
+                logger.error(f"Lease heartbeat for {self.name} raised: {str(e)}")
+
+    async def heartbeat(self):
+        """Acquire or renew the lease and apply any change of leadership"""
+        attempted_at = self.clock()
+        try:
+            held = await self.repository.try_acquire(self.name, self.owner_id, self.ttl_seconds)
+            if held:
+                self._valid_until = attempted_at + self.ttl_seconds
+        except Exception as e:
+            # Can't reach Mongo: keep leading only while our last lease is certainly still valid
+            logger.error(f"Lease heartbeat for {self.name} failed: {str(e)}")
+            held = self.is_leader and self.clock() < self._valid_until - self.heartbeat_seconds
+
+        if held and not self.is_leader:
+            self.is_leader = True
+            logger.info(f"Acquired {self.name} lease as {self.owner_id}")
+            if not self._notify(self.on_elected, "elected"):
+                await self._step_down()
+        elif not held and self.is_leader:
+            self.is_leader = False
+            logger.warning(f"Lost {self.name} lease as {self.owner_id}")
+            self._notify(self.on_demoted, "demoted")
+
+    def _notify(self, callback: Optional[Callable[[], None]], event: str) -> bool:
+        """Run a leadership callback, logging rather than raising if it fails"""
+        if callback is None:
+            return True
+        try:
+            callback()
+            return True
+        except Exception as e:
+            logger.error(f"{self.name} {event} callback failed: {str(e)}")
+            return False
+
+    async def _step_down(self):
+        """Give up leadership and the lease, if held, so another process can take over"""
+        if not self.is_leader:
+            return
+        self.is_leader = False
+        self._notify(self.on_demoted, "demoted")
+        try:
+            await self.repository.release(self.name, self.owner_id)
+            logger.info(f"Released {self.name} lease")
+        except Exception as e:
+            logger.error(f"Failed to release {self.name} lease: {str(e)}")
+
+    async def stop(self):
+        """Stop heartbeating and hand the lease back so another process can take over at once"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self._step_down()
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "lease": self.name,
+            "owner_id": self.owner_id,
+            "is_leader": self.is_leader,
+        }
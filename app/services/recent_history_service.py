@@ -0,0 +1,594 @@
+import asyncio
+import logging
+import math
+import time
+from array import array
+from datetime import datetime, timedelta
+from itertools import groupby
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from bson import ObjectId
+from app.core.config import get_settings
+from app.db.repositories.rollup_repository import GRANULARITIES
+from app.db.repositories.weather_repository import WeatherRepository
+from app.models.weather import WeatherData, WeatherCurrent, NUMERIC_WEATHER_FIELDS
+from app.utils.cursor_utils import EPOCH, decode_cursor, encode_cursor
+
+logger = logging.getLogger("weather_service")
+settings = get_settings()
+
+# Stands in for a missing time in the integer columns
+MISSING = -(2 ** 63)
+INT_FIELDS = {name for name, field in WeatherCurrent.model_fields.items() if field.annotation is int}
+CURRENT_FIELDS = list(WeatherCurrent.model_fields)
+
+COLD, WARMING, READY = "cold", "warming", "ready"
+
+# (timestamp ms, _id bytes, observed_at ms, last_seen ms, localtime minutes,
+#  numeric values, wind_dir, condition, place)
+Row = Tuple[int, bytes, int, int, int, List[float], str, tuple, tuple]
+
+
+def _to_ms(dt: Optional[datetime]) -> int:
+    """Milliseconds since the epoch, the precision Mongo stores datetimes at"""
+    if dt is None:
+        return MISSING
+    if dt.tzinfo is not None:
+        dt = dt.replace(tzinfo=None) - dt.utcoffset()
+    return (dt - EPOCH) // timedelta(milliseconds=1)
+
+
+def _from_ms(ms: int) -> Optional[datetime]:
+    return None if ms == MISSING else EPOCH + timedelta(milliseconds=ms)
+
+
+def _parse_localtime(text: str) -> int:
+    """Minutes since the epoch for a 'YYYY-MM-DD HH:MM' localtime, or MISSING"""
+    try:
+        if len(text) != 16 or text[4] != "-" or text[7] != "-" or text[10] != " " or text[13] != ":":
+            return MISSING
+        dt = datetime(int(text[:4]), int(text[5:7]), int(text[8:10]), int(text[11:13]), int(text[14:]))
+    except (TypeError, ValueError):
+        return MISSING
+    return (dt - EPOCH) // timedelta(minutes=1)
+
+
+def _row(document: Dict[str, Any]) -> Row:
+    """Flatten a stored document, or a dumped WeatherData, into one ring row"""
+    object_id = document["_id"] if "_id" in document else ObjectId(document["id"])
+    current = document["current"]
+    condition = current["condition"]
+    place = document["location_data"]
+    localtime = _parse_localtime(place["localtime"])
+    return (
+        _to_ms(document["timestamp"]),
+        object_id.binary,
+        _to_ms(document.get("observed_at")),
+        _to_ms(document.get("last_seen")),
+        localtime,
+        [math.nan if current.get(field) is None else float(current[field]) for field in NUMERIC_WEATHER_FIELDS],
+        current["wind_dir"],
+        (condition["text"], condition["code"], condition["icon"]),
+        # The raw localtime is only kept when it isn't in the usual format
+        (place["name"], place["region"], place["country"], place["lat"], place["lon"], place["tz_id"],
+         place["localtime"] if localtime == MISSING else None),
+    )
+
+
+class _Codes:
+    """Interns a column's distinct values so each row stores a small integer code"""
+
+    def __init__(self):
+        self.values: List[Any] = []
+        self._codes: Dict[Any, int] = {}
+
+    def code(self, value: Any) -> int:
+        code = self._codes.get(value)
+        if code is None:
+            code = self._codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+
+class LocationRing:
+    """
+    Fixed-capacity columnar buffer of one location's recent observations.
+
+    Every column is a preallocated array of ``capacity`` slots used as a
+    circular buffer, so memory is fixed when the ring is created. Rows are
+    kept in (timestamp, _id) order; once full, each new row evicts the
+    oldest. Text columns store codes into per-ring tables of distinct values.
+    ``covered_since`` is the earliest timestamp (ms) from which the ring
+    holds every stored observation.
+    """
+
+    def __init__(self, location: str, capacity: int):
+        self.location = location
+        self.capacity = capacity
+        self.size = 0
+        self.head = 0
+        self.covered_since = MISSING
+        self.timestamps = array("q", bytes(8 * capacity))
+        self.observed_at = array("q", bytes(8 * capacity))
+        self.last_seen = array("q", bytes(8 * capacity))
+        self.localtime = array("q", bytes(8 * capacity))
+        self.numeric = {field: array("d", bytes(8 * capacity)) for field in NUMERIC_WEATHER_FIELDS}
+        self.wind_dirs = array("I", bytes(4 * capacity))
+        self.conditions = array("I", bytes(4 * capacity))
+        self.places = array("I", bytes(4 * capacity))
+        self.ids = bytearray(12 * capacity)
+        self.wind_dir_codes = _Codes()
+        self.condition_codes = _Codes()
+        self.place_codes = _Codes()
+        self.has_missing = False
+        self._columns = [
+            self.timestamps, self.observed_at, self.last_seen, self.localtime,
+            *self.numeric.values(), self.wind_dirs, self.conditions, self.places,
+        ]
+
+    def _slot(self, index: int) -> int:
+        return (self.head + index) % self.capacity
+
+    def _key(self, index: int) -> Tuple[int, bytes]:
+        slot = self._slot(index)
+        return self.timestamps[slot], bytes(self.ids[12 * slot:12 * slot + 12])
+
+    def _bisect(self, key: Tuple[int, bytes], right: bool = False) -> int:
+        """First row index whose (timestamp, _id) is >= key, or > key with ``right``"""
+        low, high = 0, self.size
+        while low < high:
+            middle = (low + high) // 2
+            current = self._key(middle)
+            if current < key or (right and current == key):
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _bisect_time(self, ms: int, right: bool = False) -> int:
+        """First row index with timestamp >= ms, or > ms with ``right``"""
+        low, high = 0, self.size
+        while low < high:
+            middle = (low + high) // 2
+            current = self.timestamps[self._slot(middle)]
+            if current < ms or (right and current == ms):
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _move(self, source: int, target: int) -> None:
+        for column in self._columns:
+            column[target] = column[source]
+        self.ids[12 * target:12 * target + 12] = self.ids[12 * source:12 * source + 12]
+
+    def _write(self, slot: int, row: Row) -> None:
+        timestamp, object_id, observed_at, last_seen, localtime, values, wind_dir, condition, place = row
+        self.timestamps[slot] = timestamp
+        self.ids[12 * slot:12 * slot + 12] = object_id
+        self.observed_at[slot] = observed_at
+        self.last_seen[slot] = last_seen
+        self.localtime[slot] = localtime
+        for field, value in zip(NUMERIC_WEATHER_FIELDS, values):
+            self.numeric[field][slot] = value
+            if value != value:
+                self.has_missing = True
+        self.wind_dirs[slot] = self.wind_dir_codes.code(wind_dir)
+        self.conditions[slot] = self.condition_codes.code(condition)
+        self.places[slot] = self.place_codes.code(place)
+
+    def insert(self, row: Row) -> bool:
+        """Add a row in order, evicting the oldest when full; False if it is already held or too old"""
+        key = (row[0], row[1])
+        if row[0] < self.covered_since:
+            return False
+        position = self.size
+        if self.size and key <= self._key(self.size - 1):
+            # Out-of-order arrivals are rare; shift the newer rows up to make room
+            position = self._bisect(key)
+            if position < self.size and self._key(position) == key:
+                return False
+            if position == 0 and self.size == self.capacity:
+                return False
+
+        if self.size == self.capacity:
+            self.covered_since = max(self.covered_since, self.timestamps[self.head] + 1)
+            self.head = self._slot(1)
+            self.size -= 1
+            position -= 1
+        for index in range(self.size, position, -1):
+            self._move(self._slot(index - 1), self._slot(index))
+        self._write(self._slot(position), row)
+        self.size += 1
+        return True
+
+    def range(self, start_ms: int, end_ms: Optional[int]) -> Tuple[int, int]:
+        """Row indices [low, high) with timestamps within [start_ms, end_ms]"""
+        low = self._bisect_time(start_ms)
+        high = self.size if end_ms is None else self._bisect_time(end_ms, right=True)
+        return low, max(low, high)
+
+    def column(self, column: array, low: int, high: int) -> array:
+        """The values of rows [low, high) of a column, unwrapped"""
+        if high <= low:
+            return column[0:0]
+        first, last = self._slot(low), self._slot(high - 1)
+        if first <= last:
+            return column[first:last + 1]
+        return column[first:] + column[:last + 1]
+
+    def _times(self, column: array, slots: List[int]) -> List[Optional[datetime]]:
+        step = timedelta(milliseconds=1)
+        return [None if column[slot] == MISSING else EPOCH + column[slot] * step for slot in slots]
+
+    def _values(self, field: str, slots: List[int]) -> List[Any]:
+        column = self.numeric[field]
+        values = [column[slot] for slot in slots]
+        if self.has_missing:
+            values = [None if value != value else value for value in values]
+        if field in INT_FIELDS:
+            values = [None if value is None else int(value) for value in values]
+        return values
+
+    def _localtimes(self, slots: List[int]) -> List[str]:
+        step = timedelta(minutes=1)
+        places = self.place_codes.values
+        return [
+            places[self.places[slot]][6] if self.localtime[slot] == MISSING
+            else (EPOCH + self.localtime[slot] * step).isoformat(" ", "minutes")
+            for slot in slots
+        ]
+
+    def _field(self, field: str, slots: List[int]) -> List[Any]:
+        """One flat field (a WEATHER_FIELD_PATHS name) for each slot"""
+        if field == "id":
+            return [self.ids[12 * slot:12 * slot + 12].hex() for slot in slots]
+        if field == "location":
+            return [self.location] * len(slots)
+        if field == "timestamp":
+            return self._times(self.timestamps, slots)
+        if field == "observed_at":
+            return self._times(self.observed_at, slots)
+        if field == "localtime":
+            return self._localtimes(slots)
+        if field == "wind_dir":
+            return [self.wind_dir_codes.values[self.wind_dirs[slot]] for slot in slots]
+        if field.startswith("condition"):
+            part = {"condition": 0, "condition_code": 1, "condition_icon": 2}[field]
+            return [self.condition_codes.values[self.conditions[slot]][part] for slot in slots]
+        return self._values(field, slots)
+
+    def records(self, indices: List[int], fields: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """
+        Rebuild rows as dicts shaped like WeatherData.document_to_dict, or as
+        flat dicts of ``fields`` (names from WEATHER_FIELD_PATHS). Built a
+        column at a time, which is much cheaper than row by row.
+        """
+        slots = [self._slot(index) for index in indices]
+        if fields is not None:
+            columns = [self._field(field, slots) for field in fields]
+            return [dict(zip(fields, values)) for values in zip(*columns)]
+
+        conditions = [{"text": text, "code": code, "icon": icon} for text, code, icon in self.condition_codes.values]
+        current_columns = []
+        for field in CURRENT_FIELDS:
+            if field == "condition":
+                current_columns.append([conditions[self.conditions[slot]] for slot in slots])
+            else:
+                current_columns.append(self._field(field, slots))
+        places = self.place_codes.values
+        return [
+            {
+                "location": self.location,
+                "timestamp": timestamp,
+                "id": object_id,
+                "observed_at": observed_at,
+                "last_seen": last_seen,
+                "location_data": {
+                    "name": place[0], "region": place[1], "country": place[2],
+                    "lat": place[3], "lon": place[4], "tz_id": place[5], "localtime": localtime,
+                },
+                "current": dict(zip(CURRENT_FIELDS, current)),
+            }
+            for timestamp, object_id, observed_at, last_seen, place, localtime, current in zip(
+                self._times(self.timestamps, slots),
+                self._field("id", slots),
+                self._times(self.observed_at, slots),
+                self._times(self.last_seen, slots),
+                [places[self.places[slot]] for slot in slots],
+                self._localtimes(slots),
+                zip(*current_columns),
+            )
+        ]
+
+    def memory_bytes(self) -> int:
+        """Bytes held by the row columns; fixed by the capacity"""
+        return sum(column.buffer_info()[1] * column.itemsize for column in self._columns) + len(self.ids)
+
+
+class RecentHistory:
+    """
+    In-memory columnar copy of each location's most recent observations.
+
+    Serves in-window history pages, counts, aggregates and stats without
+    touching Mongo. Each location's ring is loaded from Mongo at startup,
+    then fed with every observation this process stores or sees on the
+    weather change stream. A ring is only used while it is known to be
+    complete: a change stream is attached, or a scheduled ingest confirmed
+    the location within RECENT_HISTORY_MAX_GAP_SECONDS. After a longer gap
+    (e.g. another process held the scheduler lease) the ring is reloaded
+    before it is served again. Observations stored by other processes are
+    only seen through a change stream, so deployments with several writers
+    should use STREAM_SOURCE=change_stream.
+    """
+
+    def __init__(
+        self,
+        capacity: Optional[int] = None,
+        window: Optional[timedelta] = None,
+        max_gap_seconds: Optional[float] = None
+    ):
+        self.capacity = capacity or settings.RECENT_HISTORY_MAX_ROWS
+        self.window = window or timedelta(hours=settings.RECENT_HISTORY_HOURS)
+        self.max_gap_seconds = max_gap_seconds if max_gap_seconds is not None else settings.RECENT_HISTORY_MAX_GAP_SECONDS
+        self.enabled = False
+        self.repository: Optional[WeatherRepository] = None
+        self.streaming = False
+        self._rings: Dict[str, LocationRing] = {}
+        self._state: Dict[str, str] = {}
+        self._warmed_at: Dict[str, float] = {}
+        self._confirmed_at: Dict[str, float] = {}
+        self._pending: Dict[str, List[Row]] = {}
+        self._tasks: set = set()
+        self.served = 0
+        self.fallbacks = 0
+
+    async def start(self, repository: WeatherRepository, locations: Iterable[str]) -> None:
+        """Enable the buffer and load every location from Mongo"""
+        self.repository = repository
+        self.enabled = True
+        await asyncio.gather(*(self._warm(location) for location in locations))
+
+    def stop(self) -> None:
+        self.enabled = False
+        for task in list(self._tasks):
+            task.cancel()
+
+    async def _warm(self, location: str) -> None:
+        """
+        Reload a location's ring from Mongo. Observations arriving meanwhile
+        are held back and applied on top, so none are lost to the swap.
+        """
+        self._state[location] = WARMING
+        self._pending.setdefault(location, [])
+        started = time.monotonic()
+        since = datetime.utcnow() - self.window
+        ring = LocationRing(location, self.capacity)
+        ring.covered_since = _to_ms(since)
+        try:
+            # From the primary: a lagging secondary would leave a hole no later insert fills
+            async for batch in self.repository.stream_history(
+                location, start_time=since, batch_size=settings.EXPORT_BATCH_SIZE, primary=True
+            ):
+                for document in batch:
+                    ring.insert(_row(document))
+        except Exception as e:
+            logger.error(f"Failed to load recent history for {location}: {str(e)}")
+            self._state[location] = COLD
+            self._pending.pop(location, None)
+            return
+
+        for row in self._pending.pop(location, []):
+            ring.insert(row)
+        self._rings[location] = ring
+        self._warmed_at[location] = started
+        self._confirmed_at.pop(location, None)
+        self._state[location] = READY
+        logger.info(f"Loaded {ring.size} recent observations for {location} in {(time.monotonic() - started) * 1000:.1f} ms")
+
+    def _schedule_warm(self, location: str) -> None:
+        if self._state.get(location) == WARMING:
+            return
+        self._state[location] = WARMING
+        self._pending[location] = []
+        task = asyncio.create_task(self._warm(location))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def add(self, weather_data: List[WeatherData]) -> None:
+        """Append newly stored observations to their locations' rings"""
+        if not self.enabled:
+            return
+        for item in weather_data:
+            if item.id is None:
+                continue
+            row = _row(item.model_dump())
+            pending = self._pending.get(item.location)
+            if pending is not None:
+                pending.append(row)
+            ring = self._rings.get(item.location)
+            if ring is not None:
+                ring.insert(row)
+
+    def confirm(self, locations: Iterable[str]) -> None:
+        """
+        Record that a scheduled ingest just stored these locations' latest
+        observations. A ring last confirmed (or loaded) too long ago may have
+        missed observations, so it is reloaded instead.
+        """
+        if not self.enabled:
+            return
+        now = time.monotonic()
+        for location in locations:
+            if self._state.get(location) != READY:
+                continue
+            last = self._confirmed_at.get(location, self._warmed_at.get(location))
+            if last is not None and now - last <= self.max_gap_seconds:
+                self._confirmed_at[location] = now
+            else:
+                self._schedule_warm(location)
+
+    def attach_stream(self) -> None:
+        """A change stream now follows every insert; reload so nothing before it is missed"""
+        if not self.enabled:
+            return
+        self.streaming = True
+        for location in list(self._state):
+            self._schedule_warm(location)
+
+    def detach_stream(self) -> None:
+        self.streaming = False
+
+    def _ring(self, location: str, start_time: Optional[datetime]) -> Optional[LocationRing]:
+        """The location's ring if it is complete from start_time up to now, else None"""
+        if not self.enabled:
+            return None
+        ring = self._rings.get(location)
+        usable = (
+            ring is not None
+            and start_time is not None
+            and self._state.get(location) == READY
+            and _to_ms(start_time) >= ring.covered_since
+            and (self.streaming or time.monotonic() - self._confirmed_at.get(location, -math.inf) <= self.max_gap_seconds)
+        )
+        if not usable:
+            self.fallbacks += 1
+            return None
+        self.served += 1
+        return ring
+
+    def history_page(
+        self,
+        location: str,
+        start_time: Optional[datetime],
+        end_time: Optional[datetime],
+        limit: int = 100,
+        skip: int = 0,
+        after: Optional[str] = None,
+        before: Optional[str] = None,
+        fields: Optional[List[str]] = None
+    ) -> Optional[Tuple[List[Dict[str, Any]], Optional[str], Optional[str]]]:
+        """
+        Same page as WeatherRepository.get_history_page with ``raw``, or None
+        if the range is not held in memory.
+        """
+        if fields is None and settings.WEATHER_DEDUP_MODE == "touch":
+            # last_seen is bumped in Mongo without the ring seeing it
+            return None
+        ring = self._ring(location, start_time)
+        if ring is None:
+            return None
+
+        low, high = ring.range(_to_ms(start_time), _to_ms(end_time) if end_time else None)
+        cursor_token = after or before
+        if cursor_token:
+            timestamp, object_id = decode_cursor(cursor_token)
+            key = (_to_ms(timestamp), object_id.binary)
+            if after:
+                high = max(low, min(high, ring._bisect(key)))
+            else:
+                low = min(high, max(low, ring._bisect(key, right=True)))
+
+        if before:
+            indices = list(range(low, min(high, low + limit + 1)))
+            has_more = len(indices) > limit
+            indices = indices[:limit][::-1]
+        else:
+            top = high - (0 if cursor_token else skip)
+            indices = list(range(top - 1, max(low, top - limit - 1) - 1, -1))
+            has_more = len(indices) > limit
+            indices = indices[:limit]
+
+        records = ring.records(indices, fields)
+
+        def cursor_at(index: int) -> str:
+            timestamp, object_id = ring._key(index)
+            return encode_cursor(_from_ms(timestamp), object_id.hex())
+
+        first = cursor_at(indices[0]) if indices else None
+        last = cursor_at(indices[-1]) if indices else None
+        if before:
+            next_cursor, prev_cursor = last, first if has_more else None
+        else:
+            next_cursor = last if has_more else None
+            prev_cursor = first if (after or skip) else None
+        return records, next_cursor, prev_cursor
+
+    def count(self, location: str, start_time: Optional[datetime], end_time: Optional[datetime]) -> Optional[int]:
+        """Exact record count over the range, or None if it is not held in memory"""
+        ring = self._ring(location, start_time)
+        if ring is None:
+            return None
+        low, high = ring.range(_to_ms(start_time), _to_ms(end_time) if end_time else None)
+        return high - low
+
+    def aggregate(
+        self,
+        location: str,
+        bucket: Optional[str],
+        metrics: List[str],
+        start_time: Optional[datetime],
+        end_time: Optional[datetime]
+    ) -> Optional[List[Dict[str, Any]]]:
+        """
+        Same buckets as WeatherRepository.aggregate_history, or None if the
+        range is not held in memory.
+        """
+        ring = self._ring(location, start_time)
+        if ring is None:
+            return None
+        low, high = ring.range(_to_ms(start_time), _to_ms(end_time) if end_time else None)
+        timestamps = ring.column(ring.timestamps, low, high)
+        values = {metric: ring.column(ring.numeric[metric], low, high) for metric in metrics}
+
+        if bucket:
+            step = GRANULARITIES[bucket] // timedelta(milliseconds=1)
+            groups = [(key * step, [index for index, _ in rows]) for key, rows in
+                      groupby(enumerate(timestamps), key=lambda row: row[1] // step)]
+            spans = [(_from_ms(start), rows[0], rows[-1] + 1) for start, rows in groups]
+        else:
+            spans = [(None, 0, len(timestamps))] if len(timestamps) else []
+
+        result = []
+        for start, first, last in spans:
+            summary = {}
+            for metric in metrics:
+                series = values[metric][first:last]
+                if ring.has_missing:
+                    series = [value for value in series if value == value]
+                if not series:
+                    summary[metric] = {"min": None, "max": None, "avg": None}
+                    continue
+                low_value, high_value = min(series), max(series)
+                if metric in INT_FIELDS:
+                    low_value, high_value = int(low_value), int(high_value)
+                summary[metric] = {"min": low_value, "max": high_value, "avg": sum(series) / len(series)}
+            result.append({"start": start, "count": last - first, "metrics": summary})
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        """Rows held and memory used, in total and per location"""
+        now = time.monotonic()
+        locations = {}
+        for location, ring in self._rings.items():
+            locations[location] = {
+                "state": self._state.get(location, COLD),
+                "rows": ring.size,
+                "capacity": ring.capacity,
+                "covered_since": _from_ms(ring.covered_since),
+                "memory_bytes": ring.memory_bytes(),
+                "distinct_values": len(ring.wind_dir_codes.values) + len(ring.condition_codes.values) + len(ring.place_codes.values),
+                "confirmed_seconds_ago": round(now - self._confirmed_at[location], 1) if location in self._confirmed_at else None,
+            }
+        return {
+            "enabled": self.enabled,
+            "streaming": self.streaming,
+            "locations": len(self._rings),
+            "rows": sum(ring.size for ring in self._rings.values()),
+            "memory_bytes": sum(ring.memory_bytes() for ring in self._rings.values()),
+            "served": self.served,
+            "fallbacks": self.fallbacks,
+            "by_location": locations,
+        }
+
+
+recent_history = RecentHistory()
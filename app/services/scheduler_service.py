@@ -1,10 +1,17 @@
 import logging
-from datetime import datetime
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+from apscheduler.events import EVENT_JOB_SUBMITTED, EVENT_JOB_MISSED, EVENT_JOB_MAX_INSTANCES
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from apscheduler.schedulers.base import STATE_PAUSED
 from apscheduler.triggers.interval import IntervalTrigger
-from apscheduler.triggers.cron import CronTrigger
 from app.core.config import get_settings
+from app.core.exceptions import WeatherAPIException
+from app.core.metrics import SCHEDULER_JOB_DURATION, SCHEDULER_JOB_LAG, SCHEDULER_MISSED_RUNS, SCHEDULER_JOB_ERRORS
+from app.services.leader_service import LeaderElection
 from app.services.weather_service import WeatherService
+from app.utils.resilience import Backoff
 
 logger = logging.getLogger("weather_service")
 settings = get_settings()
@@ -13,56 +20,171 @@ settings = get_settings()
 class SchedulerService:
     """Service for managing scheduled tasks"""
 
-    def __init__(self, weather_service: WeatherService = None):
+    def __init__(self, weather_service: WeatherService = None, leader: Optional[LeaderElection] = None):
         self.scheduler = AsyncIOScheduler()
         self.weather_service = weather_service or WeatherService()
+        self.leader = leader
         self.interval_seconds = settings.WEATHER_UPDATE_INTERVAL_SECONDS
+        self.effective_interval_seconds = float(self.interval_seconds)
+        self.weather_service.refresh_interval_seconds = self.effective_interval_seconds
+        self.backoff = Backoff(base=self.interval_seconds, maximum=settings.WEATHER_BACKOFF_MAX_SECONDS)
+        self.consecutive_failures = 0
+
+    def _is_leader(self) -> bool:
+        """Without leader election every process runs the jobs"""
+        return self.leader is None or self.leader.is_leader
 
     async def fetch_weather_task(self):
         """Task that fetches and stores weather data"""
+        if not self._is_leader():
+            return
         try:
             logger.info(f"Executing scheduled weather update at {datetime.utcnow().isoformat()}")
-            await self.weather_service.fetch_and_store_weather()
+            started = time.perf_counter()
+            with SCHEDULER_JOB_DURATION.labels("weather_update").time():
+                await self.weather_service.fetch_and_store_all_weather()
+            logger.info(f"Scheduled weather update finished in {(time.perf_counter() - started) * 1000:.1f} ms")
+            self._tick_succeeded()
+        except WeatherAPIException as e:
+            SCHEDULER_JOB_ERRORS.labels("weather_update").inc()
+            logger.error(f"Error in scheduled weather update: {e.message}")
+            self._tick_failed(e.retry_after)
         except Exception as e:
+            SCHEDULER_JOB_ERRORS.labels("weather_update").inc()
             logger.error(f"Error in scheduled weather update: {str(e)}")
+            self._tick_failed()
+
+    def _sustainable_interval(self) -> float:
+        """The configured interval, stretched if a refresh costs more calls than the budget refills"""
+        rate = self.weather_service.budget.rate
+        if rate <= 0:
+            return float(self.interval_seconds)
+        return max(float(self.interval_seconds), self.weather_service.calls_per_refresh() / rate)
+
+    def _tick_succeeded(self):
+        self.consecutive_failures = 0
+        self.backoff.reset()
+        self._set_interval(self._sustainable_interval())
+
+    def _tick_failed(self, retry_after: Optional[float] = None):
+        """Back off exponentially, but never retry before upstream's Retry-After or the breaker allows"""
+        self.consecutive_failures += 1
+        delay = max(
+            self.backoff.next_delay(),
+            retry_after or 0.0,
+            self.weather_service.breaker.remaining(),
+            self._sustainable_interval(),
+        )
+        self._set_interval(delay)
+
+    def _set_interval(self, seconds: float):
+        """Reschedule the weather update to run every ``seconds``, counted from now"""
+        if seconds == self.effective_interval_seconds:
+            return
+        self.effective_interval_seconds = seconds
+        self.weather_service.refresh_interval_seconds = seconds
+        if self.scheduler.get_job("weather_update") is None:
+            return
+        self.scheduler.reschedule_job("weather_update", trigger=IntervalTrigger(seconds=seconds))
+        logger.info(f"Weather updates now every {seconds:.1f} seconds")
 
     async def maintenance_task(self):
         """Task that performs database maintenance"""
+        if not self._is_leader():
+            return
         try:
             logger.info(f"Executing scheduled maintenance at {datetime.utcnow().isoformat()}")
-            await self.weather_service.perform_maintenance(retention_days=30)
+            with SCHEDULER_JOB_DURATION.labels("db_maintenance").time():
+                await self.weather_service.perform_maintenance()
         except Exception as e:
+            SCHEDULER_JOB_ERRORS.labels("db_maintenance").inc()
             logger.error(f"Error in scheduled maintenance: {str(e)}")
 
+    def _on_job_event(self, event):
+        """Record scheduling lag and missed runs for a job"""
+        if event.code == EVENT_JOB_SUBMITTED:
+            now = datetime.now(timezone.utc)
+            for run_time in event.scheduled_run_times:
+                SCHEDULER_JOB_LAG.labels(event.job_id).observe(max((now - run_time).total_seconds(), 0.0))
+        elif event.code == EVENT_JOB_MISSED:
+            SCHEDULER_MISSED_RUNS.labels(event.job_id, "misfire").inc()
+        elif event.code == EVENT_JOB_MAX_INSTANCES:
+            SCHEDULER_MISSED_RUNS.labels(event.job_id, "still_running").inc()
+
     def start(self):
-        """Start the scheduler with all jobs"""
+        """Start the scheduler with all jobs, or resume it if it was paused"""
         if self.scheduler.running:
+            self.resume()
             return
 
         try:
-            # Weather update job - runs every X seconds
+            # Weather update job - runs every X seconds, stretched while upstream is failing
             self.scheduler.add_job(
                 self.fetch_weather_task,
-                IntervalTrigger(seconds=self.interval_seconds),
+                IntervalTrigger(seconds=self.effective_interval_seconds),
                 id="weather_update",
                 replace_existing=True,
                 max_instances=1,
             )
 
-            # Maintenance job - runs daily at 3 AM
+            # Maintenance job - frequent runs keep each retention pass small
             self.scheduler.add_job(
                 self.maintenance_task,
-                CronTrigger(hour=3, minute=0),
+                IntervalTrigger(minutes=settings.RETENTION_INTERVAL_MINUTES),
                 id="db_maintenance",
                 replace_existing=True,
                 max_instances=1,
             )
 
+            self.scheduler.add_listener(
+                self._on_job_event,
+                EVENT_JOB_SUBMITTED | EVENT_JOB_MISSED | EVENT_JOB_MAX_INSTANCES,
+            )
             self.scheduler.start()
             logger.info(f"Scheduler started with weather updates every {self.interval_seconds} seconds")
         except Exception as e:
             logger.error(f"Failed to start scheduler: {str(e)}")
 
+    def pause(self):
+        """Stop running jobs without discarding them, e.g. when another process takes the lead"""
+        if self.scheduler.running and self.scheduler.state != STATE_PAUSED:
+            self.scheduler.pause()
+            logger.info("Scheduler paused")
+
+    def resume(self):
+        """Resume a paused scheduler"""
+        if self.scheduler.state == STATE_PAUSED:
+            self.scheduler.resume()
+            logger.info("Scheduler resumed")
+
+    def status(self) -> Dict[str, Any]:
+        """Current effective interval, failure streak and upstream guard state"""
+        job = self.scheduler.get_job("weather_update") if self.scheduler.running else None
+        return {
+            "running": self.scheduler.running and self.scheduler.state != STATE_PAUSED,
+            "interval_seconds": self.interval_seconds,
+            "effective_interval_seconds": round(self.effective_interval_seconds, 2),
+            "consecutive_failures": self.consecutive_failures,
+            "next_run_at": job.next_run_time.isoformat() if job and job.next_run_time else None,
+            "circuit_breaker": self.weather_service.breaker.stats(),
+            "call_budget": self.weather_service.budget.stats(),
+            "leader": self.leader.status() if self.leader else None,
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        """Numeric view of status() for metrics export; booleans and the breaker state become 0/1 gauges"""
+        breaker = self.weather_service.breaker
+        return {
+            "running": int(self.scheduler.running and self.scheduler.state != STATE_PAUSED),
+            "is_leader": int(self._is_leader()),
+            "interval_seconds": self.interval_seconds,
+            "effective_interval_seconds": self.effective_interval_seconds,
+            "consecutive_failures": self.consecutive_failures,
+            "circuit_open": int(breaker.state == breaker.OPEN),
+            "circuit_retry_in_seconds": breaker.remaining(),
+            "call_budget_tokens": self.weather_service.budget.tokens,
+        }
+
     def shutdown(self):
         """Shutdown the scheduler"""
         if self.scheduler.running:
@@ -71,3 +193,21 @@ class SchedulerService:
                 logger.info("Scheduler shut down")
             except Exception as e:
                 logger.error(f"Error shutting down scheduler: {str(e)}")
+
+
+async def start_scheduler(weather_service: WeatherService = None) -> SchedulerService:
+    """Create and start a scheduler, behind leader election when it is enabled"""
+    scheduler = SchedulerService(weather_service)
+    if settings.LEADER_ELECTION_ENABLED:
+        scheduler.leader = LeaderElection(on_elected=scheduler.start, on_demoted=scheduler.pause)
+        await scheduler.leader.start()
+    else:
+        scheduler.start()
+    return scheduler
+
+
+async def stop_scheduler(scheduler: SchedulerService):
+    """Hand back the scheduler lease, if held, and shut the scheduler down"""
+    if scheduler.leader:
+        await scheduler.leader.stop()
+    scheduler.shutdown()
@@ -1,51 +1,180 @@
+import asyncio
 import httpx
 import logging
+import time
 from datetime import datetime, timedelta
-from typing import Dict, Any, Optional
-from app.core.config import get_settings
+from typing import Awaitable, Callable, Dict, Any, Optional, List
+from app.core.config import get_settings, LocationSettings
 from app.models.weather import WeatherData, WeatherLocation, WeatherCurrent, WeatherCondition
-from app.core.exceptions import WeatherAPIException
+from app.core.exceptions import WeatherAPIException, NotFoundException
+from app.core.http_client import get_http_client
+from app.core.metrics import UPSTREAM_LATENCY, UPSTREAM_RESPONSES
 from app.db.repositories.weather_repository import WeatherRepository
+from app.db.repositories.rollup_repository import RollupRepository, GRANULARITIES
+from app.services.broadcast_service import Broadcaster, weather_broadcaster
+from app.services.cache_service import LatestWeatherCache, latest_weather_cache
+from app.services.recent_history_service import RecentHistory, recent_history
+from app.utils.resilience import CircuitBreaker, TokenBucket, parse_retry_after
+from app.utils.singleflight import SingleFlight
+from app.utils.time_utils import floor_datetime, ceil_datetime, to_naive_utc
 
 logger = logging.getLogger("weather_service")
 settings = get_settings()
 
 
+class IngestStats:
+    """Process-wide counters of stored and deduplicated observations"""
+
+    def __init__(self):
+        self.inserted = 0
+        self.unchanged = 0
+        self.duplicates = 0
+
+    def record(self, inserted: int = 0, unchanged: int = 0, duplicates: int = 0) -> None:
+        self.inserted += inserted
+        self.unchanged += unchanged
+        self.duplicates += duplicates
+
+    def stats(self) -> Dict[str, Any]:
+        """Return counters for monitoring; writes_avoided counts skipped document inserts"""
+        return {
+            "inserted": self.inserted,
+            "unchanged": self.unchanged,
+            "duplicates": self.duplicates,
+            "writes_avoided": self.unchanged + self.duplicates,
+            "dedup_mode": settings.WEATHER_DEDUP_MODE,
+        }
+
+
+ingest_stats = IngestStats()
+
+
+def plan_fetches(locations: List[LocationSettings]) -> List[List[LocationSettings]]:
+    """
+    Split locations into upstream calls.
+
+    In "group" mode locations with a city_id are packed into group endpoint
+    calls of up to WEATHER_GROUP_BATCH_SIZE IDs; everything else gets one
+    call per location. Batches keep the order locations are given in.
+    """
+    if settings.WEATHER_FETCH_MODE != "group":
+        return [[location] for location in locations]
+
+    grouped = [location for location in locations if location.city_id is not None]
+    single = [[location] for location in locations if location.city_id is None]
+    size = settings.WEATHER_GROUP_BATCH_SIZE
+    return [grouped[i:i + size] for i in range(0, len(grouped), size)] + single
+
+
+def budget_capacity(locations: List[LocationSettings]) -> float:
+    """
+    Burst size of the upstream budget: enough for one refresh of every
+    location to go out back to back, but never more than a minute's worth
+    of calls, and at least WEATHER_API_BURST.
+    """
+    calls = min(len(plan_fetches(locations)), settings.WEATHER_API_CALLS_PER_MINUTE)
+    return max(float(settings.WEATHER_API_BURST), calls)
+
+
+# Upstream fetch-and-store calls in flight, keyed by location name
+weather_flights = SingleFlight()
+
+# Shared by every caller so the whole process stays within the API plan
+upstream_budget = TokenBucket(
+    rate=settings.WEATHER_API_CALLS_PER_MINUTE / 60,
+    capacity=budget_capacity(settings.WEATHER_LOCATIONS)
+)
+upstream_breaker = CircuitBreaker(
+    failure_threshold=settings.WEATHER_BREAKER_FAILURE_THRESHOLD,
+    reset_timeout=settings.WEATHER_BREAKER_RESET_SECONDS
+)
+
+
 class WeatherService:
     """Service for fetching and processing weather data"""
 
-    def __init__(self, repository: Optional[WeatherRepository] = None):
+    def __init__(
+        self,
+        repository: Optional[WeatherRepository] = None,
+        cache: Optional[LatestWeatherCache] = None,
+        http_client: Optional[httpx.AsyncClient] = None,
+        rollups: Optional[RollupRepository] = None,
+        budget: Optional[TokenBucket] = None,
+        breaker: Optional[CircuitBreaker] = None,
+        broadcaster: Optional[Broadcaster] = None,
+        recent: Optional[RecentHistory] = None
+    ):
         self.api_key = settings.WEATHER_API_KEY
         self.api_url = settings.WEATHER_API_URL
+        self.group_api_url = settings.WEATHER_API_GROUP_URL
         self.location = settings.WEATHER_LOCATION
+        self.locations = settings.WEATHER_LOCATIONS
         self.repository = repository or WeatherRepository()
+        self.cache = cache or latest_weather_cache
+        self.http_client = http_client
+        self.rollups = rollups or (RollupRepository() if settings.ROLLUPS_ENABLED else None)
+        self.budget = budget or upstream_budget
+        self.breaker = breaker or upstream_breaker
+        self.broadcaster = broadcaster or weather_broadcaster
+        self.recent = recent or recent_history
+        # Set by a scheduler running in this process to its current, possibly stretched, interval
+        self.refresh_interval_seconds: Optional[float] = None
 
-    async def fetch_current_weather(self) -> WeatherData:
-        """Fetch current weather data from the API"""
+    def resolve_location(self, name: Optional[str] = None) -> LocationSettings:
+        """Look up a monitored location by name, defaulting to WEATHER_LOCATION"""
+        name = name or self.location
+        for location in self.locations:
+            if location.name == name:
+                return location
+        raise NotFoundException(f"Location '{name}' is not monitored")
+
+    async def _request_json(self, url: str, params: Dict[str, Any], endpoint: str = "weather") -> Dict[Any, Any]:
+        """
+        Issue an upstream GET and return the decoded JSON body.
+
+        Calls are refused without reaching upstream while the circuit breaker
+        is open. When the call budget is spent, a call waits its turn for a
+        token, but is refused if that would take longer than
+        WEATHER_FETCH_DEADLINE_SECONDS. Timeouts, transport errors, 429s
+        and 5xx responses count as upstream failures; a Retry-After on a 429
+        or 503 keeps the circuit open at least that long.
+        """
+        # Checked before waiting on the budget so no half-open probe is held up by it
+        if self.breaker.remaining() > 0:
+            raise WeatherAPIException("Weather API circuit is open, skipping request", 503, self.breaker.remaining())
+        if not await self.budget.acquire(max_wait=settings.WEATHER_FETCH_DEADLINE_SECONDS):
+            raise WeatherAPIException("Weather API call budget exhausted", 429, self.budget.time_until())
+        if not self.breaker.allow():
+            raise WeatherAPIException("Weather API circuit is open, skipping request", 503, self.breaker.remaining())
+
+        started = time.perf_counter()
+        outcome = "error"
         try:
-            # Parameters for OpenWeatherMap API
-            params = {
-                "appid": self.api_key,
-                "lat": 30.2672,  # Austin latitude
-                "lon": -97.7431,  # Austin longitude
-                "units": "metric"  # Use metric for Celsius
-            }
-
-            async with httpx.AsyncClient(timeout=10.0, verify=False) as client:
-                response = await client.get(self.api_url, params=params)
-
-                if response.status_code != 200:
-                    error_detail = response.json() if response.headers.get("content-type") == "application/json" else response.text
-                    logger.error(f"Weather API error: {error_detail}")
-                    raise WeatherAPIException(
-                        f"Weather API returned error {response.status_code}: {error_detail}", 
-                        response.status_code
-                    )
-
-                api_data = response.json()
-                return self._transform_openweathermap_data(api_data)
+            client = self.http_client or await get_http_client()
+            response = await client.get(url, params=params)
+            outcome = str(response.status_code)
+
+            if response.status_code != 200:
+                error_detail = response.json() if response.headers.get("content-type") == "application/json" else response.text
+                logger.error(f"Weather API error: {error_detail}")
+                retry_after = None
+                if response.status_code in (429, 503):
+                    retry_after = parse_retry_after(response.headers.get("retry-after"))
+                    if retry_after is not None:
+                        self.breaker.open_for(retry_after)
+                raise WeatherAPIException(
+                    f"Weather API returned error {response.status_code}: {error_detail}", 
+                    response.status_code,
+                    retry_after
+                )
+
+            return response.json()
+
+        except WeatherAPIException:
+            raise
 
         except httpx.TimeoutException:
+            outcome = "timeout"
             logger.error("Weather API request timed out")
             raise WeatherAPIException("Weather API request timed out", 408)
 
@@ -57,64 +186,189 @@ class WeatherService:
             logger.error(f"Unexpected error fetching weather: {str(e)}")
             raise WeatherAPIException(f"Error fetching weather data: {str(e)}")
 
-    def _transform_openweathermap_data(self, api_data: Dict[Any, Any]) -> WeatherData:
-        """Transform OpenWeatherMap API response to WeatherData model"""
-        try:
-            # Convert OpenWeatherMap data format to our model format
-            location_data = WeatherLocation(
-                name=api_data["name"],
-                region=api_data.get("sys", {}).get("country", "Unknown"),
-                country=api_data.get("sys", {}).get("country", "Unknown"),
-                lat=api_data["coord"]["lat"],
-                lon=api_data["coord"]["lon"],
-                tz_id=f"UTC{int(api_data.get('timezone', 0)//3600):+d}",  # Convert seconds to hours offset
-                localtime=datetime.utcfromtimestamp(
-                    api_data.get("dt", datetime.utcnow().timestamp())
-                ).strftime("%Y-%m-%d %H:%M")
-            )
+        finally:
+            UPSTREAM_LATENCY.labels(endpoint).observe(time.perf_counter() - started)
+            UPSTREAM_RESPONSES.labels(endpoint, outcome).inc()
+            # Cancelled calls count as failures so a half-open probe is never left hanging
+            if outcome.isdigit() and outcome != "429" and int(outcome) < 500:
+                self.breaker.record_success()
+            else:
+                self.breaker.record_failure()
+
+    async def fetch_current_weather(self, location: Optional[LocationSettings] = None) -> WeatherData:
+        """Fetch current weather data from the API"""
+        location = location or self.resolve_location()
+        # Parameters for OpenWeatherMap API
+        params = {
+            "appid": self.api_key,
+            "lat": location.lat,
+            "lon": location.lon,
+            "units": "metric"  # Use metric for Celsius
+        }
+        api_data = await self._request_json(self.api_url, params)
+        return self._transform_openweathermap_data(api_data, location.name)
+
+    async def fetch_group_weather(self, locations: List[LocationSettings]) -> List[WeatherData]:
+        """Fetch current weather for several locations with one group endpoint call"""
+        names_by_city_id = {location.city_id: location.name for location in locations}
+        params = {
+            "appid": self.api_key,
+            "id": ",".join(str(city_id) for city_id in names_by_city_id),
+            "units": "metric"
+        }
+        api_data = await self._request_json(self.group_api_url, params, endpoint="group")
+
+        items = [item for item in api_data.get("list", []) if item.get("id") in names_by_city_id]
+        if len(items) < len(names_by_city_id):
+            missing = set(names_by_city_id) - {item.get("id") for item in items}
+            logger.warning(f"Weather API group response is missing city IDs: {sorted(missing)}")
+
+        return self._transform_openweathermap_batch(
+            items, [names_by_city_id[item["id"]] for item in items]
+        )
+
+    def calls_per_refresh(self) -> int:
+        """Upstream calls one refresh of every monitored location costs"""
+        return len(plan_fetches(self.locations))
+
+    async def fetch_all_current_weather(
+        self,
+        locations: Optional[List[LocationSettings]] = None
+    ) -> List[WeatherData]:
+        """
+        Fetch current weather for many locations concurrently.
+
+        At most WEATHER_FETCH_CONCURRENCY requests are in flight at once, and
+        fetches still pending after WEATHER_FETCH_DEADLINE_SECONDS are cancelled
+        so a slow upstream cannot stretch a tick past its interval. Failed or
+        cancelled locations are logged and left out of the result; if every
+        location fails, the most telling error is raised instead.
+        """
+        locations = self.locations if locations is None else locations
+        if not locations:
+            return []
+
+        semaphore = asyncio.Semaphore(settings.WEATHER_FETCH_CONCURRENCY)
 
-            # Get first weather condition if available
-            weather_condition = api_data.get("weather", [{"main": "Unknown", "id": 0, "icon": ""}])[0]
-            
-            condition = WeatherCondition(
-                text=weather_condition.get("description", "Unknown"),
-                code=weather_condition.get("id", 0),
-                icon=f"https://openweathermap.org/img/wn/{weather_condition.get('icon', '01d')}@2x.png"
+        async def fetch(batch: List[LocationSettings]) -> List[WeatherData]:
+            async with semaphore:
+                # In "single" mode every location is fetched on its own, city_id or not
+                if settings.WEATHER_FETCH_MODE != "group" or batch[0].city_id is None:
+                    return [await self.fetch_current_weather(batch[0])]
+                return await self.fetch_group_weather(batch)
+
+        tasks = {asyncio.create_task(fetch(batch)): batch for batch in plan_fetches(locations)}
+        done, pending = await asyncio.wait(tasks, timeout=settings.WEATHER_FETCH_DEADLINE_SECONDS)
+
+        def names(task: asyncio.Task) -> str:
+            return ", ".join(location.name for location in tasks[task])
+
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+            logger.warning(
+                f"Weather fetch deadline exceeded for {sum(len(tasks[task]) for task in pending)} location(s): "
+                f"{', '.join(names(task) for task in pending)}"
             )
 
+        results, errors = [], []
+        for task in done:
+            if task.exception() is not None:
+                logger.error(f"Failed to fetch weather for {names(task)}: {str(task.exception())}")
+                errors.append(task.exception())
+                continue
+            results.extend(task.result())
+
+        # Nothing fetched at all: surface the failure so the scheduler can back off
+        if not results:
+            if errors:
+                raise max(errors, key=lambda e: getattr(e, "retry_after", None) or 0)
+            if pending:
+                raise WeatherAPIException("Weather fetch deadline exceeded for every location", 504)
+        return results
+
+    def _transform_openweathermap_data(self, api_data: Dict[Any, Any], location: Optional[str] = None) -> WeatherData:
+        """Transform OpenWeatherMap API response to WeatherData model"""
+        return self._transform_openweathermap_batch([api_data], [location or self.location])[0]
+
+    def _transform_openweathermap_batch(
+        self,
+        items: List[Dict[Any, Any]],
+        locations: List[str]
+    ) -> List[WeatherData]:
+        """
+        Transform a list of OpenWeatherMap current-weather records to WeatherData models.
+
+        Unit conversions are computed column by column over the whole batch
+        before any model is built, so a group response of N cities costs one
+        pass per derived field rather than N independent transforms.
+        """
+        try:
+            now = datetime.utcnow()
+            mains = [item["main"] for item in items]
+            winds = [item.get("wind", {}) for item in items]
+
             # Convert temperature from Kelvin if needed (if units=metric was not used)
-            temp_c = api_data["main"]["temp"]
-            if temp_c > 100:  # Likely in Kelvin
-                temp_c = temp_c - 273.15
-                
-            temp_f = (temp_c * 9/5) + 32
-
-            # Convert wind speed from m/s to kph
-            wind_kph = api_data.get("wind", {}).get("speed", 0) * 3.6  # m/s to kph
-            wind_mph = wind_kph / 1.609344  # kph to mph
-
-            current = WeatherCurrent(
-                temp_c=temp_c,
-                temp_f=temp_f,
-                feelslike_c=api_data["main"].get("feels_like", temp_c),
-                feelslike_f=(api_data["main"].get("feels_like", temp_c) * 9/5) + 32,
-                humidity=api_data["main"].get("humidity", 0),
-                wind_kph=wind_kph,
-                wind_mph=wind_mph,
-                wind_dir=self._degrees_to_direction(api_data.get("wind", {}).get("deg", 0)),
-                pressure_mb=api_data["main"].get("pressure", 0),
-                precip_mm=api_data.get("rain", {}).get("1h", 0) if "rain" in api_data else 0,
-                cloud=api_data.get("clouds", {}).get("all", 0),
-                uv=api_data.get("uvi", 0),  # OpenWeatherMap doesn't provide UV in basic API
-                condition=condition
-            )
+            temps_c = [main["temp"] - 273.15 if main["temp"] > 100 else main["temp"] for main in mains]
+            temps_f = [(temp_c * 9/5) + 32 for temp_c in temps_c]
+            feels_c = [main.get("feels_like", temp_c) for main, temp_c in zip(mains, temps_c)]
+            feels_f = [(feel_c * 9/5) + 32 for feel_c in feels_c]
 
-            return WeatherData(
-                location=self.location,
-                timestamp=datetime.utcnow(),
-                location_data=location_data,
-                current=current
-            )
+            # Convert wind speed from m/s to kph and mph
+            winds_kph = [wind.get("speed", 0) * 3.6 for wind in winds]
+            winds_mph = [wind_kph / 1.609344 for wind_kph in winds_kph]
+            wind_dirs = [self._degrees_to_direction(wind.get("deg", 0)) for wind in winds]
+
+            results = []
+            for i, api_data in enumerate(items):
+                # Convert OpenWeatherMap data format to our model format
+                location_data = WeatherLocation(
+                    name=api_data["name"],
+                    region=api_data.get("sys", {}).get("country", "Unknown"),
+                    country=api_data.get("sys", {}).get("country", "Unknown"),
+                    lat=api_data["coord"]["lat"],
+                    lon=api_data["coord"]["lon"],
+                    tz_id=f"UTC{int(api_data.get('timezone', 0)//3600):+d}",  # Convert seconds to hours offset
+                    localtime=datetime.utcfromtimestamp(
+                        api_data.get("dt", now.timestamp())
+                    ).strftime("%Y-%m-%d %H:%M")
+                )
+
+                # Get first weather condition if available
+                weather_condition = api_data.get("weather", [{"main": "Unknown", "id": 0, "icon": ""}])[0]
+
+                condition = WeatherCondition(
+                    text=weather_condition.get("description", "Unknown"),
+                    code=weather_condition.get("id", 0),
+                    icon=f"https://openweathermap.org/img/wn/{weather_condition.get('icon', '01d')}@2x.png"
+                )
+
+                current = WeatherCurrent(
+                    temp_c=temps_c[i],
+                    temp_f=temps_f[i],
+                    feelslike_c=feels_c[i],
+                    feelslike_f=feels_f[i],
+                    humidity=mains[i].get("humidity", 0),
+                    wind_kph=winds_kph[i],
+                    wind_mph=winds_mph[i],
+                    wind_dir=wind_dirs[i],
+                    pressure_mb=mains[i].get("pressure", 0),
+                    precip_mm=api_data.get("rain", {}).get("1h", 0) if "rain" in api_data else 0,
+                    cloud=api_data.get("clouds", {}).get("all", 0),
+                    uv=api_data.get("uvi", 0),  # OpenWeatherMap doesn't provide UV in basic API
+                    condition=condition
+                )
+
+                results.append(WeatherData(
+                    location=locations[i],
+                    timestamp=now,
+                    observed_at=datetime.utcfromtimestamp(api_data["dt"]) if "dt" in api_data else None,
+                    location_data=location_data,
+                    current=current
+                ))
+
+            return results
 
         except KeyError as e:
             logger.error(f"Error parsing OpenWeatherMap API data: Missing key {e}")
@@ -127,21 +381,357 @@ class WeatherService:
         index = round(degrees / 22.5) % 16
         return directions[index]
 
-    async def fetch_and_store_weather(self) -> WeatherData:
-        """Fetch weather data and store in the database"""
-        weather_data = await self.fetch_current_weather()
-        weather_id = await self.repository.create(weather_data)
-        weather_data.id = weather_id
-        logger.info(f"Weather data saved with ID: {weather_id}")
+    def _recently_refreshed(self, location: str) -> Optional[WeatherData]:
+        """Return the stored observation if upstream was fetched within the minimum refresh interval"""
+        since = self.cache.since_fetched(location)
+        if since is not None and since < settings.WEATHER_MIN_REFRESH_INTERVAL_SECONDS:
+            return self.cache.peek(location)
+        return None
+
+    async def fetch_and_store_weather(self, location: Optional[str] = None) -> WeatherData:
+        """
+        Fetch weather data and store in the database.
+
+        Concurrent calls for the same location share one upstream fetch, and
+        a location refreshed within WEATHER_MIN_REFRESH_INTERVAL_SECONDS is
+        answered from the stored value without refetching.
+        """
+        location = self.resolve_location(location)
+        recent = self._recently_refreshed(location.name)
+        if recent is not None:
+            return recent
+
+        async def fetch_and_store() -> WeatherData:
+            weather_data = await self.fetch_current_weather(location)
+            stored = await self._store([weather_data])
+            logger.info(f"Weather data for {stored[0].location} stored with ID: {stored[0].id}")
+            return stored[0]
+
+        return await weather_flights.do(location.name, fetch_and_store)
+
+    async def fetch_and_store_all_weather(self) -> List[WeatherData]:
+        """
+        Fetch weather for every monitored location and store it with one batch write.
+
+        Locations refreshed within the minimum refresh interval are skipped,
+        the rest go out longest-unfetched first, and locations already being
+        fetched by another caller are joined rather than fetched again. If nothing could be stored, the failure is raised:
+        WeatherAPIException for upstream errors, DatabaseException if the
+        write failed.
+        """
+        due = [location for location in self.locations if self._recently_refreshed(location.name) is None]
+        # Longest unfetched first, so locations a tick ran out of budget or time for lead the next one
+        since = {location.name: self.cache.since_fetched(location.name) for location in due}
+        due.sort(key=lambda location: float("-inf") if since[location.name] is None else -since[location.name])
+        locations_by_name = {location.name: location for location in due}
+
+        async def fetch_and_store(names: List[str]) -> Dict[str, WeatherData]:
+            weather_data = await self.fetch_all_current_weather([locations_by_name[name] for name in names])
+            stored = await self._store(weather_data)
+            return {item.location: item for item in stored}
+
+        errors: Dict[str, BaseException] = {}
+        stored = await weather_flights.do_many(list(locations_by_name), fetch_and_store, errors)
+        if errors:
+            logger.error(f"Weather refresh failed for {len(errors)} location(s): {', '.join(sorted(errors))}")
+        if not stored and errors:
+            # A missing result only hides the real cause, such as a failed fetch or write
+            causes = [e for e in errors.values() if not isinstance(e, LookupError)] or list(errors.values())
+            raise max(causes, key=lambda e: getattr(e, "retry_after", None) or 0)
+        self.recent.confirm(stored)
+        logger.info(
+            f"Weather data stored for {len(stored)} of {len(self.locations)} location(s)"
+            f" ({len(self.locations) - len(due)} refreshed recently)"
+        )
+        return list(stored.values())
+
+    async def _store(self, weather_data: List[WeatherData]) -> List[WeatherData]:
+        """
+        Persist fetched observations, skipping ones upstream has not updated.
+
+        OpenWeatherMap only advances ``dt`` every few minutes, so most ticks
+        return the observation already stored. Those are recognised against
+        the latest-observation cache without touching Mongo (or, in "touch"
+        mode, only bump ``last_seen``); the unique (location, observed_at)
+        index catches the rest when the cache is cold. Returns the stored
+        record for each input observation.
+        """
+        touch = settings.WEATHER_DEDUP_MODE == "touch"
+        fresh, unchanged = [], []
+        for item in weather_data:
+            cached = self.cache.peek(item.location)
+            if item.observed_at is not None and cached is not None and cached.observed_at == item.observed_at:
+                unchanged.append(cached)
+            else:
+                fresh.append(item)
+
+        if touch and unchanged:
+            await self.repository.touch([item.id for item in unchanged])
+        inserted, existing = await self.repository.store_observations(fresh, touch=touch)
+
+        stored = inserted + existing + unchanged
+        for item in stored:
+            self.cache.set(item)
+        self.cache.mark_fetched(item.location for item in stored)
+        self.recent.add(inserted)
+        if settings.STREAM_SOURCE == "local":
+            self.broadcaster.publish(inserted)
+        await self._update_rollups(inserted)
+
+        ingest_stats.record(inserted=len(inserted), unchanged=len(unchanged), duplicates=len(existing))
+        if unchanged or existing:
+            logger.info(f"Skipped {len(unchanged) + len(existing)} unchanged upstream observation(s)")
+        return stored
+
+    async def _update_rollups(self, weather_data: List[WeatherData]) -> None:
+        """Fold stored observations into the rollups; failures never fail the ingest"""
+        if self.rollups is None or not weather_data:
+            return
+        try:
+            await self.rollups.record(weather_data)
+        except Exception as e:
+            logger.error(f"Rollup update failed, run app.rebuild_rollups to backfill: {str(e)}")
+
+    async def aggregate_weather(
+        self,
+        location: str,
+        bucket: str,
+        metrics: List[str],
+        start_time: datetime,
+        end_time: datetime
+    ) -> List[Dict[str, Any]]:
+        """
+        Get a bucketed metric series: from recent history when the range is
+        held in memory, else from rollups when enabled, else from raw records.
+        """
+        buckets = self.recent.aggregate(location, bucket, metrics, start_time, end_time)
+        if buckets is not None:
+            return buckets
+        if self.rollups is not None:
+            return await self.rollups.get_series(location, bucket, metrics, start_time, end_time)
+        return await self.repository.aggregate_history(
+            location, bucket, metrics, start_time=start_time, end_time=end_time
+        )
+
+    async def get_range_stats(
+        self,
+        location: str,
+        metrics: List[str],
+        start_time: datetime,
+        end_time: datetime
+    ) -> Dict[str, Any]:
+        """
+        Summarize metrics over a range: from recent history when the range is
+        held in memory, else from rollups when enabled, else from raw records.
+        """
+        buckets = self.recent.aggregate(location, None, metrics, start_time, end_time)
+        if buckets is None:
+            if self.rollups is not None:
+                return await self.rollups.range_stats(location, start_time, end_time, metrics)
+            buckets = await self.repository.aggregate_history(
+                location, None, metrics, start_time=start_time, end_time=end_time
+            )
+        if not buckets:
+            return {"count": 0, "metrics": {metric: {"min": None, "max": None, "avg": None} for metric in metrics}}
+        return {"count": buckets[0]["count"], "metrics": buckets[0]["metrics"]}
+
+    async def count_weather(
+        self,
+        location: str,
+        start_time: Optional[datetime] = None,
+        end_time: Optional[datetime] = None,
+        exact: bool = False
+    ) -> int:
+        """
+        Count records for a location and optional range.
+
+        Ranges held in recent history are counted exactly in memory. Other
+        exact counts run count_documents over the range. Otherwise the count is
+        estimated from rollups (range-aware, to the minute) once they are
+        known to cover the location's raw records, else read from the
+        location's maintained counter, as are counts without a range.
+        """
+        count = self.recent.count(location, start_time, end_time)
+        if count is not None:
+            return count
+        if exact:
+            return await self.repository.count_records(location, start_time, end_time)
+        if (start_time or end_time) and self.rollups is not None and location in self.rollups.backfilled:
+            # Rollups outlive raw records, so only count what retention has kept
+            oldest = await self.repository.get_oldest_timestamp(location)
+            start_time = max(start_time, oldest) if start_time and oldest else oldest
+            end_time = end_time or datetime.utcnow()
+            if start_time is None or start_time > end_time:
+                return 0
+            return await self.rollups.range_count(location, start_time, end_time)
+        return await self.repository.get_maintained_count(location)
+
+    async def get_latest_weather(self, location: Optional[str] = None) -> Optional[WeatherData]:
+        """Get the latest weather data, from the cache when fresh, else from the database"""
+        location = location or self.location
+        weather_data = self.cache.get(location)
+        if weather_data is not None:
+            return weather_data
+
+        weather_data = await self.repository.get_latest(location)
+        if weather_data is not None:
+            self.cache.set(weather_data)
         return weather_data
 
-    async def get_latest_weather(self) -> Optional[WeatherData]:
-        """Get the latest weather data from the database"""
-        return await self.repository.get_latest(self.location)
+    def seconds_until_refresh(self, weather_data: WeatherData) -> float:
+        """
+        Estimated seconds until the scheduler next refreshes a location.
+
+        Counted from this process's last upstream fetch of it when there is
+        one. Otherwise, e.g. when a separate worker ingests, from the stored
+        timestamp: ticks keep the phase of the tick that first stored the
+        observation, even when later ticks found it unchanged. Uses the
+        scheduler's effective interval, stretched by backoff or the call
+        budget, when the scheduler runs in this process, else the configured
+        WEATHER_UPDATE_INTERVAL_SECONDS.
+        """
+        interval = self.refresh_interval_seconds or settings.WEATHER_UPDATE_INTERVAL_SECONDS
+        since = self.cache.since_fetched(weather_data.location)
+        if since is None:
+            since = (datetime.utcnow() - to_naive_utc(weather_data.timestamp)).total_seconds()
+        return interval - since % interval
+
+    async def backfill_rollups(self) -> None:
+        """Make sure rollups include records stored before they were enabled; see RollupRepository.ensure_backfilled"""
+        if self.rollups is None:
+            return
+        await self.rollups.initialize()
+        await self.rollups.ensure_backfilled([location.name for location in self.locations])
 
-    async def perform_maintenance(self, retention_days: int = 30) -> int:
-        """Clean up old weather records based on retention policy"""
-        cutoff_date = datetime.utcnow() - timedelta(days=retention_days)
-        deleted_count = await self.repository.cleanup_old_records(self.location, cutoff_date)
-        logger.info(f"Cleaned up {deleted_count} weather records older than {retention_days} days")
+    async def preload_latest(self) -> int:
+        """Load each location's latest stored observation into the cache, returning how many exist"""
+        latest = await asyncio.gather(*(self.repository.get_latest(location.name) for location in self.locations))
+        for weather_data in latest:
+            if weather_data is not None:
+                self.cache.set(weather_data)
+        return sum(weather_data is not None for weather_data in latest)
+
+    async def perform_maintenance(self, retention_days: Optional[int] = None) -> int:
+        """
+        Enforce each location's retention policy.
+
+        Expired records are removed in batches of RETENTION_BATCH_SIZE paced
+        to RETENTION_MAX_DELETES_PER_SECOND, or left to the TTL index in "ttl"
+        mode. Cutoffs are aligned to whole days so hour and day rollups can be
+        rebuilt from complete raw days before they go. Minute and hour rollups
+        are then expired with the same batched loop. ``retention_days``
+        overrides every location's policy.
+        """
+        now = datetime.utcnow()
+        deleted_count = 0
+        for location in self.locations:
+            days = retention_days if retention_days is not None else settings.retention_days_for(location.name)
+            cutoff = floor_datetime(now - timedelta(days=days), GRANULARITIES["day"])
+            try:
+                if settings.RETENTION_MODE == "ttl":
+                    deleted = await self._expire_with_ttl(location.name, cutoff)
+                else:
+                    deleted = await self._delete_expired(location.name, cutoff)
+                expired_rollups = await self._expire_rollups(location.name, cutoff, now)
+            except Exception as e:
+                logger.error(f"Retention failed for {location.name}: {str(e)}")
+                continue
+            if deleted or expired_rollups:
+                logger.info(
+                    f"Cleaned up {deleted} weather records and {expired_rollups} rollups "
+                    f"for {location.name} older than {days} days"
+                )
+            deleted_count += deleted
+        logger.info(f"Retention removed {deleted_count} weather records")
         return deleted_count
+
+    async def _delete_in_batches(self, delete_batch: Callable[[int], Awaitable[int]]) -> int:
+        """Call delete_batch(batch_size) until a batch comes up short, paced to RETENTION_MAX_DELETES_PER_SECOND"""
+        batch_size = settings.RETENTION_BATCH_SIZE
+        pacer = TokenBucket(rate=settings.RETENTION_MAX_DELETES_PER_SECOND, capacity=batch_size)
+        deleted = 0
+        while True:
+            await asyncio.sleep(pacer.time_until(batch_size))
+            pacer.try_acquire(batch_size)
+            removed = await delete_batch(batch_size)
+            deleted += removed
+            if removed < batch_size:
+                return deleted
+
+    async def _delete_expired(self, location: str, cutoff: datetime, compact: bool = True, without_expiry: bool = False) -> int:
+        """Delete a location's records before cutoff in rate-limited batches"""
+        if compact and not await self._compact_before_delete(location, cutoff):
+            return 0
+        return await self._delete_in_batches(
+            lambda batch_size: self.repository.delete_batch(location, cutoff, batch_size, without_expiry=without_expiry)
+        )
+
+    async def _expire_rollups(self, location: str, cutoff: datetime, now: datetime) -> int:
+        """
+        Delete minute rollups before the raw records' cutoff and hour rollups
+        older than ROLLUP_HOUR_RETENTION_DAYS; day rollups are kept.
+
+        Neither goes while raw records of its bucket remain (e.g. when the
+        raw delete was held back or TTL has not caught up), so rollup reads
+        and count estimates always cover the retained raw records.
+        """
+        if self.rollups is None:
+            return 0
+        oldest = await self.repository.get_oldest_timestamp(location)
+        minute_cutoff = cutoff if oldest is None else min(cutoff, floor_datetime(oldest, GRANULARITIES["minute"]))
+        hour_cutoff = min(
+            floor_datetime(now - timedelta(days=settings.ROLLUP_HOUR_RETENTION_DAYS), GRANULARITIES["hour"]),
+            floor_datetime(minute_cutoff, GRANULARITIES["hour"])
+        )
+        expired = 0
+        for granularity, older_than in (("minute", minute_cutoff), ("hour", hour_cutoff)):
+            expired += await self._delete_in_batches(
+                lambda batch_size: self.rollups.delete_batch(location, granularity, older_than, batch_size)
+            )
+        return expired
+
+    async def _expire_with_ttl(self, location: str, cutoff: datetime) -> int:
+        """
+        TTL-mode maintenance: the TTL index does the deleting.
+
+        Rebuilds rollups for the next whole day due to expire while all its
+        raw records still exist, removes records written before TTL mode
+        (they carry no expires_at) and repairs the counter, which never sees
+        TTL deletes.
+        """
+        if self.rollups is not None and settings.RETENTION_ROLLUP_BEFORE_DELETE:
+            day = GRANULARITIES["day"]
+            try:
+                await self._rebuild_rollups(location, cutoff + day, cutoff + 2 * day)
+            except Exception as e:
+                logger.error(f"Rollup rebuild before expiry failed for {location}: {str(e)}")
+        deleted = await self._delete_expired(location, cutoff, compact=False, without_expiry=True)
+        await self.repository.reconcile_count(location)
+        return deleted
+
+    async def _compact_before_delete(self, location: str, cutoff: datetime) -> bool:
+        """
+        Rebuild hour and day rollups over the raw days about to be deleted.
+
+        A leading partial day may already have lost records to an older
+        policy, so only whole days are rebuilt and existing rollups are never
+        overwritten with partial data. Returns False if the rebuild failed and
+        the records should be kept for now.
+        """
+        if self.rollups is None or not settings.RETENTION_ROLLUP_BEFORE_DELETE:
+            return True
+        try:
+            oldest = await self.repository.get_oldest_timestamp(location)
+            if oldest is None or oldest >= cutoff:
+                return True
+            start = ceil_datetime(oldest, GRANULARITIES["day"])
+            if start < cutoff:
+                await self._rebuild_rollups(location, start, cutoff)
+            return True
+        except Exception as e:
+            logger.error(f"Rollup rebuild before delete failed for {location}, keeping its records: {str(e)}")
+            return False
+
+    async def _rebuild_rollups(self, location: str, start: datetime, end: datetime) -> None:
+        for granularity in ("hour", "day"):
+            await self.rollups.rebuild(location, granularity, start_time=start, end_time=end)
@@ -0,0 +1,26 @@
+import base64
+from datetime import datetime, timedelta
+from typing import Tuple
+from bson import ObjectId
+from bson.errors import InvalidId
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def encode_cursor(timestamp: datetime, object_id: str) -> str:
+    """Encode a (timestamp, _id) sort key as an opaque URL-safe pagination token"""
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.replace(tzinfo=None) - timestamp.utcoffset()
+    millis = (timestamp - EPOCH) // timedelta(milliseconds=1)
+    raw = f"{millis}:{object_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token: str) -> Tuple[datetime, ObjectId]:
+    """Decode a pagination token back into its (timestamp, _id) sort key"""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        millis, object_id = base64.urlsafe_b64decode(padded.encode()).decode().split(":", 1)
+        return EPOCH + timedelta(milliseconds=int(millis)), ObjectId(object_id)
+    except (ValueError, InvalidId, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid pagination cursor: {token}") from e
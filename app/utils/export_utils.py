@@ -0,0 +1,76 @@
+import csv
+import io
+from datetime import datetime
+from typing import Any, Dict, List, Tuple
+from bson import ObjectId
+import orjson
+
+# (CSV header, dotted path into the stored document)
+CSV_COLUMNS: List[Tuple[str, str]] = [
+    ("id", "_id"),
+    ("location", "location"),
+    ("timestamp", "timestamp"),
+    ("temp_c", "current.temp_c"),
+    ("temp_f", "current.temp_f"),
+    ("feelslike_c", "current.feelslike_c"),
+    ("feelslike_f", "current.feelslike_f"),
+    ("humidity", "current.humidity"),
+    ("wind_kph", "current.wind_kph"),
+    ("wind_mph", "current.wind_mph"),
+    ("wind_dir", "current.wind_dir"),
+    ("pressure_mb", "current.pressure_mb"),
+    ("precip_mm", "current.precip_mm"),
+    ("cloud", "current.cloud"),
+    ("uv", "current.uv"),
+    ("condition", "current.condition.text"),
+    ("condition_code", "current.condition.code"),
+]
+
+
+def _json_default(value: Any) -> Any:
+    """Encode the BSON types JSON encoders cannot handle natively"""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def get_path(document: Dict[str, Any], path: str) -> Any:
+    """Resolve a dotted path in a nested document, returning None if absent"""
+    value: Any = document
+    for key in path.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(key)
+    return value
+
+
+def documents_to_ndjson(documents: List[Dict[str, Any]]) -> bytes:
+    """Encode raw weather documents as newline-delimited JSON"""
+    lines = []
+    for document in documents:
+        document = dict(document)
+        document["id"] = str(document.pop("_id"))
+        lines.append(orjson.dumps(document, default=_json_default, option=orjson.OPT_NON_STR_KEYS))
+    return b"\n".join(lines) + b"\n" if lines else b""
+
+
+def csv_header() -> bytes:
+    """CSV header row matching documents_to_csv"""
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow([header for header, _ in CSV_COLUMNS])
+    return buffer.getvalue().encode()
+
+
+def documents_to_csv(documents: List[Dict[str, Any]]) -> bytes:
+    """Encode raw weather documents as flattened CSV rows"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for document in documents:
+        row = []
+        for _, path in CSV_COLUMNS:
+            value = get_path(document, path)
+            row.append(_json_default(value) if isinstance(value, (datetime, ObjectId)) else value)
+        writer.writerow(row)
+    return buffer.getvalue().encode()
@@ -0,0 +1,194 @@
+"""
+Rate limiting, backoff and circuit breaking for calls to flaky upstreams.
+
+All three are plain in-process state driven by a monotonic clock; they are
+not thread-safe and are meant to be used from the event loop.
+"""
+import asyncio
+import random
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Dict, Optional
+
+
+class TokenBucket:
+    """
+    Token bucket refilled at ``rate`` tokens per second up to ``capacity``.
+
+    Sized to the upstream API plan, it keeps the process under its call
+    quota however many callers share it. Callers that can wait reserve
+    tokens in turn, so concurrent waiters are spaced at the refill rate
+    rather than all waking for the same token.
+    """
+
+    def __init__(self, rate: float, capacity: float, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self._tokens = capacity
+        self._updated = clock()
+
+    def _refill(self) -> None:
+        now = self.clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    @property
+    def tokens(self) -> float:
+        self._refill()
+        return self._tokens
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        """Take ``tokens`` if available; never blocks"""
+        self._refill()
+        if self._tokens >= tokens:
+            self._tokens -= tokens
+            return True
+        return False
+
+    def reserve(self, tokens: float = 1.0, max_wait: float = 0.0) -> Optional[float]:
+        """
+        Take ``tokens`` now, going into debt if need be, and return how long to
+        wait before using them; None, taking nothing, if that exceeds ``max_wait``
+        """
+        wait = self.time_until(tokens)
+        if wait > max_wait:
+            return None
+        self._tokens -= tokens
+        return wait
+
+    async def acquire(self, tokens: float = 1.0, max_wait: float = 0.0) -> bool:
+        """Wait up to ``max_wait`` seconds for ``tokens``; False, without waiting, if they would take longer"""
+        wait = self.reserve(tokens, max_wait)
+        if wait is None:
+            return False
+        if wait > 0:
+            try:
+                await asyncio.sleep(wait)
+            except asyncio.CancelledError:
+                # Hand the reservation back so the callers queued behind it are not delayed
+                self._refill()
+                self._tokens = min(self.capacity, self._tokens + tokens)
+                raise
+        return True
+
+    def time_until(self, tokens: float = 1.0) -> float:
+        """Seconds until ``tokens`` will be available (0 if they already are)"""
+        self._refill()
+        missing = min(tokens, self.capacity) - self._tokens
+        return max(missing / self.rate, 0.0) if self.rate > 0 else float("inf")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "tokens": round(self.tokens, 2),
+            "capacity": self.capacity,
+            "refill_per_second": self.rate,
+        }
+
+
+class Backoff:
+    """
+    Exponential backoff with jitter.
+
+    The n-th consecutive delay is drawn uniformly from
+    [base, min(maximum, base * 2**n)], so retries never come sooner than the
+    normal interval and synchronized clients spread out.
+    """
+
+    def __init__(self, base: float, maximum: float):
+        self.base = base
+        self.maximum = maximum
+        self.attempt = 0
+
+    def next_delay(self) -> float:
+        self.attempt += 1
+        ceiling = min(self.maximum, self.base * 2 ** self.attempt)
+        return random.uniform(self.base, max(ceiling, self.base))
+
+    def reset(self) -> None:
+        self.attempt = 0
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker for an upstream dependency.
+
+    Opens after ``failure_threshold`` consecutive failures (or when told to
+    via ``open_for``) and rejects calls until ``reset_timeout`` has passed.
+    It then lets a single probe through (half-open): success closes the
+    circuit, failure opens it again.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int, reset_timeout: float, clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.failures = 0
+        self._state = self.CLOSED
+        self._open_until = 0.0
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self._state == self.OPEN and self.clock() >= self._open_until:
+            self._state = self.HALF_OPEN
+            self._probing = False
+        return self._state
+
+    def remaining(self) -> float:
+        """Seconds until an open circuit lets a probe through"""
+        return max(self._open_until - self.clock(), 0.0) if self.state == self.OPEN else 0.0
+
+    def allow(self) -> bool:
+        """Whether a call may go ahead; in half-open state only one probe is let through"""
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self._state = self.CLOSED
+        self._probing = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self._state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.open_for(self.reset_timeout)
+
+    def open_for(self, seconds: float) -> None:
+        """Open the circuit for at least ``seconds``, e.g. to honour a Retry-After"""
+        self._state = self.OPEN
+        self._probing = False
+        self._open_until = max(self._open_until, self.clock() + seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "retry_in_seconds": round(self.remaining(), 2),
+        }
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header (delay in seconds or HTTP date) into seconds from now"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0.0)
@@ -0,0 +1,77 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls for the same key into one in-flight execution.
+
+    The shared work runs in its own task, so a caller that is cancelled
+    (e.g. by a fetch deadline) does not cancel it for everyone else waiting.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+
+    def in_flight(self, key: Hashable) -> bool:
+        return key in self._calls
+
+    def _register(self, key: Hashable, future: asyncio.Future) -> None:
+        self._calls[key] = future
+
+        def done(finished: asyncio.Future):
+            if self._calls.get(key) is finished:
+                del self._calls[key]
+            if not finished.cancelled():
+                # Mark the exception retrieved when nobody else is waiting
+                finished.exception()
+
+        future.add_done_callback(done)
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Run fn for key, or join the execution already in flight for it"""
+        future = self._calls.get(key)
+        if future is None:
+            future = asyncio.ensure_future(fn())
+            self._register(key, future)
+        return await asyncio.shield(future)
+
+    async def do_many(
+        self,
+        keys: List[Hashable],
+        fn: Callable[[List[Hashable]], Awaitable[Dict[Hashable, Any]]],
+        errors: Optional[Dict[Hashable, BaseException]] = None
+    ) -> Dict[Hashable, Any]:
+        """
+        Run one batched fn for every key not already in flight and join the rest.
+
+        fn receives the keys it is responsible for and returns a mapping of
+        key to result. Keys whose call failed or produced no result are left
+        out of the returned mapping; pass ``errors`` to collect why, keyed
+        the same way (LookupError for a key fn returned nothing for).
+        """
+        missing = [key for key in keys if key not in self._calls]
+        if missing:
+            batch = asyncio.ensure_future(fn(missing))
+
+            async def pick(key: Hashable) -> Any:
+                results = await batch
+                if key not in results:
+                    raise LookupError(f"No result for {key}")
+                return results[key]
+
+            for key in missing:
+                self._register(key, asyncio.ensure_future(pick(key)))
+
+        futures = {key: self._calls[key] for key in keys if key in self._calls}
+        outcomes = await asyncio.gather(
+            *(asyncio.shield(future) for future in futures.values()),
+            return_exceptions=True
+        )
+        results = {}
+        for key, outcome in zip(futures, outcomes):
+            if not isinstance(outcome, BaseException):
+                results[key] = outcome
+            elif errors is not None:
+                errors[key] = outcome
+        return results
@@ -21,3 +21,22 @@ def get_time_range(days: int) -> tuple[datetime, datetime]:
     now = get_utc_now()
     past = now - timedelta(days=days)
     return past, now
+
+
+def to_naive_utc(dt: datetime) -> datetime:
+    """Normalize a datetime to naive UTC, the form stored in and returned by MongoDB"""
+    if dt.tzinfo is None:
+        return dt
+    return dt.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def floor_datetime(dt: datetime, step: timedelta) -> datetime:
+    """Round a naive UTC datetime down to a multiple of step since the epoch"""
+    epoch = datetime(1970, 1, 1)
+    return epoch + ((dt - epoch) // step) * step
+
+
+def ceil_datetime(dt: datetime, step: timedelta) -> datetime:
+    """Round a naive UTC datetime up to a multiple of step since the epoch"""
+    floored = floor_datetime(dt, step)
+    return floored if floored == dt else floored + step
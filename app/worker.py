@@ -0,0 +1,75 @@
+"""
+Standalone ingestion worker: runs the scheduler and maintenance without serving HTTP.
+
+Run it alongside API processes started with SCHEDULER_ENABLED=False so slow
+upstream calls and ingest work never share an event loop with API requests.
+Several workers may run at once; leader election keeps a single one active.
+
+Usage:
+    python -m app.worker
+"""
+import asyncio
+import signal
+
+from prometheus_client import start_http_server
+
+from app.core.config import get_settings
+from app.core.logging_config import setup_logging, get_logger
+from app.core.http_client import open_http_client, close_http_client
+from app.core.metrics import register_stats
+from app.db.mongodb import connect_to_mongo, close_mongo_connection, pool_metrics
+from app.db.repositories.weather_repository import WeatherRepository
+from app.services.scheduler_service import start_scheduler, stop_scheduler
+from app.services.weather_service import WeatherService, ingest_stats
+
+setup_logging()
+logger = get_logger()
+settings = get_settings()
+
+
+async def run():
+    """Start ingestion and keep it running until SIGINT or SIGTERM"""
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stop.set)
+
+    logger.info("Starting weather ingestion worker")
+    await connect_to_mongo()
+    await open_http_client()
+    scheduler = None
+    try:
+        # One service, as in app.main, shared by every scheduled job
+        weather_repository = WeatherRepository()
+        weather_service = WeatherService(repository=weather_repository)
+        await weather_repository.initialize()
+        await weather_repository.ensure_counters([location.name for location in settings.WEATHER_LOCATIONS])
+        await weather_service.backfill_rollups()
+
+        if settings.WORKER_METRICS_PORT:
+            register_stats("weather_ingest", "Observation ingest", ingest_stats.stats, counters=("inserted", "unchanged", "duplicates", "writes_avoided"))
+            register_stats("mongodb_pool", "MongoDB connection pool", pool_metrics.stats, counters=("checkouts", "failed_checkouts"))
+            start_http_server(settings.WORKER_METRICS_PORT)
+            logger.info(f"Worker metrics served on port {settings.WORKER_METRICS_PORT}")
+
+        scheduler = await start_scheduler(weather_service)
+        if settings.WORKER_METRICS_PORT:
+            # The API runs without a scheduler here, so its /api/health/scheduler cannot report this
+            register_stats("weather_scheduler", "Ingest scheduler", scheduler.stats)
+        logger.info("Worker startup complete")
+        await stop.wait()
+    finally:
+        logger.info("Shutting down weather ingestion worker")
+        if scheduler:
+            await stop_scheduler(scheduler)
+        await close_http_client()
+        await close_mongo_connection()
+        logger.info("Worker shutdown complete")
+
+
+def main():
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
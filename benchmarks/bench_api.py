@@ -0,0 +1,106 @@
+"""
+Read API benchmark through the ASGI app.
+
+Seeds the benchmark Mongo backend with a history of stored observations and
+drives /api/weather/current and /api/weather/history in-process with httpx's
+ASGI transport, so the numbers cover routing, dependencies, storage and
+serialization but no network.
+
+Usage:
+    python -m benchmarks.bench_api [--documents 10000] [--requests 500] [--concurrency 10] [--mongodb-uri URI]
+"""
+import argparse
+import asyncio
+import json
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from benchmarks.bench_serialization import make_documents
+from benchmarks.fakes import drop_database, quiet_logging, seed_history, use_mongo
+from app.core.config import get_settings
+from app.main import app
+from app.services.cache_service import latest_weather_cache
+from app.services.weather_service import WeatherService
+
+ENDPOINTS = {
+    "current": "/api/weather/current",
+    "history": "/api/weather/history?limit=100",
+    "history_exact_count": "/api/weather/history?limit=100&exact_count=true",
+}
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    return sorted_values[min(int(len(sorted_values) * fraction), len(sorted_values) - 1)]
+
+
+async def drive(client: httpx.AsyncClient, url: str, requests: int, concurrency: int) -> Dict[str, Any]:
+    """Issue ``requests`` GETs from ``concurrency`` workers and summarize the latencies"""
+    latencies: List[float] = []
+    remaining = iter(range(requests))
+
+    async def worker():
+        for _ in remaining:
+            started = time.perf_counter()
+            response = await client.get(url)
+            latencies.append(time.perf_counter() - started)
+            response.raise_for_status()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": requests,
+        "requests_per_second": requests / elapsed,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "max_ms": latencies[-1] * 1000,
+    }
+
+
+async def run(documents: int = 10000, requests: int = 500, concurrency: int = 10, mongodb_uri: Optional[str] = None) -> Dict[str, Any]:
+    backend = use_mongo(mongodb_uri)
+    quiet_logging()
+    location = get_settings().WEATHER_LOCATION
+
+    try:
+        await seed_history(make_documents(documents, location=location, end=datetime.utcnow()))
+        latest_weather_cache.invalidate(location)
+        # The lifespan is not run here, so install the app-wide service it would build
+        app.state.weather_service = WeatherService()
+        app.state.weather_repository = app.state.weather_service.repository
+
+        results = {}
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+            for name, url in ENDPOINTS.items():
+                await client.get(url)
+                results[name] = await drive(client, url, requests, concurrency)
+    finally:
+        await drop_database()
+
+    return {
+        "benchmark": "api",
+        "backend": backend,
+        "documents": documents,
+        "concurrency": concurrency,
+        **results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--documents", type=int, default=10000)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--mongodb-uri", help="Benchmark against a real MongoDB instead of mongomock-motor")
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args.documents, args.requests, args.concurrency, args.mongodb_uri)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
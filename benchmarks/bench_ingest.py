@@ -0,0 +1,95 @@
+"""
+Ingest tick benchmark.
+
+Runs WeatherService.fetch_and_store_all_weather, the scheduled tick, against
+the fake upstream and the benchmark Mongo backend. Every tick sees a new
+observation for every location, so each one pays for the full fetch,
+transform, bulk write, cache update and rollup update.
+
+The upstream call budget is the production one, sized for the benchmark's
+locations, on a clock that moves forward by the scheduler's interval between
+ticks. Ticks therefore run back to back while the budget still sees them
+spaced as they would be in production.
+
+Usage:
+    python -m benchmarks.bench_ingest [--locations 50] [--ticks 50] [--mode single|group] [--mongodb-uri URI]
+"""
+import argparse
+import asyncio
+import json
+import time
+from typing import Any, Dict, Optional
+
+from benchmarks.fakes import FakeOpenWeatherMap, drop_database, make_locations, override_settings, quiet_logging, use_mongo
+from app.db.repositories.rollup_repository import RollupRepository
+from app.db.repositories.weather_repository import WeatherRepository
+from app.services.cache_service import LatestWeatherCache
+from app.core.config import get_settings
+from app.services.weather_service import WeatherService, budget_capacity
+from app.utils.resilience import TokenBucket
+
+
+async def run(locations: int = 50, ticks: int = 50, mode: str = "single", mongodb_uri: Optional[str] = None) -> Dict[str, Any]:
+    quiet_logging()
+    backend = use_mongo(mongodb_uri)
+    monitored = make_locations(locations)
+    upstream = FakeOpenWeatherMap(monitored)
+
+    try:
+        repository = WeatherRepository()
+        await repository.initialize()
+        await RollupRepository().initialize()
+        durations = []
+        with override_settings(WEATHER_FETCH_MODE=mode, WEATHER_MIN_REFRESH_INTERVAL_SECONDS=0):
+            settings = get_settings()
+            skipped = [0.0]
+            budget = TokenBucket(
+                rate=settings.WEATHER_API_CALLS_PER_MINUTE / 60,
+                capacity=budget_capacity(monitored),
+                clock=lambda: time.monotonic() + skipped[0]
+            )
+            service = WeatherService(repository=repository, cache=LatestWeatherCache(), http_client=upstream.client(), budget=budget)
+            service.locations = monitored
+            # The interval the scheduler would run ticks at, stretched to fit the budget
+            interval = max(settings.WEATHER_UPDATE_INTERVAL_SECONDS, service.calls_per_refresh() / budget.rate)
+
+            await service.fetch_and_store_all_weather()
+            for _ in range(ticks):
+                skipped[0] += interval
+                started = time.perf_counter()
+                await service.fetch_and_store_all_weather()
+                durations.append(time.perf_counter() - started)
+
+        stored = await repository.collection.count_documents({})
+    finally:
+        await drop_database()
+
+    elapsed = sum(durations)
+    durations.sort()
+    return {
+        "benchmark": "ingest",
+        "backend": backend,
+        "fetch_mode": mode,
+        "locations": locations,
+        "ticks": ticks,
+        "ticks_per_second": ticks / elapsed,
+        "observations_per_second": ticks * locations / elapsed,
+        "tick_p50_ms": durations[len(durations) // 2] * 1000,
+        "tick_max_ms": durations[-1] * 1000,
+        "upstream_requests": upstream.requests,
+        "documents_stored": stored,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--locations", type=int, default=50)
+    parser.add_argument("--ticks", type=int, default=50)
+    parser.add_argument("--mode", choices=["single", "group"], default="single")
+    parser.add_argument("--mongodb-uri", help="Benchmark against a real MongoDB instead of mongomock-motor")
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args.locations, args.ticks, args.mode, args.mongodb_uri)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Retention delete benchmark.
+
+Seeds one location with ``--documents`` observations spread evenly over
+``--span-days`` and times WeatherService.perform_maintenance removing
+everything older than ``--retention-days`` in batched mode, including the
+rollup rebuild before delete when running against a real server.
+
+Usage:
+    python -m benchmarks.bench_retention [--documents 100000] [--span-days 60] [--retention-days 30] [--mongodb-uri URI]
+"""
+import argparse
+import asyncio
+import json
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from benchmarks.bench_serialization import make_documents
+from benchmarks.fakes import drop_database, override_settings, quiet_logging, seed_history, use_mongo
+from app.core.config import get_settings
+from app.services.cache_service import LatestWeatherCache
+from app.services.weather_service import WeatherService
+
+
+async def run(
+    documents: int = 100000,
+    span_days: int = 60,
+    retention_days: int = 30,
+    mongodb_uri: Optional[str] = None
+) -> Dict[str, Any]:
+    quiet_logging()
+    backend = use_mongo(mongodb_uri)
+    location = get_settings().WEATHER_LOCATION
+    interval_seconds = span_days * 86400 / documents
+
+    try:
+        await seed_history(make_documents(documents, location=location, end=datetime.utcnow(), interval_seconds=interval_seconds))
+        service = WeatherService(cache=LatestWeatherCache())
+        service.locations = [service.resolve_location(location)]
+
+        # mongomock has no $dateTrunc, so rollups can only be rebuilt against a real server
+        compact = backend == "mongodb" and get_settings().RETENTION_ROLLUP_BEFORE_DELETE
+        with override_settings(RETENTION_MODE="batched", RETENTION_ROLLUP_BEFORE_DELETE=compact):
+            started = time.perf_counter()
+            deleted = await service.perform_maintenance(retention_days=retention_days)
+            elapsed = time.perf_counter() - started
+        remaining = await service.repository.collection.count_documents({})
+    finally:
+        await drop_database()
+
+    return {
+        "benchmark": "retention",
+        "backend": backend,
+        "documents": documents,
+        "span_days": span_days,
+        "retention_days": retention_days,
+        "batch_size": get_settings().RETENTION_BATCH_SIZE,
+        "max_deletes_per_second": get_settings().RETENTION_MAX_DELETES_PER_SECOND,
+        "rollup_before_delete": compact,
+        "deleted": deleted,
+        "remaining": remaining,
+        "seconds": elapsed,
+        "deletes_per_second": deleted / elapsed if elapsed else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--documents", type=int, default=100000)
+    parser.add_argument("--span-days", type=int, default=60)
+    parser.add_argument("--retention-days", type=int, default=30)
+    parser.add_argument("--mongodb-uri", help="Benchmark against a real MongoDB instead of mongomock-motor")
+    args = parser.parse_args()
+    result = asyncio.run(run(args.documents, args.span_days, args.retention_days, args.mongodb_uri))
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
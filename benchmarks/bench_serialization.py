@@ -0,0 +1,106 @@
+"""
+Read-path serialization benchmark: validated models vs. the trusted raw path.
+
+Compares, per history page of stored documents:
+  before - WeatherData(**doc) per row, then validation and serialization
+           through the WeatherHistoryResponse response model
+  after  - WeatherData.document_to_dict per row, encoded with orjson
+
+Usage:
+    python -m benchmarks.bench_serialization [--rows 1000] [--repeat 20]
+"""
+import argparse
+import json
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+import orjson
+from bson import ObjectId
+from pydantic import TypeAdapter
+
+from app.api.responses import FastJSONResponse
+from app.models.weather import WeatherData, WeatherHistoryResponse
+
+
+def make_documents(rows: int, location: Optional[str] = None, end: Optional[datetime] = None, interval_seconds: float = 10) -> List[Dict[str, Any]]:
+    """Build stored-shape weather documents as Motor would return them, newest first"""
+    example = WeatherData.model_config["json_schema_extra"]["example"]
+    location = location or example["location"]
+    end = end or datetime(2024, 1, 1)
+    documents = []
+    for i in range(rows):
+        current = dict(example["current"], temp_c=20.0 + i % 10, condition=dict(example["current"]["condition"]))
+        observed_at = end - timedelta(seconds=interval_seconds * i)
+        documents.append({
+            "_id": ObjectId(),
+            "location": location,
+            "timestamp": observed_at,
+            "observed_at": observed_at,
+            "location_data": dict(example["location_data"]),
+            "current": current,
+        })
+    return documents
+
+
+def serialize_validated(documents: List[Dict[str, Any]]) -> bytes:
+    """Baseline: validate each row into models, then validate and dump the response model"""
+    rows = []
+    for doc in documents:
+        doc = dict(doc)
+        doc["id"] = str(doc["_id"])
+        rows.append(WeatherData(**doc))
+    adapter = TypeAdapter(WeatherHistoryResponse)
+    response = adapter.validate_python({"data": rows, "count": len(rows)})
+    return adapter.dump_json(response)
+
+
+def serialize_trusted(documents: List[Dict[str, Any]]) -> bytes:
+    """Trusted path: shape raw documents and encode them with orjson"""
+    rows = [WeatherData.document_to_dict(doc) for doc in documents]
+    return FastJSONResponse({"data": rows, "count": len(rows)}).body
+
+
+def measure(fn: Callable[[List[Dict[str, Any]]], bytes], documents: List[Dict[str, Any]], repeat: int) -> Dict[str, Any]:
+    """Time fn over the documents and report rows per second"""
+    fn(documents)
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn(documents)
+    elapsed = time.perf_counter() - started
+    return {
+        "seconds_per_page": elapsed / repeat,
+        "rows_per_second": len(documents) * repeat / elapsed,
+    }
+
+
+def run(rows: int = 1000, repeat: int = 20) -> Dict[str, Any]:
+    documents = make_documents(rows)
+
+    # Both paths must produce the same payload
+    validated = orjson.loads(serialize_validated(documents))
+    trusted = orjson.loads(serialize_trusted(documents))
+    assert validated["data"] == trusted["data"], "trusted serialization diverges from the response model"
+
+    before = measure(serialize_validated, documents, repeat)
+    after = measure(serialize_trusted, documents, repeat)
+    return {
+        "benchmark": "history_serialization",
+        "rows": rows,
+        "repeat": repeat,
+        "before": before,
+        "after": after,
+        "speedup": after["rows_per_second"] / before["rows_per_second"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    print(json.dumps(run(args.rows, args.repeat), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Upstream payload transform benchmark.
+
+Times WeatherService._transform_openweathermap_data per payload, and the
+batched transform used by group fetches, over canned OpenWeatherMap payloads.
+
+Usage:
+    python -m benchmarks.bench_transform [--payloads 10000] [--repeat 5]
+"""
+import argparse
+import json
+import time
+from typing import Any, Dict
+
+from benchmarks.fakes import make_locations, owm_payload
+from app.services.weather_service import WeatherService
+
+
+def run(payloads: int = 10000, repeat: int = 5) -> Dict[str, Any]:
+    # The transforms never touch storage, so no database is needed
+    service = WeatherService(repository=object(), rollups=object())
+    locations = make_locations(payloads)
+    items = [owm_payload(i, location.name, location.city_id) for i, location in enumerate(locations)]
+    names = [location.name for location in locations]
+
+    def single():
+        for item, name in zip(items, names):
+            service._transform_openweathermap_data(item, name)
+
+    def batch():
+        service._transform_openweathermap_batch(items, names)
+
+    results = {}
+    for label, fn in (("single", single), ("batch", batch)):
+        fn()
+        started = time.perf_counter()
+        for _ in range(repeat):
+            fn()
+        elapsed = time.perf_counter() - started
+        results[label] = {
+            "payloads_per_second": payloads * repeat / elapsed,
+            "microseconds_per_payload": elapsed / (payloads * repeat) * 1e6,
+        }
+
+    return {"benchmark": "transform", "payloads": payloads, "repeat": repeat, **results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--payloads", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    print(json.dumps(run(args.payloads, args.repeat), indent=2))
+
+
+if __name__ == "__main__":
+    main()
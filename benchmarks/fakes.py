@@ -0,0 +1,66 @@
+"""
+Offline stand-ins for the benchmarks: the fake OpenWeatherMap upstream shared
+with the tests, and a Mongo backend that is a real server when a URI is given,
+otherwise an in-process mongomock-motor client.
+"""
+import logging
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+from app.core.config import get_settings
+from app.db.mongodb import db
+from app.db.repositories.weather_repository import WeatherRepository
+from tests.fakes import BASE_DT, FakeOpenWeatherMap, make_locations, owm_payload, patch_mongomock  # noqa: F401
+
+
+def use_mongo(uri: Optional[str] = None, db_name: str = "weather_benchmark") -> str:
+    """
+    Point app.db.mongodb at a fresh benchmark database and return the backend name.
+
+    With a URI the benchmark runs against that server; otherwise mongomock-motor
+    (pip install mongomock-motor) stands in. In-process numbers are only
+    comparable with other in-process runs.
+    """
+    if uri:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        db.client = AsyncIOMotorClient(uri)
+        backend = "mongodb"
+    else:
+        from mongomock_motor import AsyncMongoMockClient
+        patch_mongomock()
+        db.client = AsyncMongoMockClient()
+        backend = "mongomock"
+    db.db = db.client[db_name]
+    return backend
+
+
+async def seed_history(documents: List[Dict[str, Any]], batch_size: int = 5000) -> None:
+    """Bulk insert stored-shape documents, then build the indexes and seed the per-location counters"""
+    repository = WeatherRepository()
+    for offset in range(0, len(documents), batch_size):
+        await repository.collection.insert_many(documents[offset:offset + batch_size], ordered=False)
+    await repository.initialize()
+    await repository.ensure_counters(sorted({document["location"] for document in documents}))
+
+
+async def drop_database() -> None:
+    await db.client.drop_database(db.db.name)
+
+
+@contextmanager
+def override_settings(**values: Any) -> Iterator[None]:
+    """Temporarily change fields on the shared settings object"""
+    settings = get_settings()
+    previous = {key: getattr(settings, key) for key in values}
+    for key, value in values.items():
+        setattr(settings, key, value)
+    try:
+        yield
+    finally:
+        for key, value in previous.items():
+            setattr(settings, key, value)
+
+
+def quiet_logging() -> None:
+    """Per-request and per-tick INFO logs would dominate the timings"""
+    logging.getLogger("weather_service").setLevel(logging.WARNING)
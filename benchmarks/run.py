@@ -0,0 +1,81 @@
+"""
+Run the benchmark suite and emit one JSON report.
+
+Needs no network: the upstream is faked and storage is a real MongoDB when
+--mongodb-uri is given, otherwise mongomock-motor. mongomock scans
+collections in Python, so keep sizes small without a server and only
+compare reports taken against the same backend.
+
+Usage:
+    python -m benchmarks.run [--mongodb-uri URI] [--only NAME ...] [--documents N] [--output report.json]
+"""
+import argparse
+import asyncio
+import json
+import platform
+import subprocess
+import sys
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from benchmarks import bench_api, bench_ingest, bench_retention, bench_serialization, bench_transform
+
+BENCHMARKS = ["transform", "serialization", "ingest", "api", "retention"]
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(selected: List[str], documents: int, mongodb_uri: Optional[str] = None) -> Dict[str, Any]:
+    results = []
+    for name in selected:
+        if name == "transform":
+            results.append(bench_transform.run())
+        elif name == "serialization":
+            results.append(bench_serialization.run())
+        elif name == "ingest":
+            results.append(asyncio.run(bench_ingest.run(mongodb_uri=mongodb_uri)))
+            results.append(asyncio.run(bench_ingest.run(mode="group", mongodb_uri=mongodb_uri)))
+        elif name == "api":
+            results.append(asyncio.run(bench_api.run(documents=documents, mongodb_uri=mongodb_uri)))
+        elif name == "retention":
+            results.append(asyncio.run(bench_retention.run(documents=documents, mongodb_uri=mongodb_uri)))
+
+    return {
+        "started_at": datetime.utcnow().isoformat(),
+        "revision": git_revision(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "backend": "mongodb" if mongodb_uri else "mongomock",
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--mongodb-uri", help="Benchmark against a real MongoDB instead of mongomock-motor")
+    parser.add_argument("--only", nargs="+", choices=BENCHMARKS, default=BENCHMARKS)
+    parser.add_argument(
+        "--documents", type=int, default=None,
+        help="Stored documents for the api and retention benchmarks (default 100000 with a server, 5000 without)"
+    )
+    parser.add_argument("--output", help="Also write the report to this file")
+    args = parser.parse_args()
+
+    documents = args.documents or (100000 if args.mongodb_uri else 5000)
+    report = run(args.only, documents, args.mongodb_uri)
+    rendered = json.dumps(report, indent=2)
+    print(rendered)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(rendered + "\n")
+
+
+if __name__ == "__main__":
+    main()
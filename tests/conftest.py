@@ -0,0 +1,30 @@
+import pytest
+
+from app.core.config import get_settings
+from app.db.mongodb import db
+from tests.fakes import patch_mongomock
+
+
+@pytest.fixture
+def override_settings(monkeypatch):
+    """Change fields on the shared settings object for one test"""
+    shared = get_settings()
+
+    def set_values(**values):
+        for key, value in values.items():
+            monkeypatch.setattr(shared, key, value)
+
+    return set_values
+
+
+@pytest.fixture
+def mongo():
+    """Point app.db.mongodb at a fresh in-process mongomock-motor database"""
+    from mongomock_motor import AsyncMongoMockClient
+
+    patch_mongomock()
+    previous = db.client, db.db
+    db.client = AsyncMongoMockClient()
+    db.db = db.client["weather_test"]
+    yield db.db
+    db.client, db.db = previous
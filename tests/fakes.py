@@ -0,0 +1,155 @@
+"""
+Offline stand-ins shared by the tests and benchmarks.
+
+The upstream is an httpx mock transport serving canned OpenWeatherMap
+payloads whose ``dt`` advances on every call, so each ingest tick stores a
+new observation rather than being deduplicated.
+"""
+import itertools
+from typing import Any, Dict, Iterable, List, Optional
+
+import httpx
+
+from app.core.config import LocationSettings
+
+BASE_DT = 1704067200  # 2024-01-01T00:00:00Z
+
+
+def make_locations(count: int) -> List[LocationSettings]:
+    """Build ``count`` monitored locations with distinct names and city IDs"""
+    return [
+        LocationSettings(name=f"City {i}", lat=30.0 + i * 0.01, lon=-97.0 - i * 0.01, city_id=1000 + i)
+        for i in range(count)
+    ]
+
+
+def owm_payload(seq: int, name: str = "Austin", city_id: int = 4671654) -> Dict[str, Any]:
+    """Canned OpenWeatherMap current-weather payload for the ``seq``-th observation"""
+    return {
+        "coord": {"lon": -97.74, "lat": 30.27},
+        "weather": [{"id": 800, "main": "Clear", "description": "clear sky", "icon": "01d"}],
+        "main": {"temp": 20.0 + seq % 10, "feels_like": 19.5, "pressure": 1013, "humidity": 40 + seq % 30},
+        "visibility": 10000,
+        "wind": {"speed": 3.6, "deg": (seq * 15) % 360},
+        "clouds": {"all": seq % 100},
+        "dt": BASE_DT + seq * 60,
+        "sys": {"country": "US", "sunrise": BASE_DT - 3600, "sunset": BASE_DT + 36000},
+        "timezone": -21600,
+        "id": city_id,
+        "name": name,
+    }
+
+
+class FakeOpenWeatherMap:
+    """
+    Mock transport for the /weather and /group endpoints with an advancing observation time.
+
+    City IDs in ``missing`` are left out of group responses, as upstream does
+    for IDs it does not know. Every request is recorded by endpoint.
+    """
+
+    def __init__(self, locations: Optional[List[LocationSettings]] = None, missing: Iterable[int] = ()):
+        self.locations = {location.city_id: location for location in locations or []}
+        self.missing = set(missing)
+        self.requests = 0
+        self.endpoints: List[str] = []
+        self._seq = itertools.count()
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        self.requests += 1
+        seq = next(self._seq)
+        if request.url.path.endswith("/group"):
+            self.endpoints.append("group")
+            ids = [int(city_id) for city_id in request.url.params["id"].split(",")]
+            items = [
+                owm_payload(seq, self.locations[city_id].name, city_id)
+                for city_id in ids if city_id not in self.missing
+            ]
+            return httpx.Response(200, json={"cnt": len(items), "list": items})
+        self.endpoints.append("weather")
+        return httpx.Response(200, json=owm_payload(seq))
+
+    def client(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(transport=httpx.MockTransport(self.handle))
+
+
+def patch_mongomock() -> None:
+    """Smooth over the gaps between mongomock-motor and the driver features the app relies on"""
+    _patch_mongomock_bulk_sort()
+    _patch_mongomock_bulk_upserted_index()
+    _patch_mongomock_with_options()
+
+
+def _patch_mongomock_bulk_sort() -> None:
+    """Recent pymongo passes ``sort`` to bulk updates, which mongomock does not accept yet"""
+    import mongomock.collection
+
+    builder = mongomock.collection.BulkOperationBuilder
+    if getattr(builder, "_accepts_sort", False):
+        return
+    add_update = builder.add_update
+
+    def add_update_without_sort(self, *args, sort=None, **kwargs):
+        return add_update(self, *args, **kwargs)
+
+    builder.add_update = add_update_without_sort
+    builder._accepts_sort = True
+
+
+def _patch_mongomock_bulk_upserted_index() -> None:
+    """
+    mongomock numbers bulk upserts among the upserts rather than among all operations.
+
+    The driver reports the operation's own index, which callers use to tell
+    inserts from matches, so the real indexes are recorded and swapped in.
+    """
+    import functools
+
+    import mongomock.collection
+
+    builder = mongomock.collection.BulkOperationBuilder
+    if getattr(builder, "_indexes_upserts", False):
+        return
+    execute = builder.execute
+
+    def execute_with_operation_indexes(self, *args, **kwargs):
+        upserted_at = []
+
+        def tracked(index, executor):
+            @functools.wraps(executor)
+            def run():
+                result = executor()
+                if result.get("upserted"):
+                    upserted_at.append(index)
+                return result
+            return run
+
+        self.executors = [tracked(index, executor) for index, executor in enumerate(self.executors)]
+        result = execute(self, *args, **kwargs)
+        for upsert, index in zip(result.get("upserted", []), upserted_at):
+            upsert["index"] = index
+        return result
+
+    builder.execute = execute_with_operation_indexes
+    builder._indexes_upserts = True
+
+
+def _patch_mongomock_with_options() -> None:
+    """
+    mongomock-motor's with_options returns an unwrapped, synchronous collection.
+
+    The options are recorded on the returned wrapper so tests can still check
+    which read preference a repository asked for.
+    """
+    from mongomock_motor import AsyncMongoMockCollection
+
+    if getattr(AsyncMongoMockCollection, "_records_options", False):
+        return
+
+    def with_options(self, **options):
+        collection = AsyncMongoMockCollection(self.database, self._AsyncMongoMockCollection__collection)
+        collection.options = options
+        return collection
+
+    AsyncMongoMockCollection.with_options = with_options
+    AsyncMongoMockCollection._records_options = True
@@ -0,0 +1,245 @@
+from datetime import datetime, timedelta
+
+import httpx
+import orjson
+import pytest
+import pytest_asyncio
+
+from app.api.routes import weather as weather_routes
+from app.core.config import get_settings
+from app.main import app
+from app.models.weather import ExportFormat
+from app.services.broadcast_service import Broadcaster
+from app.services.cache_service import LatestWeatherCache
+from app.services.weather_service import WeatherService
+from app.utils.resilience import CircuitBreaker
+from tests.fakes import owm_payload
+
+LOCATION = get_settings().WEATHER_LOCATION
+
+
+@pytest_asyncio.fixture
+async def api(mongo):
+    """An API client against the app with its shared service built on the test database"""
+    service = WeatherService(cache=LatestWeatherCache(), rollups=None)
+    app.state.weather_repository = service.repository
+    app.state.weather_service = service
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        client.service = service
+        yield client
+
+
+async def store_at(service: WeatherService, *timestamps: datetime, first_seq: int = 0) -> list:
+    items = []
+    for seq, timestamp in enumerate(timestamps, first_seq):
+        item = service._transform_openweathermap_data(owm_payload(seq), LOCATION)
+        item.timestamp = item.observed_at = timestamp
+        items.append(item)
+    inserted, _ = await service.repository.store_observations(items)
+    return inserted
+
+
+@pytest.mark.asyncio
+async def test_history_with_one_bound_leaves_the_other_open(api):
+    end = datetime.utcnow() - timedelta(days=3)
+    await store_at(api.service, end - timedelta(days=2), end - timedelta(hours=2), end + timedelta(hours=2))
+
+    response = await api.get("/api/weather/history", params={"end_date": end.isoformat(), "exact_count": True})
+    assert response.status_code == 200
+    assert response.json()["count"] == 2
+
+    response = await api.get("/api/weather/history", params={"start_date": end.isoformat(), "exact_count": True})
+    assert response.status_code == 200
+    assert response.json()["count"] == 1
+
+
+@pytest.mark.asyncio
+async def test_history_fields_are_validated_and_deduplicated(api):
+    await store_at(api.service, datetime.utcnow() - timedelta(hours=1))
+
+    response = await api.get("/api/weather/history", params={"fields": "timestamp,temp_c,timestamp"})
+    assert response.status_code == 200
+    assert response.json()["fields"] == ["timestamp", "temp_c"]
+    assert set(response.json()["data"][0]) == {"timestamp", "temp_c"}
+
+    response = await api.get("/api/weather/history", params={"fields": "timestamp,nonsense"})
+    assert response.status_code == 400
+    assert "Unknown fields: nonsense" in response.json()["detail"]
+
+
+@pytest.mark.asyncio
+async def test_aggregate_rejects_unknown_metrics(api):
+    response = await api.get("/api/weather/aggregate", params={"metrics": "temp_c,nonsense"})
+
+    assert response.status_code == 400
+    assert "Unknown metrics: nonsense" in response.json()["detail"]
+
+
+@pytest.mark.asyncio
+async def test_stream_sends_heartbeats_and_unsubscribes_on_disconnect(api, override_settings, monkeypatch):
+    override_settings(STREAM_HEARTBEAT_SECONDS=0.01)
+    broadcaster = Broadcaster(queue_size=10)
+    monkeypatch.setattr(weather_routes, "weather_broadcaster", broadcaster)
+
+    response = await weather_routes.stream_weather(location=[LOCATION], weather_service=api.service)
+    body = response.body_iterator
+    assert response.media_type == "text/event-stream"
+    assert await body.__anext__() == b"retry: 3000\n\n"
+    assert await body.__anext__() == b": heartbeat\n\n"
+    assert broadcaster.stats()["subscribers"] == 1
+
+    broadcaster.publish([api.service._transform_openweathermap_data(owm_payload(0), LOCATION)])
+    assert (await body.__anext__()).startswith(b"event: observation\n")
+
+    # Starlette closes the generator when the client goes away
+    await body.aclose()
+    assert broadcaster.stats()["subscribers"] == 0
+
+
+@pytest.mark.asyncio
+async def test_stream_tells_a_dropped_subscriber_and_ends(api, monkeypatch):
+    broadcaster = Broadcaster(queue_size=1)
+    monkeypatch.setattr(weather_routes, "weather_broadcaster", broadcaster)
+
+    response = await weather_routes.stream_weather(location=None, weather_service=api.service)
+    body = response.body_iterator
+    await body.__anext__()
+    broadcaster.publish([
+        api.service._transform_openweathermap_data(owm_payload(seq), LOCATION) for seq in range(2)
+    ])
+
+    assert [chunk async for chunk in body] == [b"event: dropped\ndata: {}\n\n"]
+    assert broadcaster.stats()["subscribers"] == 0
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("param", ["after", "before"])
+async def test_history_rejects_a_tampered_cursor(api, param):
+    await store_at(api.service, datetime.utcnow() - timedelta(hours=2), datetime.utcnow() - timedelta(hours=1))
+    page = (await api.get("/api/weather/history", params={"limit": 1})).json()
+    tampered = page["next_cursor"][:-4] + "!!!!"
+
+    response = await api.get("/api/weather/history", params={param: tampered})
+
+    assert response.status_code == 400
+    assert "Invalid pagination cursor" in response.json()["detail"]
+
+
+@pytest.mark.asyncio
+async def test_refused_refresh_says_when_to_retry(api):
+    api.service.breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    api.service.breaker.record_failure()
+
+    response = await api.post("/api/weather/refresh")
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "30"
+
+
+@pytest.mark.asyncio
+async def test_upstream_errors_without_a_retry_time_have_no_retry_after(api):
+    api.service.breaker = CircuitBreaker(failure_threshold=5, reset_timeout=30)
+    api.service.http_client = httpx.AsyncClient(transport=httpx.MockTransport(lambda request: httpx.Response(500)))
+
+    response = await api.post("/api/weather/refresh")
+
+    assert response.status_code >= 500
+    assert "Retry-After" not in response.headers
+
+
+@pytest.mark.asyncio
+async def test_current_revalidates_until_a_new_observation_arrives(api):
+    await store_at(api.service, datetime.utcnow() - timedelta(seconds=30))
+
+    response = await api.get("/api/weather/current")
+    assert response.status_code == 200
+    etag, last_modified = response.headers["ETag"], response.headers["Last-Modified"]
+    assert response.headers["Cache-Control"].startswith("public, max-age=")
+
+    response = await api.get("/api/weather/current", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["ETag"] == etag
+
+    response = await api.get("/api/weather/current", headers={"If-Modified-Since": last_modified})
+    assert response.status_code == 304
+
+    # Ingest stores a newer observation and caches it as the latest
+    newer, = await store_at(api.service, datetime.utcnow(), first_seq=1)
+    api.service.cache.set(newer)
+
+    response = await api.get("/api/weather/current", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert response.json()["data"]["id"] == newer.id
+
+
+@pytest.mark.asyncio
+async def test_closed_history_ranges_are_cached_as_immutable(api):
+    end = datetime.utcnow() - timedelta(days=2)
+
+    response = await api.get("/api/weather/history", params={
+        "start_date": (end - timedelta(days=1)).isoformat(), "end_date": end.isoformat()
+    })
+
+    assert response.status_code == 200
+    max_age = get_settings().HISTORY_CLOSED_RANGE_MAX_AGE_SECONDS
+    assert response.headers["Cache-Control"] == f"public, max-age={max_age}, immutable"
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("params", [{}, {"start_date": (datetime.utcnow() - timedelta(days=1)).isoformat()}])
+async def test_open_history_ranges_expire_with_the_next_update(api, params):
+    response = await api.get("/api/weather/history", params=params)
+
+    assert response.status_code == 200
+    interval = get_settings().WEATHER_UPDATE_INTERVAL_SECONDS
+    assert response.headers["Cache-Control"] == f"public, max-age={interval}"
+
+
+@pytest.mark.asyncio
+async def test_export_streams_ndjson_in_batches(api, override_settings):
+    override_settings(EXPORT_BATCH_SIZE=2)
+    start = datetime(2024, 1, 1)
+    stored = await store_at(api.service, *(start + timedelta(minutes=minute) for minute in range(5)))
+
+    response = await api.get("/api/weather/history/export", params={"start_date": start.isoformat()})
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert 'filename="weather_history.ndjson"' in response.headers["content-disposition"]
+    rows = [orjson.loads(line) for line in response.content.splitlines()]
+    assert [row["id"] for row in rows] == [item.id for item in stored]
+
+    # One chunk per Mongo batch, written as each batch arrives
+    streamed = await weather_routes.export_weather_history(
+        format=ExportFormat.NDJSON, start_date=start, end_date=None, location=None, weather_service=api.service
+    )
+    chunks = [chunk async for chunk in streamed.body_iterator]
+    assert [len(chunk.splitlines()) for chunk in chunks] == [2, 2, 1]
+
+
+@pytest.mark.asyncio
+async def test_export_writes_csv_with_a_header(api):
+    start = datetime(2024, 1, 1)
+    await store_at(api.service, start, start + timedelta(minutes=1))
+
+    response = await api.get("/api/weather/history/export", params={"format": "csv", "start_date": start.isoformat()})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    lines = response.text.splitlines()
+    assert lines[0].startswith("id,location,timestamp,temp_c")
+    assert len(lines) == 3
+
+
+@pytest.mark.asyncio
+async def test_export_normalizes_aware_bounds_to_utc(api):
+    start = datetime(2024, 1, 1)
+    await store_at(api.service, *(start + timedelta(hours=hour) for hour in range(4)))
+
+    # 06:00+06:00 is midnight UTC, so the range covers 00:00 to 02:00 UTC
+    response = await api.get("/api/weather/history/export", params={
+        "start_date": "2024-01-01T06:00:00+06:00", "end_date": "2024-01-01T08:00:00+06:00"
+    })
+
+    timestamps = [orjson.loads(line)["timestamp"] for line in response.content.splitlines()]
+    assert timestamps == ["2024-01-01T00:00:00", "2024-01-01T01:00:00", "2024-01-01T02:00:00"]
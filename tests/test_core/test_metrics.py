@@ -0,0 +1,99 @@
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from fastapi import APIRouter, FastAPI
+from fastapi.responses import StreamingResponse
+from prometheus_client import REGISTRY
+
+from app.core.metrics import MetricsMiddleware, MongoPoolMetrics
+
+
+def latency(route: str, status: str = "200"):
+    labels = {"method": "GET", "route": route, "status": status}
+    return (
+        REGISTRY.get_sample_value("http_request_duration_seconds_count", labels),
+        REGISTRY.get_sample_value("http_request_duration_seconds_sum", labels),
+    )
+
+
+def make_app() -> FastAPI:
+    router = APIRouter(prefix="/things")
+
+    @router.get("/{thing_id}")
+    async def get_thing(thing_id: str):
+        return {"id": thing_id}
+
+    @router.get("/{thing_id}/stream")
+    async def stream_thing(thing_id: str):
+        async def generate():
+            yield b"first\n"
+            await asyncio.sleep(0.3)
+            yield b"last\n"
+        return StreamingResponse(generate())
+
+    app = FastAPI()
+    app.include_router(router, prefix="/metrics-test")
+    app.add_middleware(MetricsMiddleware)
+    return app
+
+
+@pytest.mark.asyncio
+async def test_requests_are_labelled_by_their_full_route_template():
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=make_app()), base_url="http://test") as client:
+        await client.get("/metrics-test/things/a")
+        await client.get("/metrics-test/things/b")
+        await client.get("/nowhere")
+
+    assert latency("/metrics-test/things/{thing_id}")[0] == 2
+    assert latency("unmatched", "404")[0] >= 1
+
+
+@pytest.mark.asyncio
+async def test_streamed_responses_are_timed_to_their_first_chunk():
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=make_app()), base_url="http://test") as client:
+        response = await client.get("/metrics-test/things/a/stream")
+    assert response.content == b"first\nlast\n"
+
+    count, total = latency("/metrics-test/things/{thing_id}/stream")
+    assert count == 1
+    assert total < 0.3
+
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint_exposes_route_latency(mongo):
+    from app.main import app
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        await client.get("/api")
+        await client.get("/api/health/stream")
+        body = (await client.get("/metrics")).text
+
+    assert 'http_request_duration_seconds_count{method="GET",route="/api",status="200"}' in body
+    assert 'http_request_duration_seconds_count{method="GET",route="/api/health/stream",status="200"}' in body
+    assert "weather_stream_subscribers" in body
+
+
+def test_pool_saturation_is_that_of_the_busiest_server():
+    pool = MongoPoolMetrics(max_pool_size=4)
+    primary, secondary = ("mongo-0", 27017), ("mongo-1", 27017)
+
+    def check_out(address, times):
+        for _ in range(times):
+            pool.connection_check_out_started(SimpleNamespace(address=address))
+            pool.connection_checked_out(SimpleNamespace(address=address, duration=None))
+
+    check_out(primary, 3)
+    check_out(secondary, 4)
+    pool.connection_checked_in(SimpleNamespace(address=secondary))
+
+    stats = pool.stats()
+    assert stats["checked_out"] == 6
+    assert stats["busiest_server_checked_out"] == 3
+    assert stats["saturation"] == 0.75
+
+    pool.pool_closed(SimpleNamespace(address=primary))
+    assert pool.stats()["saturation"] == 0.75
+    pool.connection_checked_in(SimpleNamespace(address=secondary))
+    assert pool.stats()["saturation"] == 0.5
@@ -0,0 +1,40 @@
+from datetime import datetime
+
+import pytest
+
+from app.db.repositories.rollup_repository import GRANULARITIES, RollupRepository, plan_rollup_cover
+from app.db.repositories.weather_repository import WeatherRepository
+
+
+def test_plan_rollup_cover_uses_the_coarsest_buckets():
+    segments = plan_rollup_cover(datetime(2024, 1, 1, 22, 30), datetime(2024, 1, 3, 1, 15))
+
+    assert segments == [
+        ("minute", datetime(2024, 1, 1, 22, 30), datetime(2024, 1, 1, 23)),
+        ("hour", datetime(2024, 1, 1, 23), datetime(2024, 1, 2)),
+        ("day", datetime(2024, 1, 2), datetime(2024, 1, 3)),
+        ("hour", datetime(2024, 1, 3), datetime(2024, 1, 3, 1)),
+        ("minute", datetime(2024, 1, 3, 1), datetime(2024, 1, 3, 1, 15)),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_ensure_backfilled_rebuilds_each_location_once(mongo):
+    await WeatherRepository().ensure_counters(["Austin"])
+    rebuilt = []
+
+    async def rebuild(location, granularity, start_time=None, end_time=None):
+        rebuilt.append((location, granularity))
+
+    first = RollupRepository()
+    first.rebuild = rebuild
+    await first.ensure_backfilled(["Austin"])
+    assert rebuilt == [("Austin", granularity) for granularity in GRANULARITIES]
+    assert first.backfilled == {"Austin"}
+
+    # Another process, or a restart, only reads the marker
+    second = RollupRepository()
+    second.rebuild = rebuild
+    await second.ensure_backfilled(["Austin"])
+    assert len(rebuilt) == len(GRANULARITIES)
+    assert second.backfilled == {"Austin"}
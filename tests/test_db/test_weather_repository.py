@@ -0,0 +1,217 @@
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+from pydantic import ValidationError
+from pymongo.errors import BulkWriteError
+from pymongo.read_preferences import Primary, PrimaryPreferred, Secondary, SecondaryPreferred, Nearest
+
+from app.core.config import Settings
+from app.core.exceptions import DatabaseException
+from app.db.mongodb import read_preference
+from app.db.repositories.rollup_repository import RollupRepository
+from app.db.repositories.weather_repository import WeatherRepository
+from app.models.weather import WeatherData
+from app.services.cache_service import LatestWeatherCache
+from app.services.weather_service import WeatherService
+from tests.fakes import owm_payload
+
+
+@pytest.mark.parametrize("mode, expected", [
+    ("primaryPreferred", PrimaryPreferred),
+    ("secondary", Secondary),
+    ("secondaryPreferred", SecondaryPreferred),
+    ("nearest", Nearest),
+])
+def test_read_preference_bounds_secondary_reads_by_staleness(override_settings, mode, expected):
+    override_settings(MONGODB_MAX_STALENESS_SECONDS=120)
+
+    preference = read_preference(mode)
+
+    assert isinstance(preference, expected)
+    assert preference.max_staleness == 120
+
+
+def test_read_preference_primary_has_no_staleness_bound():
+    assert read_preference("primary") == Primary()
+
+
+@pytest.mark.parametrize("seconds", [90, 600, -1])
+def test_max_staleness_accepts_bounds_mongodb_allows(seconds):
+    assert Settings(MONGODB_MAX_STALENESS_SECONDS=seconds).MONGODB_MAX_STALENESS_SECONDS == seconds
+
+
+@pytest.mark.parametrize("seconds", [0, 30, 89, -5])
+def test_max_staleness_rejects_bounds_mongodb_refuses(seconds):
+    with pytest.raises(ValidationError):
+        Settings(MONGODB_MAX_STALENESS_SECONDS=seconds)
+
+
+def test_repositories_carry_the_configured_read_preferences(mongo, override_settings):
+    override_settings(
+        MONGODB_HISTORY_READ_PREFERENCE="secondary",
+        MONGODB_LATEST_READ_PREFERENCE="primaryPreferred",
+        MONGODB_MAX_STALENESS_SECONDS=90,
+    )
+
+    repository = WeatherRepository()
+    rollups = RollupRepository()
+
+    assert repository.history_reads.options["read_preference"] == Secondary(max_staleness=90)
+    assert repository.latest_reads.options["read_preference"] == PrimaryPreferred(max_staleness=90)
+    assert rollups.reads.options["read_preference"] == Secondary(max_staleness=90)
+    # Writes and maintenance stay on the primary
+    assert repository.collection.read_preference == Primary()
+
+
+@pytest.mark.asyncio
+async def test_reads_through_secondary_preferences_see_stored_records(mongo, override_settings):
+    # The in-process database stands in for a single-node replica set, where every read lands on the primary
+    override_settings(MONGODB_HISTORY_READ_PREFERENCE="secondaryPreferred")
+    repository = WeatherRepository()
+    await repository.collection.insert_one({"location": "Austin"})
+
+    assert await repository.count_records("Austin") == 1
+
+
+def observation(seq: int, location: str = "Austin") -> WeatherData:
+    """The ``seq``-th upstream observation for a location as the ingest path builds it"""
+    return WeatherService(cache=LatestWeatherCache())._transform_openweathermap_data(owm_payload(seq), location)
+
+
+async def maintained_count(repository: WeatherRepository, location: str = "Austin") -> int:
+    return (await repository.counters.find_one({"_id": location}) or {}).get("count", 0)
+
+
+@pytest.mark.asyncio
+async def test_store_observations_skips_stored_observations(mongo):
+    repository = WeatherRepository()
+    await repository.initialize()
+
+    inserted, existing = await repository.store_observations([observation(0), observation(1)])
+    assert len(inserted) == 2 and existing == []
+
+    inserted, existing = await repository.store_observations([observation(1), observation(2)])
+
+    assert [item.observed_at for item in inserted] == [observation(2).observed_at]
+    assert [item.observed_at for item in existing] == [observation(1).observed_at]
+    assert existing[0].last_seen is None
+    assert await repository.count_records("Austin") == 3
+    assert await maintained_count(repository) == 3
+
+
+@pytest.mark.asyncio
+async def test_store_observations_touches_stored_observations(mongo):
+    repository = WeatherRepository()
+    await repository.initialize()
+    await repository.store_observations([observation(0)])
+
+    inserted, existing = await repository.store_observations([observation(0)], touch=True)
+
+    assert inserted == []
+    assert existing[0].last_seen is not None
+    assert await repository.count_records("Austin") == 1
+    assert await maintained_count(repository) == 1
+
+
+@pytest.mark.asyncio
+async def test_store_observations_counts_upserts_that_lost_a_race_as_duplicates(mongo):
+    repository = WeatherRepository()
+    await repository.initialize()
+    bulk_write = repository.collection.bulk_write
+
+    async def racing_bulk_write(operations, ordered=True):
+        # Another writer stores the first observation between our match and insert
+        await repository.collection.insert_one({**operations[0]._doc["$setOnInsert"], "_id": ObjectId()})
+        result = await bulk_write(operations[1:], ordered=ordered)
+        raise BulkWriteError({
+            "writeErrors": [{"index": 0, "code": 11000, "errmsg": "E11000 duplicate key error"}],
+            "upserted": [{"index": index + 1, "_id": _id} for index, _id in result.upserted_ids.items()],
+        })
+
+    repository.collection.bulk_write = racing_bulk_write
+
+    inserted, existing = await repository.store_observations([observation(0), observation(1)], touch=True)
+
+    assert [item.observed_at for item in inserted] == [observation(1).observed_at]
+    assert [item.observed_at for item in existing] == [observation(0).observed_at]
+    assert existing[0].last_seen is not None
+    # The racing writer keeps its own count; ours covers only what we inserted
+    assert await maintained_count(repository) == 1
+
+
+@pytest.mark.asyncio
+async def test_store_observations_raises_for_other_write_errors(mongo):
+    repository = WeatherRepository()
+
+    async def failing_bulk_write(operations, ordered=True):
+        raise BulkWriteError({"writeErrors": [{"index": 0, "code": 121, "errmsg": "Document failed validation"}]})
+
+    repository.collection.bulk_write = failing_bulk_write
+
+    with pytest.raises(DatabaseException, match="Document failed validation"):
+        await repository.store_observations([observation(0)])
+
+
+async def store_pages(repository: WeatherRepository, timestamps) -> None:
+    """Store one observation per timestamp; repeated timestamps are tie-broken by _id"""
+    items = []
+    for seq, timestamp in enumerate(timestamps):
+        item = observation(seq)
+        item.timestamp = timestamp
+        items.append(item)
+    await repository.store_observations(items)
+
+
+def page_keys(records) -> list:
+    return [(record.timestamp, record.id) for record in records]
+
+
+@pytest.mark.asyncio
+async def test_keyset_pages_walk_forward_and_back_to_the_same_pages(mongo):
+    repository = WeatherRepository()
+    start = datetime(2024, 1, 1)
+    # Seven rows over four timestamps, so pages split runs of equal timestamps
+    await store_pages(repository, [start + timedelta(minutes=minute) for minute in (0, 0, 1, 1, 1, 2, 3)])
+
+    forward = []
+    records, next_cursor, prev_cursor = await repository.get_history_page("Austin", limit=3)
+    assert prev_cursor is None
+    forward.append(page_keys(records))
+    while next_cursor:
+        records, next_cursor, prev_cursor = await repository.get_history_page("Austin", limit=3, after=next_cursor)
+        assert prev_cursor is not None
+        forward.append(page_keys(records))
+
+    assert [len(page) for page in forward] == [3, 3, 1]
+    rows = [row for page in forward for row in page]
+    assert rows == sorted(rows, reverse=True)
+    assert len(set(rows)) == 7
+
+    backward = [forward[-1]]
+    while prev_cursor:
+        records, next_cursor, prev_cursor = await repository.get_history_page("Austin", limit=3, before=prev_cursor)
+        assert next_cursor is not None
+        backward.insert(0, page_keys(records))
+
+    assert backward == forward
+
+
+@pytest.mark.asyncio
+async def test_offset_pages_offer_a_cursor_back(mongo):
+    repository = WeatherRepository()
+    start = datetime(2024, 1, 1)
+    await store_pages(repository, [start + timedelta(minutes=minute) for minute in range(4)])
+
+    records, next_cursor, prev_cursor = await repository.get_history_page("Austin", limit=2, skip=2)
+    assert next_cursor is None
+    newer, _, newest_prev = await repository.get_history_page("Austin", limit=2, before=prev_cursor)
+
+    assert [record.timestamp for record in newer] == [start + timedelta(minutes=3), start + timedelta(minutes=2)]
+    assert newest_prev is None
+
+
+@pytest.mark.asyncio
+async def test_malformed_cursor_is_rejected(mongo):
+    with pytest.raises(ValueError):
+        await WeatherRepository().get_history_page("Austin", after="not-a-cursor")
@@ -0,0 +1,163 @@
+import asyncio
+
+import orjson
+import pytest
+from bson import ObjectId
+
+from app.core.config import get_settings
+from app.db.mongodb import db
+from app.db.repositories.weather_repository import WeatherRepository
+from app.services.broadcast_service import DROPPED, Broadcaster, watch_weather_changes
+from app.services.cache_service import LatestWeatherCache
+from app.services.recent_history_service import RecentHistory
+from app.services.weather_service import WeatherService
+from app.utils.resilience import CircuitBreaker, TokenBucket
+from tests.fakes import FakeOpenWeatherMap, make_locations, owm_payload
+
+
+def observation(seq: int, location: str = "Austin"):
+    service = WeatherService.__new__(WeatherService)
+    item = service._transform_openweathermap_data(owm_payload(seq), location)
+    item.id = str(ObjectId())
+    return item
+
+
+def drain(subscription) -> list:
+    events = []
+    while not subscription.queue.empty():
+        events.append(subscription.queue.get_nowait())
+    return events
+
+
+def event_location(event: bytes) -> str:
+    return orjson.loads(event.split(b"data: ", 1)[1])["location"]
+
+
+def test_subscribers_only_get_their_locations():
+    broadcaster = Broadcaster(queue_size=10)
+    austin = broadcaster.subscribe(["Austin"])
+    both = broadcaster.subscribe(["Austin", "Dallas"])
+    everything = broadcaster.subscribe()
+
+    broadcaster.publish([observation(0, "Austin"), observation(1, "Dallas"), observation(2, "Houston")])
+
+    assert [event_location(event) for event in drain(austin)] == ["Austin"]
+    assert [event_location(event) for event in drain(both)] == ["Austin", "Dallas"]
+    assert [event_location(event) for event in drain(everything)] == ["Austin", "Dallas", "Houston"]
+    assert broadcaster.stats() == {"subscribers": 3, "published": 3, "delivered": 6, "dropped": 0}
+
+
+def test_subscriber_with_a_full_queue_is_dropped():
+    broadcaster = Broadcaster(queue_size=2)
+    slow = broadcaster.subscribe()
+    fast = broadcaster.subscribe()
+
+    broadcaster.publish([observation(0), observation(1)])
+    drain(fast)
+    broadcaster.publish([observation(2), observation(3)])
+
+    # The backlog is discarded so the consumer wakes straight to the drop marker
+    assert drain(slow) == [DROPPED]
+    assert slow.dropped
+    assert len(drain(fast)) == 2
+    assert broadcaster.stats()["subscribers"] == 1
+    assert broadcaster.stats()["dropped"] == 1
+
+
+def test_unsubscribe_stops_delivery_and_forgets_the_subscriber():
+    broadcaster = Broadcaster(queue_size=10)
+    subscription = broadcaster.subscribe(["Austin"])
+
+    broadcaster.unsubscribe(subscription)
+    broadcaster.publish([observation(0)])
+
+    assert drain(subscription) == []
+    assert broadcaster._by_location == {}
+    assert broadcaster.stats()["subscribers"] == 0
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("source, published", [("local", 2), ("change_stream", 0)])
+async def test_ingest_publishes_locally_only_without_a_change_stream(mongo, override_settings, source, published):
+    override_settings(STREAM_SOURCE=source, WEATHER_MIN_REFRESH_INTERVAL_SECONDS=0)
+    locations = make_locations(2)
+    broadcaster = Broadcaster(queue_size=10)
+    subscription = broadcaster.subscribe()
+    service = WeatherService(
+        cache=LatestWeatherCache(),
+        http_client=FakeOpenWeatherMap(locations).client(),
+        budget=TokenBucket(rate=1000, capacity=100),
+        breaker=CircuitBreaker(failure_threshold=5, reset_timeout=60),
+        broadcaster=broadcaster,
+        rollups=None,
+    )
+    service.locations = locations
+
+    await service.fetch_and_store_all_weather()
+
+    assert len(drain(subscription)) == published
+
+
+class FakeChangeStream:
+    """Yields the given inserts, then fails or waits for more as a live change stream would"""
+
+    def __init__(self, changes: list, fail: bool):
+        self.changes = changes
+        self.fail = fail
+        self.resume_token = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    async def __aiter__(self):
+        for token, change in self.changes:
+            self.resume_token = token
+            yield change
+        if self.fail:
+            raise ConnectionError("replica set member went away")
+        await asyncio.Event().wait()
+
+
+class FakeWeatherCollection:
+    def __init__(self, rounds: list):
+        self.rounds = rounds
+        self.resumed_after = []
+
+    def watch(self, pipeline, resume_after=None):
+        self.resumed_after.append(resume_after)
+        changes, fail = self.rounds.pop(0)
+        return FakeChangeStream(changes, fail)
+
+
+@pytest.mark.asyncio
+async def test_change_stream_publishes_other_writers_inserts_and_resumes(monkeypatch):
+    def insert(seq: int):
+        document = WeatherRepository._to_document(observation(seq), exclude={"id", "last_seen"})
+        return {"operationType": "insert", "fullDocument": {**document, "_id": ObjectId()}}
+
+    collection = FakeWeatherCollection([
+        ([("token-1", insert(0))], True),
+        ([("token-2", insert(1))], False),
+    ])
+    monkeypatch.setattr(db, "db", {get_settings().MONGODB_WEATHER_COLLECTION: collection})
+    sleep = asyncio.sleep
+    monkeypatch.setattr(asyncio, "sleep", lambda delay: sleep(0))
+    broadcaster = Broadcaster(queue_size=10)
+    subscription = broadcaster.subscribe(["Austin"])
+    cache = LatestWeatherCache()
+    recent = RecentHistory()
+    recent.enabled = True
+
+    task = asyncio.create_task(watch_weather_changes(broadcaster, cache, recent))
+    events = [await asyncio.wait_for(subscription.queue.get(), 1) for _ in range(2)]
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    assert [event_location(event) for event in events] == ["Austin", "Austin"]
+    assert collection.resumed_after == [None, "token-1"]
+    assert cache.peek("Austin").observed_at == observation(1).observed_at
+    assert recent.streaming
@@ -0,0 +1,163 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.core.exceptions import DatabaseException
+from app.db.repositories.lease_repository import LeaseRepository
+from app.services.leader_service import LeaderElection
+
+
+class Clock:
+    """One manual clock serving both the lease expiry (wall time) and heartbeat validity (monotonic)"""
+
+    def __init__(self):
+        self.seconds = 0.0
+
+    def advance(self, seconds: float) -> None:
+        self.seconds += seconds
+
+    def monotonic(self) -> float:
+        return self.seconds
+
+    def utcnow(self) -> datetime:
+        return datetime(2024, 1, 1) + timedelta(seconds=self.seconds)
+
+
+def make_election(clock: Clock, events: list = None, **kwargs) -> LeaderElection:
+    """An election on the test database that records its leadership changes in ``events``"""
+    events = events if events is not None else []
+    kwargs.setdefault("on_elected", lambda: events.append("elected"))
+    kwargs.setdefault("on_demoted", lambda: events.append("demoted"))
+    election = LeaderElection(repository=LeaseRepository(clock=clock.utcnow), clock=clock.monotonic, **kwargs)
+    election.ttl_seconds = 30
+    election.heartbeat_seconds = 10
+    return election
+
+
+@pytest.mark.asyncio
+async def test_only_one_process_holds_the_lease(mongo):
+    clock = Clock()
+    first_events, second_events = [], []
+    first, second = make_election(clock, first_events), make_election(clock, second_events)
+
+    await first.heartbeat()
+    await second.heartbeat()
+
+    assert (first.is_leader, second.is_leader) == (True, False)
+    assert (first_events, second_events) == (["elected"], [])
+    assert (await first.repository.get("scheduler"))["owner"] == first.owner_id
+
+
+@pytest.mark.asyncio
+async def test_holder_renews_its_lease_before_it_expires(mongo):
+    clock = Clock()
+    events = []
+    first, second = make_election(clock, events), make_election(clock)
+    await first.heartbeat()
+
+    for _ in range(5):
+        clock.advance(10)
+        await first.heartbeat()
+        await second.heartbeat()
+
+    assert (first.is_leader, second.is_leader) == (True, False)
+    assert events == ["elected"]
+    assert (await first.repository.get("scheduler"))["expires_at"] == clock.utcnow() + timedelta(seconds=30)
+
+
+@pytest.mark.asyncio
+async def test_another_process_takes_over_once_the_lease_expires(mongo):
+    clock = Clock()
+    first, second = make_election(clock), make_election(clock)
+    await first.heartbeat()
+
+    clock.advance(29)
+    await second.heartbeat()
+    assert not second.is_leader
+
+    clock.advance(2)
+    await second.heartbeat()
+    assert second.is_leader
+
+    # The old holder finds the lease taken on its next heartbeat and steps down
+    events = []
+    first.on_demoted = lambda: events.append("demoted")
+    await first.heartbeat()
+    assert not first.is_leader
+    assert events == ["demoted"]
+
+
+@pytest.mark.asyncio
+async def test_stop_releases_the_lease_for_immediate_takeover(mongo):
+    clock = Clock()
+    events = []
+    first, second = make_election(clock, events), make_election(clock)
+    await first.heartbeat()
+
+    await first.stop()
+    await second.heartbeat()
+
+    assert events == ["elected", "demoted"]
+    assert not first.is_leader
+    assert second.is_leader
+
+
+@pytest.mark.asyncio
+async def test_failed_heartbeats_demote_before_the_lease_can_lapse(mongo):
+    clock = Clock()
+    events = []
+    election = make_election(clock, events)
+    await election.heartbeat()
+
+    async def unreachable(*args, **kwargs):
+        raise DatabaseException("Mongo is down")
+
+    election.repository.try_acquire = unreachable
+
+    # Still certainly valid: keep leading through a blip
+    clock.advance(10)
+    await election.heartbeat()
+    assert election.is_leader
+
+    # Another process could take over after 30s; give up a heartbeat before that
+    clock.advance(10)
+    await election.heartbeat()
+    assert not election.is_leader
+    assert events == ["elected", "demoted"]
+
+
+@pytest.mark.asyncio
+async def test_failing_election_callback_steps_down_and_hands_back_the_lease(mongo):
+    clock = Clock()
+    events = []
+
+    def fail_to_start():
+        raise RuntimeError("scheduler did not start")
+
+    first = make_election(clock, events, on_elected=fail_to_start)
+    second = make_election(clock)
+
+    await first.heartbeat()
+    assert not first.is_leader
+    assert events == ["demoted"]
+
+    await second.heartbeat()
+    assert second.is_leader
+
+
+@pytest.mark.asyncio
+async def test_failing_demotion_callback_still_demotes(mongo):
+    clock = Clock()
+
+    def fail_to_pause():
+        raise RuntimeError("scheduler did not pause")
+
+    first, second = make_election(clock, on_demoted=fail_to_pause), make_election(clock)
+    await first.heartbeat()
+    clock.advance(31)
+    await second.heartbeat()
+
+    await first.heartbeat()
+
+    assert not first.is_leader
+    assert second.is_leader
@@ -0,0 +1,131 @@
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+
+from app.db.repositories.weather_repository import WeatherRepository
+from app.services.recent_history_service import LocationRing, RecentHistory, _row, _to_ms
+from app.services.weather_service import WeatherService
+from tests.fakes import owm_payload
+
+
+def make_row(minute: int, object_id: ObjectId = None):
+    service = WeatherService.__new__(WeatherService)
+    item = service._transform_openweathermap_data(owm_payload(minute), "Austin")
+    item.timestamp = datetime(2024, 1, 1) + timedelta(minutes=minute)
+    item.id = str(object_id or ObjectId())
+    return _row(item.model_dump())
+
+
+def timestamps(ring: LocationRing):
+    return [ring._key(index)[0] for index in range(ring.size)]
+
+
+def test_ring_keeps_rows_in_order_and_drops_duplicates():
+    ring = LocationRing("Austin", capacity=5)
+    rows = [make_row(minute) for minute in (0, 2, 1, 3)]
+
+    assert all(ring.insert(row) for row in rows)
+    assert not ring.insert(rows[1])
+    assert timestamps(ring) == sorted(row[0] for row in rows)
+
+
+def test_full_ring_evicts_the_oldest_and_stops_covering_it():
+    ring = LocationRing("Austin", capacity=3)
+    for minute in range(5):
+        ring.insert(make_row(minute))
+
+    assert timestamps(ring) == [make_row(minute)[0] for minute in (2, 3, 4)]
+    assert ring.covered_since == make_row(1)[0] + 1
+    # Too old to be held without leaving a gap
+    assert not ring.insert(make_row(1))
+    assert ring.memory_bytes() == LocationRing("Austin", capacity=3).memory_bytes()
+
+
+def test_ring_round_trips_a_stored_document():
+    ring = LocationRing("Austin", capacity=2)
+    row = make_row(0)
+    ring.insert(row)
+
+    record = ring.records([0])[0]
+
+    assert _row({**record, "id": record["id"]}) == row
+    assert ring.records([0], ["temp_c", "wind_dir"]) == [{"temp_c": 20.0, "wind_dir": "N"}]
+
+
+async def seed(repository: WeatherRepository, count: int, first_seq: int = 0):
+    service = WeatherService.__new__(WeatherService)
+    now = datetime.utcnow().replace(microsecond=0)
+    items = []
+    for seq in range(count):
+        item = service._transform_openweathermap_data(owm_payload(first_seq + seq), "Austin")
+        # Pairs share a timestamp so _id has to break the tie
+        item.timestamp = now - timedelta(minutes=count - seq // 2 * 2)
+        items.append(item)
+    await repository.store_observations(items)
+    return now
+
+
+@pytest.mark.asyncio
+async def test_pages_counts_and_stats_match_mongo(mongo):
+    repository = WeatherRepository()
+    now = await seed(repository, 40)
+    recent = RecentHistory(capacity=100, window=timedelta(hours=1))
+    await recent.start(repository, ["Austin"])
+    recent.confirm(["Austin"])
+    start, end = now - timedelta(minutes=30), now - timedelta(minutes=5)
+
+    for kwargs in ({}, {"skip": 7}, {"fields": ["id", "timestamp", "temp_c", "condition"]}):
+        expected = await repository.get_history_page("Austin", start, end, limit=6, raw=True, **kwargs)
+        assert len(expected[0]) == 6
+        assert recent.history_page("Austin", start, end, limit=6, **kwargs) == expected
+
+    _, next_cursor, _ = await repository.get_history_page("Austin", start, end, limit=6, raw=True)
+    expected = await repository.get_history_page("Austin", start, end, limit=6, after=next_cursor, raw=True)
+    assert recent.history_page("Austin", start, end, limit=6, after=next_cursor) == expected
+    _, _, prev_cursor = expected
+    expected = await repository.get_history_page("Austin", start, end, limit=6, before=prev_cursor, raw=True)
+    assert recent.history_page("Austin", start, end, limit=6, before=prev_cursor) == expected
+
+    assert recent.count("Austin", start, end) == await repository.count_records("Austin", start, end)
+
+    humidity = [doc["current"]["humidity"] async for doc in repository.collection.find(
+        {"timestamp": {"$gte": start, "$lte": end}}
+    )]
+    stats = recent.aggregate("Austin", None, ["humidity"], start, end)[0]
+    assert stats["count"] == len(humidity)
+    assert stats["metrics"]["humidity"] == {
+        "min": min(humidity), "max": max(humidity), "avg": pytest.approx(sum(humidity) / len(humidity))
+    }
+
+
+@pytest.mark.asyncio
+async def test_ranges_outside_the_window_or_unconfirmed_fall_back(mongo):
+    repository = WeatherRepository()
+    now = await seed(repository, 10)
+    recent = RecentHistory(capacity=100, window=timedelta(minutes=5), max_gap_seconds=60)
+    await recent.start(repository, ["Austin"])
+
+    # Not confirmed by an ingest yet
+    assert recent.count("Austin", now - timedelta(minutes=2), now) is None
+    recent.confirm(["Austin"])
+    assert recent.count("Austin", now - timedelta(minutes=2), now) == 2
+    assert recent.count("Austin", now - timedelta(minutes=30), now) is None
+    assert recent.count("Other", now - timedelta(minutes=2), now) is None
+    assert recent.stats()["fallbacks"] == 3
+
+
+@pytest.mark.asyncio
+async def test_confirm_after_a_gap_reloads_the_ring(mongo):
+    repository = WeatherRepository()
+    now = await seed(repository, 4)
+    recent = RecentHistory(capacity=100, window=timedelta(hours=1), max_gap_seconds=0)
+    await recent.start(repository, ["Austin"])
+
+    # Stored by another process while this one was not ingesting
+    await seed(repository, 2, first_seq=4)
+    recent.confirm(["Austin"])
+    await next(iter(recent._tasks))
+
+    assert recent._rings["Austin"].size == 6
+    assert recent._rings["Austin"].covered_since == pytest.approx(_to_ms(now - timedelta(hours=1)), abs=60_000)
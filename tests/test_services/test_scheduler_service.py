@@ -0,0 +1,26 @@
+from app.core.metrics import StatsCollector
+from app.services.cache_service import LatestWeatherCache
+from app.services.scheduler_service import SchedulerService
+from app.services.weather_service import WeatherService
+from app.utils.resilience import CircuitBreaker, TokenBucket
+
+
+def test_scheduler_stats_export_as_gauges(mongo, override_settings):
+    override_settings(WEATHER_UPDATE_INTERVAL_SECONDS=60)
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    service = WeatherService(cache=LatestWeatherCache(), budget=TokenBucket(rate=1, capacity=5), breaker=breaker)
+    scheduler = SchedulerService(service)
+    scheduler.effective_interval_seconds = 120.0
+    scheduler.consecutive_failures = 2
+    breaker.record_failure()
+
+    metrics = {family.name: family.samples[0].value for family in StatsCollector("sched", "Scheduler", scheduler.stats).collect()}
+
+    assert metrics["sched_running"] == 0
+    assert metrics["sched_is_leader"] == 1
+    assert metrics["sched_interval_seconds"] == 60
+    assert metrics["sched_effective_interval_seconds"] == 120.0
+    assert metrics["sched_consecutive_failures"] == 2
+    assert metrics["sched_circuit_open"] == 1
+    assert 29 < metrics["sched_circuit_retry_in_seconds"] <= 30
+    assert metrics["sched_call_budget_tokens"] == 5
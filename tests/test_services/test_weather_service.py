@@ -0,0 +1,261 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.core.exceptions import DatabaseException
+from app.core.metrics import SCHEDULER_JOB_ERRORS
+from app.db.repositories.rollup_repository import RollupRepository
+from app.services.cache_service import LatestWeatherCache
+from app.services.scheduler_service import SchedulerService
+from app.services.weather_service import WeatherService, budget_capacity
+from app.utils.resilience import CircuitBreaker, TokenBucket
+from tests.fakes import FakeOpenWeatherMap, make_locations, owm_payload
+
+
+def make_service(upstream: FakeOpenWeatherMap, locations, **kwargs) -> WeatherService:
+    """A service with its own cache, budget and breaker so tests never share upstream state"""
+    kwargs.setdefault("budget", TokenBucket(rate=1000, capacity=100))
+    kwargs.setdefault("breaker", CircuitBreaker(failure_threshold=5, reset_timeout=60))
+    service = WeatherService(cache=LatestWeatherCache(), http_client=upstream.client(), **kwargs)
+    service.locations = locations
+    return service
+
+
+def test_transform_batch_converts_each_item(mongo):
+    service = WeatherService(cache=LatestWeatherCache())
+    items = [owm_payload(0, "City 0", 1000), owm_payload(5, "City 1", 1001)]
+    items[1]["main"]["temp"] = 298.15  # Kelvin, as returned without units=metric
+
+    first, second = service._transform_openweathermap_batch(items, ["City 0", "City 1"])
+
+    assert (first.location, second.location) == ("City 0", "City 1")
+    assert first.current.temp_c == 20.0
+    assert first.current.temp_f == pytest.approx(68.0)
+    assert second.current.temp_c == pytest.approx(25.0)
+    assert first.current.wind_kph == pytest.approx(12.96)
+    assert first.current.wind_mph == pytest.approx(12.96 / 1.609344)
+    assert first.current.wind_dir == "N"
+    assert second.current.wind_dir == "ENE"
+    assert first.observed_at < second.observed_at
+    assert first.location_data.tz_id == "UTC-6"
+
+
+@pytest.mark.asyncio
+async def test_fetch_group_weather_maps_city_ids_to_locations(mongo):
+    locations = make_locations(3)
+    upstream = FakeOpenWeatherMap(locations)
+    service = make_service(upstream, locations)
+
+    weather = await service.fetch_group_weather(locations)
+
+    assert [item.location for item in weather] == ["City 0", "City 1", "City 2"]
+    assert upstream.endpoints == ["group"]
+
+
+@pytest.mark.asyncio
+async def test_fetch_group_weather_skips_missing_city_ids(mongo):
+    locations = make_locations(3)
+    upstream = FakeOpenWeatherMap(locations, missing={1001})
+    service = make_service(upstream, locations)
+
+    weather = await service.fetch_group_weather(locations)
+
+    assert [item.location for item in weather] == ["City 0", "City 2"]
+
+
+@pytest.mark.asyncio
+async def test_single_mode_fetches_each_location_on_its_own(mongo, override_settings):
+    override_settings(WEATHER_FETCH_MODE="single")
+    locations = make_locations(4)
+    upstream = FakeOpenWeatherMap(locations)
+    service = make_service(upstream, locations)
+
+    weather = await service.fetch_all_current_weather()
+
+    assert sorted(item.location for item in weather) == [location.name for location in locations]
+    assert upstream.endpoints == ["weather"] * 4
+
+
+@pytest.mark.asyncio
+async def test_group_mode_packs_city_ids_into_batches(mongo, override_settings):
+    override_settings(WEATHER_FETCH_MODE="group", WEATHER_GROUP_BATCH_SIZE=2)
+    locations = make_locations(5)
+    upstream = FakeOpenWeatherMap(locations)
+    service = make_service(upstream, locations)
+
+    weather = await service.fetch_all_current_weather()
+
+    assert len(weather) == 5
+    assert upstream.endpoints == ["group"] * 3
+
+
+@pytest.mark.asyncio
+async def test_refresh_raises_when_no_location_could_be_stored(mongo, override_settings):
+    override_settings(WEATHER_MIN_REFRESH_INTERVAL_SECONDS=0)
+    locations = make_locations(3)
+    service = make_service(FakeOpenWeatherMap(locations), locations)
+
+    async def store_observations(*args, **kwargs):
+        raise DatabaseException("Mongo is down")
+
+    service.repository.store_observations = store_observations
+
+    with pytest.raises(DatabaseException):
+        await service.fetch_and_store_all_weather()
+
+    scheduler = SchedulerService(service)
+    errors = SCHEDULER_JOB_ERRORS.labels("weather_update")._value.get()
+    await scheduler.fetch_weather_task()
+    assert SCHEDULER_JOB_ERRORS.labels("weather_update")._value.get() == errors + 1
+    assert scheduler.consecutive_failures == 1
+
+
+@pytest.mark.asyncio
+async def test_refresh_interval_counts_from_the_last_upstream_fetch(mongo, override_settings):
+    override_settings(WEATHER_MIN_REFRESH_INTERVAL_SECONDS=5)
+    locations = make_locations(1)
+    upstream = FakeOpenWeatherMap(locations)
+    service = make_service(upstream, locations)
+    old = service._transform_openweathermap_data(owm_payload(-1, "City 0"), "City 0")
+    await service.repository.store_observations([old])
+
+    # A cold read fills the cache from Mongo, which is not a fetch
+    assert (await service.get_latest_weather("City 0")).observed_at == old.observed_at
+    refreshed = await service.fetch_and_store_weather("City 0")
+    assert upstream.requests == 1
+    assert refreshed.observed_at > old.observed_at
+
+    assert await service.fetch_and_store_weather("City 0") is refreshed
+    assert upstream.requests == 1
+
+
+@pytest.mark.asyncio
+async def test_refresh_waits_for_the_budget_beyond_its_burst(mongo, override_settings):
+    override_settings(WEATHER_MIN_REFRESH_INTERVAL_SECONDS=0, WEATHER_FETCH_MODE="single")
+    locations = make_locations(30)
+    upstream = FakeOpenWeatherMap(locations)
+    service = make_service(upstream, locations, budget=TokenBucket(rate=200, capacity=10))
+
+    stored = await service.fetch_and_store_all_weather()
+
+    assert len(stored) == 30
+    assert upstream.requests == 30
+
+
+@pytest.mark.asyncio
+async def test_refresh_leads_with_locations_the_last_tick_missed(mongo, override_settings):
+    override_settings(
+        WEATHER_MIN_REFRESH_INTERVAL_SECONDS=0, WEATHER_FETCH_MODE="single", WEATHER_FETCH_CONCURRENCY=1
+    )
+    locations = make_locations(5)
+    now = [0.0]
+    budget = TokenBucket(rate=0.001, capacity=2, clock=lambda: now[0])
+    service = make_service(FakeOpenWeatherMap(locations), locations, budget=budget)
+
+    first = await service.fetch_and_store_all_weather()
+    now[0] += 2000
+    second = await service.fetch_and_store_all_weather()
+
+    assert sorted(item.location for item in first) == ["City 0", "City 1"]
+    assert sorted(item.location for item in second) == ["City 2", "City 3"]
+
+
+def test_budget_capacity_covers_one_refresh(override_settings):
+    override_settings(WEATHER_FETCH_MODE="single", WEATHER_API_BURST=10, WEATHER_API_CALLS_PER_MINUTE=60)
+
+    assert budget_capacity(make_locations(3)) == 10
+    assert budget_capacity(make_locations(50)) == 50
+    assert budget_capacity(make_locations(500)) == 60
+
+
+@pytest.mark.asyncio
+async def test_seconds_until_refresh_follows_the_tick_phase(mongo, override_settings):
+    override_settings(WEATHER_UPDATE_INTERVAL_SECONDS=60, WEATHER_MIN_REFRESH_INTERVAL_SECONDS=0)
+    locations = make_locations(1)
+    service = make_service(FakeOpenWeatherMap(locations), locations)
+
+    # Unchanged observations keep the timestamp of the tick that first stored them
+    stored = service._transform_openweathermap_data(owm_payload(0, "City 0"), "City 0")
+    stored.timestamp = datetime.utcnow() - timedelta(seconds=3 * 60 + 10)
+    assert service.seconds_until_refresh(stored) == pytest.approx(50, abs=1)
+
+    fetched = await service.fetch_and_store_weather("City 0")
+    assert service.seconds_until_refresh(fetched) == pytest.approx(60, abs=1)
+
+
+@pytest.mark.asyncio
+async def test_seconds_until_refresh_follows_a_stretched_scheduler_interval(mongo, override_settings):
+    override_settings(WEATHER_UPDATE_INTERVAL_SECONDS=60, WEATHER_MIN_REFRESH_INTERVAL_SECONDS=0)
+    locations = make_locations(1)
+    service = make_service(FakeOpenWeatherMap(locations), locations)
+    scheduler = SchedulerService(service)
+    fetched = await service.fetch_and_store_weather("City 0")
+
+    scheduler._tick_failed(retry_after=300)
+
+    assert scheduler.effective_interval_seconds >= 300
+    assert service.seconds_until_refresh(fetched) == pytest.approx(scheduler.effective_interval_seconds, abs=1)
+
+
+async def store_history(service: WeatherService, location: str, count: int, start: datetime):
+    """Store ``count`` observations a minute apart, bypassing ingest so rollups are not updated"""
+    items = []
+    for seq in range(count):
+        item = service._transform_openweathermap_data(owm_payload(seq, location), location)
+        item.timestamp = item.observed_at = start + timedelta(minutes=seq)
+        items.append(item)
+    await service.repository.store_observations(items)
+    await service.repository.ensure_counters([location])
+    return items
+
+
+@pytest.mark.asyncio
+async def test_count_uses_counter_until_rollups_are_backfilled(mongo):
+    locations = make_locations(1)
+    service = make_service(FakeOpenWeatherMap(locations), locations, rollups=RollupRepository())
+    start = datetime.utcnow() - timedelta(hours=3)
+    await store_history(service, "City 0", 5, start)
+
+    assert await service.count_weather("City 0", start, datetime.utcnow()) == 5
+    assert await service.count_weather("City 0") == 5
+
+
+@pytest.mark.asyncio
+async def test_rollup_count_ignores_records_retention_removed(mongo):
+    locations = make_locations(1)
+    rollups = RollupRepository()
+    service = make_service(FakeOpenWeatherMap(locations), locations, rollups=rollups)
+    start = datetime(2024, 1, 1)
+    items = await store_history(service, "City 0", 10, start)
+    await rollups.record(items)
+    rollups.backfilled.add("City 0")
+
+    await service.repository.delete_batch("City 0", start + timedelta(minutes=4), batch_size=100)
+
+    assert await service.count_weather("City 0", start - timedelta(days=1), start + timedelta(hours=1)) == 6
+    assert await service.count_weather("City 0", start + timedelta(minutes=8), start + timedelta(hours=1)) == 2
+    assert await service.count_weather("City 0", start - timedelta(days=1), start) == 0
+
+
+@pytest.mark.asyncio
+async def test_retention_expires_minute_and_hour_rollups(mongo, override_settings):
+    override_settings(RETENTION_ROLLUP_BEFORE_DELETE=False, ROLLUP_HOUR_RETENTION_DAYS=10)
+    locations = make_locations(1)
+    rollups = RollupRepository()
+    service = make_service(FakeOpenWeatherMap(locations), locations, rollups=rollups)
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    for days_ago in (30, 5, 1):
+        await rollups.record(await store_history(service, "City 0", 3, today - timedelta(days=days_ago)))
+
+    await service.perform_maintenance(retention_days=3)
+
+    remaining = {
+        (doc["granularity"], (today - doc["bucket_start"].replace(hour=0, minute=0)).days)
+        async for doc in rollups.collection.find({}, {"granularity": 1, "bucket_start": 1})
+    }
+    assert remaining == {
+        ("minute", 1),
+        ("hour", 5), ("hour", 1),
+        ("day", 30), ("day", 5), ("day", 1),
+    }
+    assert await service.repository.count_records("City 0") == 3
@@ -0,0 +1,37 @@
+import base64
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from bson import ObjectId
+
+from app.utils.cursor_utils import decode_cursor, encode_cursor
+
+
+def test_cursor_round_trips_its_sort_key():
+    object_id = ObjectId()
+    timestamp = datetime(2024, 1, 1, 12, 30, 15, 123000)
+
+    assert decode_cursor(encode_cursor(timestamp, str(object_id))) == (timestamp, object_id)
+
+
+def test_cursor_normalizes_aware_timestamps_to_naive_utc():
+    object_id = str(ObjectId())
+    aware = datetime(2024, 1, 1, 18, 0, tzinfo=timezone(timedelta(hours=6)))
+
+    assert encode_cursor(aware, object_id) == encode_cursor(datetime(2024, 1, 1, 12, 0), object_id)
+
+
+def encoded(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+@pytest.mark.parametrize("token", [
+    "not-a-cursor",
+    encoded(b"no separator"),
+    encoded(b"soon:" + str(ObjectId()).encode()),
+    encoded(b"1704067200000:not-an-object-id"),
+    encoded(b"\xff\xfe:\x00"),
+])
+def test_malformed_cursors_raise_value_error(token):
+    with pytest.raises(ValueError, match="Invalid pagination cursor"):
+        decode_cursor(token)
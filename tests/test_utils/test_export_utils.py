@@ -0,0 +1,47 @@
+import csv
+import io
+from datetime import datetime
+
+import orjson
+from bson import ObjectId
+
+from app.utils.export_utils import CSV_COLUMNS, csv_header, documents_to_csv, documents_to_ndjson
+
+
+def document(minute: int) -> dict:
+    return {
+        "_id": ObjectId(),
+        "location": "Austin",
+        "timestamp": datetime(2024, 1, 1, 0, minute, 0, 250000),
+        "current": {"temp_c": 20.5, "condition": {"text": "Clear", "code": 800}},
+    }
+
+
+def test_ndjson_writes_one_object_per_line_with_string_ids():
+    documents = [document(0), document(1)]
+
+    lines = documents_to_ndjson(documents).splitlines()
+
+    assert [orjson.loads(line) for line in lines] == [
+        {
+            "id": str(doc["_id"]),
+            "location": "Austin",
+            "timestamp": doc["timestamp"].isoformat(),
+            "current": {"temp_c": 20.5, "condition": {"text": "Clear", "code": 800}},
+        }
+        for doc in documents
+    ]
+    assert documents_to_ndjson([]) == b""
+
+
+def test_csv_flattens_documents_under_the_header():
+    doc = document(0)
+
+    rows = list(csv.reader(io.StringIO((csv_header() + documents_to_csv([doc])).decode())))
+
+    assert rows[0] == [header for header, _ in CSV_COLUMNS]
+    row = dict(zip(rows[0], rows[1]))
+    assert row["id"] == str(doc["_id"])
+    assert row["timestamp"] == doc["timestamp"].isoformat()
+    assert (row["temp_c"], row["condition"], row["condition_code"]) == ("20.5", "Clear", "800")
+    assert row["humidity"] == ""
@@ -0,0 +1,101 @@
+import asyncio
+
+import pytest
+
+from app.utils.resilience import CircuitBreaker, TokenBucket, parse_retry_after
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_token_bucket_refills_up_to_capacity():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=2, capacity=3, clock=clock)
+
+    assert all(bucket.try_acquire() for _ in range(3))
+    assert not bucket.try_acquire()
+    assert bucket.time_until() == pytest.approx(0.5)
+
+    clock.now = 10
+    assert bucket.tokens == 3
+
+
+def test_token_bucket_reservations_queue_at_the_refill_rate():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=1, capacity=1, clock=clock)
+
+    assert [bucket.reserve(max_wait=5) for _ in range(3)] == [0, 1, 2]
+    assert bucket.reserve(max_wait=2.5) is None
+    assert bucket.reserve(max_wait=3) == 3
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_acquire_waits_for_a_token():
+    bucket = TokenBucket(rate=100, capacity=1)
+
+    assert await bucket.acquire()
+    assert not await bucket.acquire(max_wait=0)
+    assert await bucket.acquire(max_wait=1)
+
+
+@pytest.mark.asyncio
+async def test_cancelled_acquire_returns_its_reservation():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=0.001, capacity=1, clock=clock)
+    bucket.try_acquire()
+
+    waiter = asyncio.create_task(bucket.acquire(max_wait=10_000))
+    await asyncio.sleep(0)
+    waiter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+
+    assert bucket.time_until() == pytest.approx(1000)
+
+
+def test_circuit_breaker_opens_then_lets_one_probe_through():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30, clock=clock)
+
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+    assert breaker.remaining() == 30
+
+    clock.now = 30
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow()
+    assert not breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+    clock.now = 60
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow()
+
+
+def test_circuit_breaker_honours_retry_after():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=5, reset_timeout=30, clock=clock)
+
+    breaker.open_for(120)
+    breaker.open_for(10)
+
+    assert breaker.remaining() == 120
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("30") == 30
+    assert parse_retry_after("Thu, 01 Jan 1970 00:00:00 GMT") == 0
+    assert parse_retry_after("soon") is None
+    assert parse_retry_after(None) is None
@@ -0,0 +1,84 @@
+import asyncio
+
+import pytest
+
+from app.utils.singleflight import SingleFlight
+
+
+@pytest.mark.asyncio
+async def test_do_coalesces_concurrent_calls():
+    flights = SingleFlight()
+    calls = 0
+
+    async def work():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return calls
+
+    results = await asyncio.gather(*(flights.do("Austin", work) for _ in range(5)))
+
+    assert results == [1] * 5
+    assert not flights.in_flight("Austin")
+
+
+@pytest.mark.asyncio
+async def test_cancelled_caller_does_not_cancel_shared_work():
+    flights = SingleFlight()
+    release = asyncio.Event()
+
+    async def work():
+        await release.wait()
+        return "done"
+
+    first = asyncio.create_task(flights.do("Austin", work))
+    second = asyncio.create_task(flights.do("Austin", work))
+    await asyncio.sleep(0)
+    first.cancel()
+    release.set()
+
+    assert await second == "done"
+
+
+@pytest.mark.asyncio
+async def test_do_many_joins_keys_in_flight_and_batches_the_rest():
+    flights = SingleFlight()
+    release = asyncio.Event()
+    batches = []
+
+    async def single():
+        await release.wait()
+        return "joined"
+
+    async def batch(keys):
+        batches.append(keys)
+        return {key: f"fetched {key}" for key in keys}
+
+    joined = asyncio.create_task(flights.do("a", single))
+    await asyncio.sleep(0)
+    many = asyncio.create_task(flights.do_many(["a", "b", "c"], batch))
+    await asyncio.sleep(0)
+    release.set()
+
+    assert await many == {"a": "joined", "b": "fetched b", "c": "fetched c"}
+    assert batches == [["b", "c"]]
+    await joined
+
+
+@pytest.mark.asyncio
+async def test_do_many_reports_every_failure():
+    flights = SingleFlight()
+
+    async def batch(keys):
+        if "broken" in keys:
+            raise RuntimeError("write failed")
+        return {}
+
+    errors = {}
+    assert await flights.do_many(["broken", "other"], batch, errors) == {}
+    assert set(errors) == {"broken", "other"}
+    assert isinstance(errors["broken"], RuntimeError)
+
+    errors = {}
+    assert await flights.do_many(["lost"], batch, errors) == {}
+    assert isinstance(errors["lost"], LookupError)